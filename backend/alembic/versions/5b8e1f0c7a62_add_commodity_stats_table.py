@@ -0,0 +1,46 @@
+"""add commodity stats table
+
+Revision ID: 5b8e1f0c7a62
+Revises: a3f7c2d91e04
+Create Date: 2026-10-17 13:48:05.119374
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e1f0c7a62'
+down_revision: Union[str, None] = 'a3f7c2d91e04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('commodity_stats',
+    sa.Column('commodity_id', sa.Integer(), nullable=False),
+    sa.Column('current_price', sa.Integer(), nullable=True),
+    sa.Column('min_price', sa.Integer(), nullable=True),
+    sa.Column('max_price', sa.Integer(), nullable=True),
+    sa.Column('weekly_change', sa.Float(), nullable=True),
+    sa.Column('monthly_change', sa.Float(), nullable=True),
+    sa.Column('yearly_change', sa.Float(), nullable=True),
+    sa.Column('computed_for', sa.Date(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['commodity_id'], ['commodity.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_commodity_stats_commodity_id'), 'commodity_stats', ['commodity_id'], unique=True)
+    op.create_index(op.f('ix_commodity_stats_computed_for'), 'commodity_stats', ['computed_for'], unique=False)
+    op.create_index(op.f('ix_commodity_stats_id'), 'commodity_stats', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_commodity_stats_id'), table_name='commodity_stats')
+    op.drop_index(op.f('ix_commodity_stats_computed_for'), table_name='commodity_stats')
+    op.drop_index(op.f('ix_commodity_stats_commodity_id'), table_name='commodity_stats')
+    op.drop_table('commodity_stats')
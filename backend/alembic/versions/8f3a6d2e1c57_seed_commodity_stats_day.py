@@ -0,0 +1,28 @@
+"""seed commodity stats day
+
+Revision ID: 8f3a6d2e1c57
+Revises: d5c19e7a4b82
+Create Date: 2026-10-18 11:03:52.917364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3a6d2e1c57'
+down_revision: Union[str, None] = 'd5c19e7a4b82'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    data_version = sa.table('data_version', sa.column('scope', sa.String), sa.column('version', sa.Integer))
+    # Seed the marker so the daily commodity_stats refresh always has a row to lock
+    op.bulk_insert(data_version, [{'scope': 'commodity_stats_day', 'version': 0}])
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM data_version WHERE scope = 'commodity_stats_day'")
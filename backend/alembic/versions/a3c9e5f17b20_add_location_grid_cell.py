@@ -0,0 +1,57 @@
+"""add location grid cell
+
+Adds the indexed spatial search cell of each location, fills it in for
+existing rows, and indexes price records by location and date so the
+locations found by a search are probed for recent prices. The cell formula
+matches app.utils.geo.grid_cell at the time of this revision.
+
+Revision ID: a3c9e5f17b20
+Revises: f4b7d2c8e915
+Create Date: 2026-10-18 10:05:37.512864
+
+"""
+import math
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c9e5f17b20'
+down_revision: Union[str, None] = 'f4b7d2c8e915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CELL_SIZE = 0.05
+GRID_ROWS = 3600
+GRID_COLUMNS = 7200
+
+
+def grid_cell(latitude: float, longitude: float) -> int:
+    row = min(max(int(math.floor((latitude + 90.0) / CELL_SIZE)), 0), GRID_ROWS - 1)
+    column = min(max(int(math.floor((longitude + 180.0) / CELL_SIZE)), 0), GRID_COLUMNS - 1)
+    return row * GRID_COLUMNS + column
+
+
+def upgrade() -> None:
+    op.add_column('location', sa.Column('grid_cell', sa.Integer(), nullable=True))
+
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("SELECT id, latitude, longitude FROM location")).fetchall()
+    updates = [
+        {'id': id, 'grid_cell': grid_cell(latitude, longitude)}
+        for id, latitude, longitude in rows
+        if latitude is not None and longitude is not None
+    ]
+    for i in range(0, len(updates), 1000):
+        bind.execute(sa.text("UPDATE location SET grid_cell = :grid_cell WHERE id = :id"), updates[i:i + 1000])
+
+    op.create_index(op.f('ix_location_grid_cell'), 'location', ['grid_cell'], unique=False)
+    op.create_index('idx_location_recorded_at', 'pricerecord', ['location_id', 'recorded_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_location_recorded_at', table_name='pricerecord')
+    op.drop_index(op.f('ix_location_grid_cell'), table_name='location')
+    op.drop_column('location', 'grid_cell')
@@ -0,0 +1,32 @@
+"""add rollup totals to price history
+
+Revision ID: a3f7c2d91e04
+Revises: 6d2659360b2d
+Create Date: 2026-10-17 10:12:41.508212
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f7c2d91e04'
+down_revision: Union[str, None] = '6d2659360b2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('pricehistoryaggregated', sa.Column('price_sum', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('pricehistoryaggregated', sa.Column('record_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_unique_constraint('uq_pricehistory_bucket', 'pricehistoryaggregated', ['commodity_id', 'region_id', 'period', 'period_start'])
+    op.create_index('idx_pricehistory_commodity_period_start', 'pricehistoryaggregated', ['commodity_id', 'period', 'period_start'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_pricehistory_commodity_period_start', table_name='pricehistoryaggregated')
+    op.drop_constraint('uq_pricehistory_bucket', 'pricehistoryaggregated', type_='unique')
+    op.drop_column('pricehistoryaggregated', 'record_count')
+    op.drop_column('pricehistoryaggregated', 'price_sum')
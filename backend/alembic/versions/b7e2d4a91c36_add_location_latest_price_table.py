@@ -0,0 +1,55 @@
+"""add location latest price table
+
+Adds the latest price per (location, commodity) read by the price map, and
+drops the pricerecord (location_id, recorded_at) index the map no longer
+needs. Run rebuild_price_history.py afterwards to fill the table.
+
+Revision ID: b7e2d4a91c36
+Revises: a3c9e5f17b20
+Create Date: 2026-10-18 13:41:22.806193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2d4a91c36'
+down_revision: Union[str, None] = 'a3c9e5f17b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('location_latest_price',
+    sa.Column('location_id', sa.Integer(), nullable=False),
+    sa.Column('commodity_id', sa.Integer(), nullable=False),
+    sa.Column('price_record_id', sa.Integer(), nullable=False),
+    sa.Column('region_id', sa.Integer(), nullable=False),
+    sa.Column('price', sa.Integer(), nullable=False),
+    sa.Column('recorded_at', sa.Date(), nullable=False),
+    sa.Column('previous_price', sa.Integer(), nullable=True),
+    sa.Column('previous_recorded_at', sa.Date(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['commodity_id'], ['commodity.id'], ),
+    sa.ForeignKeyConstraint(['location_id'], ['location.id'], ),
+    sa.ForeignKeyConstraint(['region_id'], ['region.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('location_id', 'commodity_id', name='uq_location_latest_price')
+    )
+    op.create_index('idx_location_latest_recorded_at', 'location_latest_price', ['location_id', 'recorded_at'], unique=False)
+    op.create_index(op.f('ix_location_latest_price_commodity_id'), 'location_latest_price', ['commodity_id'], unique=False)
+    op.create_index(op.f('ix_location_latest_price_id'), 'location_latest_price', ['id'], unique=False)
+    op.drop_index('idx_location_recorded_at', table_name='pricerecord')
+
+
+def downgrade() -> None:
+    op.create_index('idx_location_recorded_at', 'pricerecord', ['location_id', 'recorded_at'], unique=False)
+    op.drop_index(op.f('ix_location_latest_price_id'), table_name='location_latest_price')
+    op.drop_index(op.f('ix_location_latest_price_commodity_id'), table_name='location_latest_price')
+    op.drop_index('idx_location_latest_recorded_at', table_name='location_latest_price')
+    op.drop_table('location_latest_price')
@@ -0,0 +1,34 @@
+"""add keyset indexes to price record
+
+Revision ID: c81d4e2a9f37
+Revises: 5b8e1f0c7a62
+Create Date: 2026-10-17 15:12:40.274913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81d4e2a9f37'
+down_revision: Union[str, None] = '5b8e1f0c7a62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('idx_commodity_recorded_at_id', 'pricerecord', ['commodity_id', 'recorded_at', 'id'], unique=False)
+    op.create_index('idx_region_recorded_at_id', 'pricerecord', ['region_id', 'recorded_at', 'id'], unique=False)
+    op.create_index('idx_recorded_at_id', 'pricerecord', ['recorded_at', 'id'], unique=False)
+    op.drop_index('idx_commodity_recorded_at', table_name='pricerecord')
+    op.drop_index('idx_region_recorded_at', table_name='pricerecord')
+
+
+def downgrade() -> None:
+    op.create_index('idx_region_recorded_at', 'pricerecord', ['region_id', 'recorded_at'], unique=False)
+    op.create_index('idx_commodity_recorded_at', 'pricerecord', ['commodity_id', 'recorded_at'], unique=False)
+    op.drop_index('idx_recorded_at_id', table_name='pricerecord')
+    op.drop_index('idx_region_recorded_at_id', table_name='pricerecord')
+    op.drop_index('idx_commodity_recorded_at_id', table_name='pricerecord')
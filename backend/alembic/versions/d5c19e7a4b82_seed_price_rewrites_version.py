@@ -0,0 +1,28 @@
+"""seed price rewrites version
+
+Revision ID: d5c19e7a4b82
+Revises: b7e2d4a91c36
+Create Date: 2026-10-18 10:12:37.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5c19e7a4b82'
+down_revision: Union[str, None] = 'b7e2d4a91c36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    data_version = sa.table('data_version', sa.column('scope', sa.String), sa.column('version', sa.Integer))
+    # Seed the counter so bumps are always a single UPDATE
+    op.bulk_insert(data_version, [{'scope': 'price_rewrites', 'version': 0}])
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM data_version WHERE scope = 'price_rewrites'")
@@ -0,0 +1,39 @@
+"""add data version table
+
+Revision ID: e2a6b9d03f18
+Revises: c81d4e2a9f37
+Create Date: 2026-10-17 16:04:51.630127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a6b9d03f18'
+down_revision: Union[str, None] = 'c81d4e2a9f37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    data_version = op.create_table('data_version',
+    sa.Column('scope', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_data_version_id'), 'data_version', ['id'], unique=False)
+    op.create_index(op.f('ix_data_version_scope'), 'data_version', ['scope'], unique=True)
+    # Seed the counter so bumps are always a single UPDATE
+    op.bulk_insert(data_version, [{'id': 1, 'scope': 'price_data', 'version': 0}])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_data_version_scope'), table_name='data_version')
+    op.drop_index(op.f('ix_data_version_id'), table_name='data_version')
+    op.drop_table('data_version')
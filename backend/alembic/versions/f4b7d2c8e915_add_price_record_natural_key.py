@@ -0,0 +1,57 @@
+"""add price record natural key
+
+Adds price_kind, backfills it from the "Lowest price." / "Highest price."
+notes written by the scraper and the CSV importer, deletes duplicate
+observations (keeping the oldest row of each natural key) and adds the
+unique index. Run rebuild_price_history.py afterwards so the aggregated
+history no longer counts the deleted duplicates.
+
+Revision ID: f4b7d2c8e915
+Revises: e2a6b9d03f18
+Create Date: 2026-10-17 23:20:14.318406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4b7d2c8e915'
+down_revision: Union[str, None] = 'e2a6b9d03f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NATURAL_KEY = ['commodity_id', 'location_id', 'recorded_at', 'source', 'price_kind']
+
+
+def upgrade() -> None:
+    op.add_column('pricerecord', sa.Column('price_kind', sa.String(length=10), nullable=True))
+    op.execute("UPDATE pricerecord SET price_kind = 'lowest' WHERE notes LIKE 'Lowest price.%'")
+    op.execute("UPDATE pricerecord SET price_kind = 'highest' WHERE notes LIKE 'Highest price.%'")
+
+    # Rows with a NULL key part never conflict, so only complete keys are deduplicated.
+    # The derived table keeps MySQL from rejecting a subquery on the table being deleted from.
+    complete = ' AND '.join(f'{column} IS NOT NULL' for column in NATURAL_KEY)
+    op.execute(
+        f"""
+        DELETE FROM pricerecord
+        WHERE {complete}
+          AND id NOT IN (
+            SELECT keep_id FROM (
+              SELECT MIN(id) AS keep_id FROM pricerecord
+              WHERE {complete}
+              GROUP BY {', '.join(NATURAL_KEY)}
+            ) AS keepers
+          )
+        """
+    )
+    op.execute("UPDATE data_version SET version = version + 1 WHERE scope = 'price_data'")
+
+    op.create_unique_constraint('uq_pricerecord_natural_key', 'pricerecord', NATURAL_KEY)
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_pricerecord_natural_key', 'pricerecord', type_='unique')
+    op.drop_column('pricerecord', 'price_kind')
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import Any, Optional
 from datetime import date
 
 from app.db.session import get_db
+from app.services.prices.rollups import PERIODS, price_rollup
 
 router = APIRouter()
 
@@ -19,10 +20,42 @@ def get_price_trends(
 ) -> Any:
     """
     Get price trends for analytics with various filtering options.
+    
+    Trends are read from the precomputed price history buckets. Without a
+    region_id, buckets are combined across all regions.
     """
-    # This would call a function to get price trends
-    # We'll just return a placeholder for now
-    return {"message": "Price trends endpoint"}
+    if period not in PERIODS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid period. Must be one of: {', '.join(PERIODS)}",
+        )
+    
+    buckets = price_rollup.get_history(
+        db,
+        period=period,
+        commodity_id=commodity_id,
+        region_id=region_id,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    
+    return {
+        "commodity_id": commodity_id,
+        "region_id": region_id,
+        "period": period,
+        "trends": [
+            {
+                "commodity_id": bucket.commodity_id,
+                "period_start": bucket.period_start.isoformat(),
+                "period_end": bucket.period_end.isoformat(),
+                "avg_price": round(bucket.avg_price),
+                "min_price": bucket.min_price,
+                "max_price": bucket.max_price,
+                "record_count": bucket.record_count,
+            }
+            for bucket in buckets
+        ],
+    }
 
 
 @router.get("/comparison")
@@ -1,15 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from typing import Any, List, Optional
+from sqlalchemy import and_, func, or_
+from typing import Any, Dict, List, Literal, Optional
+from collections import Counter
 from datetime import datetime, timedelta
+import math
 
 from app import schemas, crud
 from app.db.session import get_db
+from app.services.data_version import conditional_get
+from app.services.location_clusters import cluster_pyramid
+from app.services.location_index import location_index
+from app.services.prices.location_latest import location_latest_price
 from app.models.location import Location
+from app.models.location_latest_price import LocationLatestPrice
 from app.models.price_record import PriceRecord
 from app.models.commodity import Commodity
 from app.models.region import Region
+from app.utils.categories import categories_for, display_group
+from app.utils.geo import bounding_box, cell_ranges, haversine_km_sql
 
 router = APIRouter()
 
@@ -29,6 +38,8 @@ def read_locations(
 
 @router.get("/with-prices")
 def get_locations_with_prices(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     lat: float = Query(..., description="Center latitude for search"),
     lng: float = Query(..., description="Center longitude for search"),
@@ -42,12 +53,17 @@ def get_locations_with_prices(
         None,
         description="Filter by specific commodity ID"
     ),
+    order_by_distance: bool = Query(
+        False,
+        description="Order locations nearest first instead of by id"
+    ),
     skip: int = Query(0, description="Skip records for pagination"),
     limit: int = Query(100, description="Limit number of records returned"),
 ) -> Any:
     """
     Get locations with recent price data within a geographic range.
-    Returns locations that have price records in the last N days.
+    Returns locations within radius_km of the center that have price records
+    in the last N days, each with its distance_km from the center.
 
     Categories can be individual database categories or grouped categories:
     - food: includes agriculture, pulses, vegetables, spices, fish, meat, dairy, grocery, fruits, poultry
@@ -56,219 +72,178 @@ def get_locations_with_prices(
     
     Can also filter by specific commodity_id to show only locations with that commodity.
     """
+    not_modified = conditional_get(db, request, response)
+    if not_modified:
+        return not_modified
+    
     # Calculate date range
     end_date = datetime.now().date()
     start_date = end_date - timedelta(days=days)
 
     print(f"start_date: {start_date}, end_date: {end_date}")
 
-    # Calculate approximate lat/lng bounds for the radius
-    import math
-
-    lat_delta = radius_km / 111.0
-    lng_delta = radius_km / (111.0 * abs(math.cos(math.radians(lat))))
-
-    min_lat = lat - lat_delta
-    max_lat = lat + lat_delta
-    min_lng = lng - lng_delta
-    max_lng = lng + lng_delta
-
-    location_query = (
-        db.query(Location.id)
-        .distinct()
-        .join(PriceRecord, Location.id == PriceRecord.location_id)
-        .filter(
-            and_(
-                Location.latitude >= min_lat,
-                Location.latitude <= max_lat,
-                Location.longitude >= min_lng,
-                Location.longitude <= max_lng,
-                PriceRecord.recorded_at >= start_date,
-                PriceRecord.recorded_at <= end_date,
-            )
-        )
-    )
-
-    # Apply commodity_id filter if specified (takes precedence over category)
+    # Commodities of the category, from the lookup table of category groups;
+    # commodity_id takes precedence over category
+    category_commodity_ids: Optional[List[int]] = None
+    if category and not commodity_id:
+        categories = categories_for(category)
+        if categories is not None:
+            category_commodity_ids = [
+                row.id for row in db.query(Commodity.id).filter(Commodity.category.in_(categories))
+            ]
+            if not category_commodity_ids:
+                return {"locations": [], "total": 0, "skip": skip, "limit": limit}
+
+    # Latest prices of a candidate location that qualify it, probed per location.
+    # A location has a price in the window exactly when one of its latest prices is,
+    # or when a pair whose latest record is dated after today has a record inside it.
+    # A category only selects locations; their page still lists every commodity.
+    latest_price_conditions = [LocationLatestPrice.recorded_at >= start_date]
     if commodity_id:
-        location_query = location_query.filter(PriceRecord.commodity_id == commodity_id)
-    # Apply category filter if specified and no commodity_id is provided
-    elif category:
-        location_query = location_query.join(
-            Commodity, PriceRecord.commodity_id == Commodity.id
-        )
-
-        # Define category groups for filtering
-        food_categories = [
-            "agriculture",
-            "pulses",
-            "vegetables",
-            "spices",
-            "fish",
-            "meat",
-            "dairy",
-            "grocery",
-            "fruits",
-            "poultry",
-        ]
-        energy_categories = ["oil"]
-        household_categories = ["stationery", "construction"]
-
-        # Check if it's a group category or individual category
-        if category == "food":
-            location_query = location_query.filter(
-                Commodity.category.in_(food_categories)
-            )
-        elif category == "energy":
-            location_query = location_query.filter(
-                Commodity.category.in_(energy_categories)
-            )
-        elif category == "household":
-            location_query = location_query.filter(
-                Commodity.category.in_(household_categories)
-            )
-        # Individual category filtering
-        elif category in food_categories + energy_categories + household_categories:
-            location_query = location_query.filter(Commodity.category == category)
-
-    # Get matching location IDs
-    location_ids = [loc_id for (loc_id,) in location_query.all()]
-
-    # If no locations found, return empty result
-    if not location_ids:
-        return {"locations": [], "total": 0}
-
-    # Get the total count for pagination metadata
-    total_count = len(location_ids)
-
-    paginated_location_ids = location_ids[skip : skip + limit]
-
-    # Build the price record query with potential commodity filter
-    price_filter_conditions = [
-        PriceRecord.location_id.in_(paginated_location_ids),
+        latest_price_conditions.append(LocationLatestPrice.commodity_id == commodity_id)
+    earlier_price = db.query(PriceRecord.id).filter(
+        PriceRecord.location_id == LocationLatestPrice.location_id,
+        PriceRecord.commodity_id == LocationLatestPrice.commodity_id,
         PriceRecord.recorded_at >= start_date,
         PriceRecord.recorded_at <= end_date,
+        PriceRecord.price > 0,
+    )
+    recent_prices = db.query(LocationLatestPrice.id).filter(
+        LocationLatestPrice.location_id == Location.id,
+        or_(
+            and_(LocationLatestPrice.recorded_at <= end_date, LocationLatestPrice.price > 0),
+            and_(LocationLatestPrice.recorded_at > end_date, earlier_price.exists()),
+        ),
+        *latest_price_conditions,
+    )
+    if category_commodity_ids is not None:
+        recent_prices = recent_prices.filter(LocationLatestPrice.commodity_id.in_(category_commodity_ids))
+
+    # Coarse cull on the indexed grid cells covering the circle's bounding box,
+    # then the exact distance, all in the query that pages and counts
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    distance = haversine_km_sql(lat, lng, Location.latitude, Location.longitude)
+    location_conditions = [
+        or_(*[Location.grid_cell.between(first, last) for first, last in cell_ranges(lat, lng, radius_km)]),
+        Location.latitude >= min_lat,
+        Location.latitude <= max_lat,
+        Location.longitude >= min_lng,
+        Location.longitude <= max_lng,
+        distance <= radius_km,
+        recent_prices.exists(),
     ]
-    
-    # Add commodity filter to price records if specified
-    if commodity_id:
-        price_filter_conditions.append(PriceRecord.commodity_id == commodity_id)
+    order = [distance, Location.id] if order_by_distance else [Location.id]
 
-    ranked_prices = (
+    page = (
         db.query(
-            PriceRecord.id,
-            PriceRecord.location_id,
-            PriceRecord.commodity_id,
-            PriceRecord.price,
-            PriceRecord.recorded_at,
-            PriceRecord.region_id,
-            func.row_number()
-            .over(
-                partition_by=[PriceRecord.location_id, PriceRecord.commodity_id],
-                order_by=PriceRecord.recorded_at.desc(),
-            )
-            .label("rank"),
+            Location.id,
+            distance.label("distance_km"),
+            func.count().over().label("total"),
         )
-        .filter(and_(*price_filter_conditions))
-        .subquery()
+        .filter(*location_conditions)
+        .order_by(*order)
+        .offset(skip)
+        .limit(limit)
+        .all()
     )
 
-    # Get only the latest price record for each location-commodity pair
-    latest_prices = (
-        db.query(
+    if page:
+        total_count = page[0].total
+    elif skip > 0:
+        # A page past the end carries no window count
+        total_count = db.query(func.count(Location.id)).filter(*location_conditions).scalar()
+    else:
+        total_count = 0
+
+    if not page:
+        return {"locations": [], "total": total_count, "skip": skip, "limit": limit}
+
+    paginated_location_ids = [row.id for row in page]
+    distance_by_id = {row.id: row.distance_km for row in page}
+
+    # Get the latest price of each location-commodity pair, maintained on write
+    latest_prices = [
+        row._asdict()
+        for row in db.query(
             Location.id,
             Location.name,
             Location.address,
             Location.latitude,
             Location.longitude,
-            ranked_prices.c.price,
-            ranked_prices.c.recorded_at,
+            LocationLatestPrice.commodity_id,
+            LocationLatestPrice.region_id,
+            LocationLatestPrice.price,
+            LocationLatestPrice.previous_price,
+            LocationLatestPrice.recorded_at,
             Commodity.name.label("commodity_name"),
             Commodity.category,
             Commodity.unit,
             Region.name.label("region_name"),
         )
-        .join(ranked_prices, Location.id == ranked_prices.c.location_id)
-        .join(Commodity, ranked_prices.c.commodity_id == Commodity.id)
-        .join(Region, ranked_prices.c.region_id == Region.id)
-        .filter(ranked_prices.c.rank == 1)
-        .all()
-    )
+        .join(LocationLatestPrice, Location.id == LocationLatestPrice.location_id)
+        .join(Commodity, LocationLatestPrice.commodity_id == Commodity.id)
+        .join(Region, LocationLatestPrice.region_id == Region.id)
+        .filter(LocationLatestPrice.location_id.in_(paginated_location_ids), *latest_price_conditions)
+    ]
+
+    # Pairs whose latest record is dated after today show their latest price up to today
+    future_pairs = [(row["id"], row["commodity_id"]) for row in latest_prices if row["recorded_at"] > end_date]
+    if future_pairs:
+        current = location_latest_price.latest_through(db, future_pairs, end_date)
+        region_names = dict(
+            db.query(Region.id, Region.name).filter(Region.id.in_({row["region_id"] for row in current.values()}))
+        )
+        kept = []
+        for row in latest_prices:
+            if row["recorded_at"] > end_date:
+                replacement = current.get((row["id"], row["commodity_id"]))
+                if replacement is None or replacement["recorded_at"] < start_date:
+                    continue
+                row.update(
+                    {column: replacement[column] for column in ("price", "previous_price", "recorded_at")},
+                    region_name=region_names[replacement["region_id"]],
+                )
+            kept.append(row)
+        latest_prices = kept
 
     # Process results to group by location
     locations_dict = {}
     for row in latest_prices:
-        location_id = row.id
+        location_id = row["id"]
         if location_id not in locations_dict:
             locations_dict[location_id] = {
                 "id": location_id,
-                "name": row.name,
-                "address": row.address or "",
-                "lat": float(row.latitude),
-                "lng": float(row.longitude),
+                "name": row["name"],
+                "address": row["address"] or "",
+                "lat": float(row["latitude"]),
+                "lng": float(row["longitude"]),
                 "commodities": [],
-                "region_name": row.region_name,
-                "category_counts": {},
+                "region_name": row["region_name"],
+                "category_counts": Counter(),
             }
 
         # Track commodity categories for determining location type
-        if row.category not in locations_dict[location_id]["category_counts"]:
-            locations_dict[location_id]["category_counts"][row.category] = 0
-        locations_dict[location_id]["category_counts"][row.category] += 1
+        locations_dict[location_id]["category_counts"][row["category"]] += 1
 
         # Add this commodity price - only add if price > 0
-        if row.price > 0:
+        if row["price"] > 0:
             locations_dict[location_id]["commodities"].append(
                 {
-                    "name": row.commodity_name,
-                    "price": row.price,
-                    "unit": row.unit,
-                    "recorded_at": row.recorded_at.isoformat(),
-                    "category": row.category,
+                    "name": row["commodity_name"],
+                    "price": row["price"],
+                    "previous_price": row["previous_price"],
+                    "unit": row["unit"],
+                    "recorded_at": row["recorded_at"].isoformat(),
+                    "category": row["category"],
                 }
             )
 
-    # Convert to list and determine location category
+    # Convert to list, in page order, and determine location category
     locations_list = []
-    for location_data in locations_dict.values():
-        # Skip locations with no commodity data
-        if not location_data["commodities"]:
-            continue
-
-        # Group categories for display
-        if location_data["category_counts"]:
-            most_common_category = max(
-                location_data["category_counts"],
-                key=location_data["category_counts"].get,
-            )
-
-            # Define category groups for display
-            food_categories = [
-                "agriculture",
-                "pulses",
-                "vegetables",
-                "spices",
-                "fish",
-                "meat",
-                "dairy",
-                "grocery",
-                "fruits",
-                "poultry",
-            ]
-            energy_categories = ["oil"]
-            household_categories = ["stationery", "construction"]
-
-            # Map to display categories
-            if most_common_category in food_categories:
-                display_category = "food"
-            elif most_common_category in energy_categories:
-                display_category = "energy"
-            elif most_common_category in household_categories:
-                display_category = "household"
-            else:
-                display_category = most_common_category
-        else:
-            display_category = "food"  # Default if no category is found
+    for location_data in (locations_dict[id] for id in paginated_location_ids if id in locations_dict):
+        # Map the most common category to its display group
+        most_common_category = location_data["category_counts"].most_common(1)[0][0]
+        display_category = display_group(most_common_category)
 
         # Sort commodities by latest recorded_at date in descending order (newest first)
         location_data["commodities"].sort(key=lambda x: x["recorded_at"], reverse=True)
@@ -280,6 +255,7 @@ def get_locations_with_prices(
             "category": display_category,
             "lat": location_data["lat"],
             "lng": location_data["lng"],
+            "distance_km": round(distance_by_id[location_data["id"]], 3),
             "commodities": location_data["commodities"],
             "region_name": location_data["region_name"],
         }
@@ -303,6 +279,166 @@ def get_locations_with_prices(
     }
 
 
+@router.get("/nearest")
+def get_nearest_prices(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    commodity_id: int = Query(..., description="Commodity to compare prices of"),
+    lat: float = Query(..., description="Center latitude for search"),
+    lng: float = Query(..., description="Center longitude for search"),
+    radius_km: float = Query(5, gt=0, description="Search radius in kilometers"),
+    days: int = Query(30, description="Number of days to look back for price data"),
+    sort: Literal["price", "distance", "score"] = Query(
+        "price",
+        description="Order by price, by distance, or by a score of price raised with distance",
+    ),
+    distance_weight: float = Query(
+        1.0,
+        ge=0,
+        description="Share the score adds to a price at the edge of the radius (score only)",
+    ),
+    limit: int = Query(10, ge=1, le=100, description="Number of locations returned"),
+) -> Any:
+    """
+    Get the cheapest (or nearest) locations selling a commodity around a point.
+
+    Answered from an in-memory KD-tree of locations joined with each
+    location's latest price of the commodity, so no location query runs per
+    request. score = price * (1 + distance_weight * distance_km / radius_km).
+    """
+    not_modified = conditional_get(db, request, response)
+    if not_modified:
+        return not_modified
+
+    commodity = crud.commodity.get(db, id=commodity_id)
+    if not commodity:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Commodity not found",
+        )
+
+    since = datetime.now().date() - timedelta(days=days)
+    matches, total = location_index.ensure_fresh(db).nearest(
+        db,
+        commodity_id,
+        lat,
+        lng,
+        radius_km=radius_km,
+        since=since,
+        limit=limit,
+        sort=sort,
+        distance_weight=distance_weight,
+    )
+
+    return {
+        "commodity": {"id": commodity.id, "name": commodity.name, "unit": commodity.unit},
+        "locations": [
+            {
+                "id": match.location_id,
+                "name": match.name,
+                "address": match.address,
+                "lat": match.latitude,
+                "lng": match.longitude,
+                "distance_km": round(match.distance_km, 3),
+                "price": match.price,
+                "previous_price": match.previous_price,
+                "recorded_at": match.recorded_at.isoformat(),
+                "score": round(match.score, 2),
+            }
+            for match in matches
+        ],
+        "total": total,
+        "sort": sort,
+    }
+
+
+@router.get("/index", response_model=Dict[str, Any])
+def read_location_index_status() -> Any:
+    """
+    Get the size of the in-memory location index behind /locations/nearest.
+    """
+    return location_index.footprint()
+
+
+@router.get("/clusters")
+def get_location_clusters(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    zoom: int = Query(..., ge=0, le=22, description="Map zoom level"),
+    bbox: str = Query(..., description="Visible area as west,south,east,north in degrees"),
+    commodity_id: Optional[int] = Query(
+        None,
+        description="Cluster only locations pricing this commodity, with its price stats"
+    ),
+    days: int = Query(30, description="Number of days to look back for price data"),
+) -> Any:
+    """
+    Get grid clusters of locations with recent prices for a map view.
+
+    Clusters come from a pyramid precomputed for every zoom level, so the
+    response size follows the visible area rather than the number of markets.
+    Each cluster has its location count, centroid and, with a commodity_id,
+    the min, max and average latest price of that commodity. A cluster of a
+    single location also carries its location_id.
+    """
+    try:
+        west, south, east, north = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox must be west,south,east,north",
+        )
+    if west > east or south > north:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="bbox must be west,south,east,north",
+        )
+
+    not_modified = conditional_get(db, request, response)
+    if not_modified:
+        return not_modified
+
+    since = datetime.now().date() - timedelta(days=days)
+    level, found = cluster_pyramid.ensure_fresh(db).clusters(
+        db, zoom, (west, south, east, north), commodity_id=commodity_id, since=since
+    )
+
+    def price(values: Any) -> Optional[float]:
+        return None if math.isnan(values) else round(float(values), 2)
+
+    clusters = []
+    for index in found.tolist():
+        count = int(level.count[index])
+        cluster = {
+            "lat": round(float(level.latitude[index]), 6),
+            "lng": round(float(level.longitude[index]), 6),
+            "count": count,
+            "min_price": price(level.min_price[index]),
+            "max_price": price(level.max_price[index]),
+            "avg_price": price(level.avg_price[index]),
+        }
+        if count == 1:
+            cluster["location_id"] = int(level.location_id[index])
+        clusters.append(cluster)
+
+    return {
+        "zoom": zoom,
+        "cell_size": level.cell_size,
+        "clusters": clusters,
+        "total": int(level.count[found].sum()),
+    }
+
+
+@router.get("/cluster-pyramid", response_model=Dict[str, Any])
+def read_cluster_pyramid_status() -> Any:
+    """
+    Get the number of cached cluster pyramids and clusters behind /locations/clusters.
+    """
+    return cluster_pyramid.footprint()
+
+
 @router.post("/", response_model=schemas.Location, status_code=status.HTTP_201_CREATED)
 def create_location(
     *,
@@ -1,31 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime, timedelta
-import statistics
 
 from app import crud
 from app.models.price_record import PriceRecord
 from app.db.session import get_db
+from app.services.data_version import conditional_get
+from app.services.prices import indicators
+from app.services.prices.asof import AsOfIndex, load_lookback
+from app.services.prices.cube import price_cube
 
 router = APIRouter()
 
 @router.get("/{commodity_id}", response_model=Dict[str, Any])
 def get_price_analysis(
     *,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     commodity_id: int,
-    timeframe: Optional[str] = "month"  # Can be "week", "month", "year", "all"
+    timeframe: Optional[str] = "month",  # Can be "week", "month", "year", "all"
+    window: int = Query(7, ge=1, description="Moving average window in records"),
+    windows: Optional[List[int]] = Query(None, description="Additional moving average windows"),
+    ema_span: Optional[int] = Query(None, ge=1, description="Span of an exponential moving average"),
+    trend_threshold: float = Query(1, ge=0, description="Slope above which prices are rising"),
+    strong_trend_threshold: float = Query(5, ge=0, description="Slope above which prices are strongly rising"),
 ) -> Any:
     """
     Get detailed price analysis for a commodity including:
     - Price volatility
     - Price trends
-    - Moving averages
+    - Moving averages (and optional extra windows / EMA as movingAvg<N> / ema)
     - Seasonal patterns (if available)
     - Min/max ranges
     """
+    not_modified = conditional_get(db, request, response)
+    if not_modified:
+        return not_modified
+    
     # Validate the commodity exists
     commodity = crud.commodity.get(db=db, id=commodity_id)
     if not commodity:
@@ -42,19 +55,19 @@ def get_price_analysis(
         start_date = now - timedelta(days=30)
     elif timeframe == "year":
         start_date = now - timedelta(days=365)
-    else:  # "all"
-        # Get the date of the oldest record
-        oldest_record = db.query(PriceRecord).filter(
-            PriceRecord.commodity_id == commodity_id
-        ).order_by(PriceRecord.recorded_at).first()
-        
-        start_date = oldest_record.recorded_at if oldest_record else now - timedelta(days=365)
+    else:  # "all" - every record, so there is nothing before the timeframe
+        start_date = None
     
     # Get price records in the given timeframe
-    price_records = db.query(PriceRecord).filter(
-        PriceRecord.commodity_id == commodity_id,
-        PriceRecord.recorded_at >= start_date
-    ).order_by(PriceRecord.recorded_at).all()
+    use_cube = price_cube.enabled_for("price_analysis")
+    if use_cube:
+        price_records = price_cube.ensure_fresh(db).points(commodity_id, start_date)
+    else:
+        # Only the columns the analysis needs, so long timeframes skip ORM object construction
+        query = db.query(PriceRecord.recorded_at, PriceRecord.price).filter(PriceRecord.commodity_id == commodity_id)
+        if start_date is not None:
+            query = query.filter(PriceRecord.recorded_at >= start_date)
+        price_records = query.order_by(PriceRecord.recorded_at, PriceRecord.id).all()
     
     # Check if we have data to analyze
     if not price_records:
@@ -69,78 +82,57 @@ def get_price_analysis(
             "price_data": [],
         }
     
-    # Extract prices and dates for analysis
-    prices = [record.price for record in price_records]
-    dates = [record.recorded_at.isoformat() for record in price_records]
+    # Vectorized statistics over the whole series
+    prices = indicators.to_array([record.price for record in price_records])
     
     # Basic statistics
-    avg_price = sum(prices) / len(prices)
-    min_price = min(prices)
-    max_price = max(prices)
+    avg_price = float(prices.mean())
+    min_price = min(record.price for record in price_records)
+    max_price = max(record.price for record in price_records)
     
     # Calculate volatility (standard deviation / mean)
     # Higher volatility indicates more erratic price movements
-    try:
-        price_stddev = statistics.stdev(prices)
-        volatility = round((price_stddev / avg_price) * 100, 2)
-    except statistics.StatisticsError:
-        volatility = 0
+    volatility = indicators.volatility(prices)
     
-    # Calculate trend (simple linear regression)
+    # Calculate trend (least-squares linear regression)
     # Positive slope = rising trend, Negative slope = falling trend
-    n = len(prices)
-    if n > 1:
-        indices = list(range(n))
-        sum_x = sum(indices)
-        sum_y = sum(prices)
-        sum_xy = sum(i * p for i, p in zip(indices, prices))
-        sum_xx = sum(i * i for i in indices)
-        
-        try:
-            slope = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x * sum_x)
-            
-            # Interpret the trend
-            if slope > 5:
-                trend = "strongly rising"
-            elif slope > 1:
-                trend = "rising"
-            elif slope < -5:
-                trend = "strongly falling"
-            elif slope < -1:
-                trend = "falling"
-            else:
-                trend = "stable"
-        except ZeroDivisionError:
-            trend = "stable"
-    else:
-        trend = "insufficient data"
-    
-    # Calculate moving averages (7-day)
-    moving_avgs = []
-    window_size = min(7, len(prices))
+    trend = indicators.classify_trend(
+        indicators.trend_slope(prices),
+        threshold=trend_threshold,
+        strong_threshold=strong_trend_threshold,
+    )
     
-    for i in range(len(prices)):
-        if i < window_size - 1:
-            # Not enough data for a full window yet
-            moving_avgs.append(None)
-        else:
-            window = prices[i-(window_size-1):i+1]
-            moving_avgs.append(round(sum(window) / len(window)))
+    # Calculate moving averages
+    moving_avgs = indicators.to_rounded_list(indicators.moving_average(prices, window))
+    extra_indicators = {
+        f"movingAvg{size}": indicators.to_rounded_list(indicators.moving_average(prices, size))
+        for size in windows or []
+        if size != window
+    }
+    if ema_span is not None:
+        extra_indicators["ema"] = indicators.to_rounded_list(
+            indicators.exponential_moving_average(prices, ema_span)
+        )
     
     # Calculate month-over-month changes
+    # Each "closest record a month ago" lookup is a binary search over the series
+    month_ago_dates = [record.recorded_at - timedelta(days=30) for record in price_records]
+    if use_cube:
+        month_ago_prices = price_cube.asof_dates(commodity_id, month_ago_dates)
+    else:
+        # The series plus the records a month before the timeframe, loaded once
+        points = [(record.recorded_at, record.price) for record in price_records]
+        if start_date is not None:
+            points = load_lookback(
+                db, commodity_id=commodity_id, start_date=start_date, lookback_days=30
+            ) + points
+        series = AsOfIndex(points)
+        month_ago_prices = [series.lookup(day) for day in month_ago_dates]
+    
     monthly_changes = []
-    for i, record in enumerate(price_records):
-        current_date = record.recorded_at
-        month_ago_date = current_date - timedelta(days=30)
-        
-        # Find the closest price record from a month ago
-        month_ago_record = db.query(PriceRecord).filter(
-            PriceRecord.commodity_id == commodity_id,
-            PriceRecord.recorded_at <= month_ago_date
-        ).order_by(desc(PriceRecord.recorded_at)).first()
-        
-        if month_ago_record:
-            change_pct = ((record.price - month_ago_record.price) / month_ago_record.price) * 100
+    for record, month_ago_price in zip(price_records, month_ago_prices):
+        if month_ago_price:
+            change_pct = ((record.price - month_ago_price) / month_ago_price) * 100
             monthly_changes.append(round(change_pct, 2))
         else:
             monthly_changes.append(None)
@@ -152,7 +144,8 @@ def get_price_analysis(
             "date": record.recorded_at.isoformat(),
             "price": record.price,
             "movingAvg": moving_avgs[i],
-            "monthlyChange": monthly_changes[i]
+            "monthlyChange": monthly_changes[i],
+            **{key: values[i] for key, values in extra_indicators.items()},
         })
     
     # Get min/max price from the commodity model if available
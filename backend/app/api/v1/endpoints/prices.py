@@ -1,42 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from typing import Any, List, Optional, Dict
-from datetime import date, datetime, timedelta
+from datetime import date
+import logging
 
 from app import schemas, crud
 from app.db.session import get_db
-from app.models.region import Region
-from app.models.price_record import PriceRecord
+from app.services.data_version import conditional_get
+from app.services.prices.cube import price_cube
+from app.services.prices.export import FORMATS, price_export
+from app.services.prices.regional_snapshot import regional_snapshot
 
 router = APIRouter()
 
+# Set up logger
+logger = logging.getLogger("prices_api")
 
-@router.get("/", response_model=List[schemas.PriceRecord])
+# Price records inserted per transaction by the bulk endpoint
+BULK_BATCH_SIZE = 1000
+
+
+@router.get("/", response_model=schemas.PriceRecordPage)
 def read_price_records(
     db: Session = Depends(get_db),
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
     commodity_id: Optional[int] = None,
     region_id: Optional[int] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
 ) -> Any:
     """
-    Retrieve price records with filtering options.
+    Retrieve price records with filtering options, newest first.
+    Pages are keyed on (recorded_at, id); pass next_cursor back to get the next page.
     """
-    prices = crud.price_record.get_multi(
-        db, skip=skip, limit=limit, 
-        commodity_id=commodity_id, 
-        region_id=region_id,
-        start_date=start_date,
-        end_date=end_date
-    )
-    return prices
+    try:
+        prices, next_cursor = crud.price_record.get_page(
+            db, cursor=cursor, limit=limit, 
+            commodity_id=commodity_id, 
+            region_id=region_id,
+            start_date=start_date,
+            end_date=end_date
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return {"items": prices, "next_cursor": next_cursor}
 
 
 @router.get("/regions", response_model=Dict[str, List[Dict[str, Any]]])
 def get_regional_prices(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     commodity_id: int = Query(..., description="ID of the commodity to get regional prices for"),
     time_window: int = Query(30, description="Time window in days for price trends (7, 30, 90)")
@@ -45,6 +65,10 @@ def get_regional_prices(
     Get the most recent price for each region for a specific commodity, with trend analysis
     based on the specified time window.
     """
+    not_modified = conditional_get(db, request, response)
+    if not_modified:
+        return not_modified
+    
     # Check if commodity exists
     commodity = crud.commodity.get(db=db, id=commodity_id)
     if not commodity:
@@ -53,67 +77,82 @@ def get_regional_prices(
             detail="Commodity not found",
         )
     
-    # Get all regions
-    regions = db.query(Region).all()
-    if not regions:
-        return {"prices": []}
-    
-    # Calculate date range for time window
-    today = datetime.now().date()
-    start_date = today - timedelta(days=time_window)
+    # Latest, window start and window average prices for every region in one query
+    if price_cube.enabled_for("regional_prices"):
+        snapshots = regional_snapshot.get_for_commodity_from_cube(
+            db, price_cube.ensure_fresh(db), commodity_id=commodity_id, window_days=time_window
+        )
+    else:
+        snapshots = regional_snapshot.get_for_commodity(
+            db, commodity_id=commodity_id, window_days=time_window
+        )
     
     # Prepare the response data
     regional_prices = []
     
-    for region in regions:
-        # Get the most recent price record for this region and commodity
-        latest_price = db.query(PriceRecord).filter(
-            PriceRecord.commodity_id == commodity_id,
-            PriceRecord.region_id == region.id
-        ).order_by(
-            PriceRecord.recorded_at.desc()
-        ).first()
+    for snapshot in snapshots:
+        # Calculate trend percentage (if we have historical data)
+        trend_percentage = None
+        start_window_price = snapshot.window_start_price
+        if start_window_price and start_window_price > 0:
+            trend_percentage = round(((snapshot.latest_price - start_window_price) / start_window_price) * 100, 1)
+        
+        avg_price = round(snapshot.window_avg_price) if snapshot.window_avg_price else snapshot.latest_price
         
-        # Only include regions with price data
-        if latest_price:
-            # Calculate trend for the time window
-            start_window_price = db.query(PriceRecord).filter(
-                PriceRecord.commodity_id == commodity_id,
-                PriceRecord.region_id == region.id,
-                PriceRecord.recorded_at <= (start_date + timedelta(days=5))  # Give a 5-day buffer for data availability
-            ).order_by(
-                PriceRecord.recorded_at.desc()
-            ).first()
-            
-            # Calculate trend percentage (if we have historical data)
-            trend_percentage = None
-            if start_window_price and start_window_price.price > 0:
-                trend_percentage = round(((latest_price.price - start_window_price.price) / start_window_price.price) * 100, 1)
-            
-            # Get average price for this time window
-            avg_price_query = db.query(
-                func.avg(PriceRecord.price).label("avg_price")
-            ).filter(
-                PriceRecord.commodity_id == commodity_id,
-                PriceRecord.region_id == region.id,
-                PriceRecord.recorded_at >= start_date
-            ).scalar()
-            
-            avg_price = round(avg_price_query) if avg_price_query else latest_price.price
-            
-            regional_prices.append({
-                "regionId": region.id,
-                "regionName": region.name,
-                "price": latest_price.price,
-                "avgPrice": avg_price,
-                "trend": trend_percentage,
-                "lat": region.latitude,
-                "lng": region.longitude
-            })
+        regional_prices.append({
+            "regionId": snapshot.region_id,
+            "regionName": snapshot.region_name,
+            "price": snapshot.latest_price,
+            "avgPrice": avg_price,
+            "trend": trend_percentage,
+            "lat": snapshot.latitude,
+            "lng": snapshot.longitude
+        })
     
     return {"prices": regional_prices}
 
 
+@router.get("/export")
+def export_price_records(
+    format: str = Query("csv", description="Export format: csv or ndjson"),
+    commodity_id: Optional[int] = None,
+    region_id: Optional[int] = None,
+    location_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> Any:
+    """
+    Stream every matching price record, oldest first, as CSV or NDJSON.
+    """
+    if format not in FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid format. Must be one of: {', '.join(FORMATS)}",
+        )
+    
+    chunks = price_export.stream(
+        format,
+        commodity_id=commodity_id,
+        region_id=region_id,
+        location_id=location_id,
+        start_date=start_date,
+        end_date=end_date,
+    )
+    return StreamingResponse(
+        chunks,
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="prices.{format}"'},
+    )
+
+
+@router.get("/cube", response_model=Dict[str, Any])
+def read_price_cube_status() -> Any:
+    """
+    Get the size of the in-memory price cube and the endpoints reading from it.
+    """
+    return price_cube.footprint()
+
+
 @router.post("/", response_model=schemas.PriceRecord, status_code=status.HTTP_201_CREATED)
 def create_price_record(
     *,
@@ -133,6 +172,50 @@ def create_price_record(
         )
 
 
+@router.post("/bulk", response_model=schemas.PriceRecordBulkResult)
+def create_price_records_bulk(
+    *,
+    db: Session = Depends(get_db),
+    bulk_in: schemas.PriceRecordBulkCreate,
+) -> Any:
+    """
+    Create many price records at once.
+    Items are validated individually and written in batches with one commit each;
+    invalid items are reported by index without aborting the rest. Items with a
+    price_kind that match an existing record update it instead (see updated).
+    """
+    errors = []
+    valid = []
+    for index, item in enumerate(bulk_in.items):
+        try:
+            valid.append((index, schemas.PriceRecordCreate.model_validate(item)))
+        except ValidationError as e:
+            detail = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            )
+            errors.append({"index": index, "detail": detail})
+    
+    created = 0
+    updated = 0
+    for start in range(0, len(valid), BULK_BATCH_SIZE):
+        batch = valid[start:start + BULK_BATCH_SIZE]
+        try:
+            result = crud.price_record.upsert_many_with_location(
+                db, objs_in=[obj_in for _, obj_in in batch]
+            )
+        except SQLAlchemyError as e:
+            logger.error(f"Bulk price batch failed: {e}")
+            errors.extend({"index": index, "detail": "Batch failed to save"} for index, _ in batch)
+            continue
+        created += result.created
+        updated += result.updated
+        # Map batch positions back to request indexes
+        errors.extend({"index": batch[error["index"]][0], "detail": error["detail"]} for error in result.errors)
+    
+    errors.sort(key=lambda error: error["index"])
+    return {"created": created, "updated": updated, "errors": errors}
+
+
 @router.get("/{id}", response_model=schemas.PriceRecord)
 def read_price_record(
     *,
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import Any, List, Optional
 
@@ -53,16 +53,16 @@ def read_region(
     return region
 
 
-@router.get("/{id}/prices", response_model=List[schemas.PriceRecord])
+@router.get("/{id}/prices", response_model=schemas.PriceRecordPage)
 def read_region_prices(
     *,
     db: Session = Depends(get_db),
     id: int,
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
 ) -> Any:
     """
-    Get prices for a specific region.
+    Get prices for a specific region, newest first, one keyset page at a time.
     """
     region = crud.region.get(db=db, id=id)
     if not region:
@@ -70,4 +70,11 @@ def read_region_prices(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Region not found",
         )
-    return crud.price_record.get_by_region(db=db, region_id=id, skip=skip, limit=limit) 
\ No newline at end of file
+    try:
+        prices, next_cursor = crud.price_record.get_page(db, cursor=cursor, limit=limit, region_id=id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return {"items": prices, "next_cursor": next_cursor} 
\ No newline at end of file
@@ -2,130 +2,20 @@ from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from sqlalchemy.orm import Session
 from typing import Any, Dict, List
 from datetime import datetime, date
-import time
 import threading
 from concurrent.futures import ThreadPoolExecutor
 
 from app import crud
+from app.core.config import settings
 from app.db.session import get_db
 from app.schemas.price_record import PriceRecordCreate
-from app.utils.scraper_utils import (
-    scrape_excel_links, 
-    download_excel_in_memory, 
-    parse_excel, 
-    filter_links_by_date
-)
+from app.utils.aliases import commodity_aliases, is_skipped_market, market_aliases, reset_unmatched, unmatched_report
+from app.utils.scraper_cache import get_download_cache
+from app.utils.scraper_listing import discover_links
+from app.utils.scraper_pipeline import run_pipeline
 
 router = APIRouter()
 
-# Commodity name mapping (same as in process_commodity_data.py)
-COMMODITY_MAPPING = {
-    "Fine Rice (Nazir/Miniket)": 1,
-    "Medium Rice (Paijam/Atash)": 2,
-    "Medium Rice (Paijam/Lota)": 3,
-    "চাল (পাইজাম/লতা)": 3,
-    "Coarse Rice (Swarna/China Iri)": 4,
-    "White Flour (Loose)": 5,
-    "Flour (Packet)": 6,
-    "Maida (Loose)": 7,
-    "Maida (Packet)": 8,
-    "Soybean Oil (Loose)": 9,
-    "Soybean Oil (Bottled)": 10,
-    "Palm Oil (Loose)": 11,
-    "Super Palm Oil (Loose)": 12,
-    "Rice Bran Oil (Bottled)": 13,
-    "Palm Olein (Bottled)": 14,
-    "Masoor Dal (Large Grain)": 15,
-    "মশূর ডাল (বড় দানা)": 15,
-    "Masoor Dal (Medium Grain)": 16,
-    "Masoor Dal (Small Grain)": 17,
-    "Moong Dal (Varies by Quality)": 18,
-    "Anchor Dal": 19,
-    "Chickpea (Varies by Quality)": 20,
-    "Potato (Varies by Quality)": 21,
-    "Onion (Local)": 22,
-    "Onion (Imported)": 23,
-    "Garlic (Local)": 24,
-    "Garlic (Imported)": 25,
-    "Dry Chili (Local)": 26,
-    "Dry Chili (Imported)": 27,
-    "শুকনা মরিচ (আম)": 27,
-    "Turmeric (Local)": 28,
-    "Turmeric (Imported)": 29,
-    "Ginger (Local)": 30,
-    "Ginger (Imported)": 31,
-    "Cumin": 32,
-    "Cinnamon": 33,
-    "Clove": 34,
-    "Cardamom (Small)": 35,
-    "Coriander": 36,
-    "Bay Leaf": 37,
-    "Rui Fish": 38,
-    "Hilsa Fish": 39,
-    "Beef": 40,
-    "Mutton": 41,
-    "Broiler Chicken": 42,
-    "Local Chicken": 43,
-    "Powdered Milk (Packet)": 44,
-    "Dano Milk Powder": 45,
-    "Diploma Milk Powder (NZ)": 46,
-    "Fresh Milk Powder": 47,
-    "Marks Milk Powder": 48,
-    "Sugar": 49,
-    "Dates (Ordinary Quality)": 50,
-    "Iodized Salt (Packet)": 51,
-    "Egg (Farm)": 52,
-    "Writing Paper (White)": 53,
-    "MS Rod (60 Grade)": 54,
-    "MS Rod (40 Grade)": 55,
-    # Duplicates with different IDs
-    "Super Palm Oil (Loose)": 56,
-    "Potato (Varies by Quality)": 57,
-    "Potato (Varies by Quality)": 58,
-    "Onion (Local)": 59,
-    "Onion (Local)": 60,
-    "Onion (Local)": 61,
-    "Garlic (Local)": 62,
-    "Garlic (Local)": 63,
-    "রসুন(দেশী) নতুন/পুরাতন)": 63,
-    "Garlic (Local)": 64,
-    "রসুন(দেশী) পুরাতন": 64,
-    "Garlic (Local)": 65,
-    "Ginger (Local)": 66,
-    "আদা (দেশী) নতুন": 66,
-    "Iodized Salt (Packet)": 67,
-    "গরু (গোস্ত)": 40,
-}
-
-# Bazar name to place_id mapping (same as in process_commodity_data.py)
-BAZAR_PLACE_IDS = {
-    "Karwan Bazar": "ChIJJ_p5P5i4VTcRL7w40HP92u0",
-    "কাওরান বাজার (খুচরা ও পাইকারী)": "ChIJJ_p5P5i4VTcRL7w40HP92u0",
-    "Mohammadpur Town Hall Bazar": "ChIJ7-AQnle_VTcRJ2oN-bAlc2s",
-    "Kachukhet Bazar": "ChIJB1GCFTnHVTcRVO-Nw81exv4",
-    "Malibag": "ChIJmTj5xGK4VTcRVWaIFCvjgsI",
-    "মালিবাগ বাজার": "ChIJmTj5xGK4VTcRVWaIFCvjgsI",
-    "Hatirpool": "ChIJX8y6Jr25VTcR2c7y0gL7Gf0",
-    "Rampura Bazar": "ChIJK_f3mui5VTcR-HDJfI6lRoY",
-    "রামপুরা বাজার": "ChIJK_f3mui5VTcR-HDJfI6lRoY",
-    "Katasur Raw Bazar": "ChIJk0mBQ2W_VTcRFzqcmEx_7MY",
-    "কাটাসুর কাঁচা বাজার।": "ChIJk0mBQ2W_VTcRFzqcmEx_7MY",
-    "কাটাসুর কাঁচা বাজার": "ChIJk0mBQ2W_VTcRFzqcmEx_7MY",
-    "New Market": "ChIJVVltZNu5VTcRDoS-IiSqsas",
-    "মহাখালী বাজার": "ChIJVVVVVXDHVTcRRcFo68PKts8",
-    "মীরপুর-১ নং (খুচরা ও পাইকারী) বাজার": "ChIJZ_nGUe_AVTcRgqiOa2OVluA",
-    "মীরপুর-১ নং (পাইকারী) বাজার  ও বাদামতলী বাজার": "ChIJZ_nGUe_AVTcRgqiOa2OVluA",
-    "মীরপুর-১ নং (খুচরা ও পাইকারী) বাজার  ও বাদামতলী বাজার": "ChIJZ_nGUe_AVTcRgqiOa2OVluA",
-    "বাদামতলী বাজার": "ChIJ9RspLIG5VTcREGlWZJ-vIAo",
-    "সূত্রাপুর বাজার": "ChIJj087iaW5VTcRLoK6KoWTkM4",
-    "শ্যাম বাজার": "ChIJ6RSEorS5VTcRsU1V2lmn67I",
-    "মৌলভী বাজার পাইকারী বাজার": "ChIJvQGIBOK4VTcRspPgfCWuOhU",
-    "যাত্রাবাড়ী (খুচরা ও পাইকারী) বাজার": "ChIJ2ex_HCy5VTcRtmL8L8eZ7OU",
-    "যাত্রাবাড়ী (খুচরা ও পাইকারী) বাজার": "ChIJ2ex_HCy5VTcRtmL8L8eZ7OU"
-}
-
-# Bazars to skip
-skip_bazars = ["রহমতগঞ্জ", "উত্তরা আজম পুর বাজার", "শাহজাহানপুর"]
 class ScrapingStatus:
     """Class to track scraping status"""
     def __init__(self):
@@ -135,6 +25,7 @@ class ScrapingStatus:
         self.total_files = 0
         self.processed_files = 0
         self.records_created = 0
+        self.records_updated = 0
         self.errors = []
         self.start_time = None
 
@@ -147,15 +38,11 @@ status_lock = threading.RLock()
 
 def get_latest_tcb_date(db: Session) -> date:
     """Get the latest TCB record date from database"""
-    from sqlalchemy import text
+    from sqlalchemy import func
+    from app.models.price_record import PriceRecord
     try:
-        query = text("""
-            SELECT MAX(recorded_at) as latest_date 
-            FROM pricerecord 
-            WHERE source = 'TCB'
-        """)
-        result = db.execute(query).fetchone()
-        return result.latest_date if result and result.latest_date else None
+        # Typed through the column, so every backend returns a date
+        return db.query(func.max(PriceRecord.recorded_at)).filter(PriceRecord.source == 'TCB').scalar()
     except Exception as e:
         print(f"Error querying database: {e}")
         return None
@@ -167,10 +54,11 @@ def convert_scraped_data_to_records(scraped_data: List[Dict], db: Session) -> Li
     for item in scraped_data:
         commodity_name = item.get('commodity_name', '')
         
-        # Get commodity ID
-        commodity_id = COMMODITY_MAPPING.get(commodity_name)
-        if not commodity_id:
+        # Get commodity ID (unknown names are counted in the status report)
+        commodity = commodity_aliases.lookup(commodity_name)
+        if not commodity:
             continue
+        commodity_id = commodity.commodity_id
             
         # Parse date
         date_str = item.get('date', '').split()[0]
@@ -204,11 +92,12 @@ def convert_scraped_data_to_records(scraped_data: List[Dict], db: Session) -> Li
             
             for bazar in bazars:
                 # Skip specified bazars
-                if bazar in skip_bazars:
+                if is_skipped_market(bazar):
                     continue
 
-                if bazar in BAZAR_PLACE_IDS:
-                    place_id = BAZAR_PLACE_IDS[bazar]
+                market = market_aliases.lookup(bazar)
+                if market:
+                    place_id = market.place_id
                     
                     # Create records for min and max prices
                     if min_price is not None:
@@ -222,6 +111,7 @@ def convert_scraped_data_to_records(scraped_data: List[Dict], db: Session) -> Li
                             notes=f"Lowest price. Unit: {unit}",
                             location_id=0,
                             recorded_at=recorded_date,
+                            price_kind="lowest",
                             location={
                                 "name": bazar,
                                 "address": f"{bazar}, {district}",
@@ -244,6 +134,7 @@ def convert_scraped_data_to_records(scraped_data: List[Dict], db: Session) -> Li
                             notes=f"Highest price. Unit: {unit}",
                             location_id=0,
                             recorded_at=recorded_date,
+                            price_kind="highest",
                             location={
                                 "name": bazar,
                                 "address": f"{bazar}, {district}",
@@ -267,7 +158,10 @@ async def get_scraping_status() -> Dict[str, Any]:
         "total_files": scraping_status.total_files,
         "processed_files": scraping_status.processed_files,
         "records_created": scraping_status.records_created,
+        "records_updated": scraping_status.records_updated,
         "errors": scraping_status.errors[-10:],  # Last 10 errors
+        "location_cache": crud.location.cache.stats(),
+        "unmatched_names": unmatched_report(),
         "start_time": scraping_status.start_time,
         "duration": (datetime.now() - scraping_status.start_time).total_seconds() if scraping_status.start_time else None
     }
@@ -294,8 +188,10 @@ async def start_tcb_scraping(
         scraping_status.errors = []
         scraping_status.start_time = datetime.now()
         scraping_status.records_created = 0
+        scraping_status.records_updated = 0
         scraping_status.total_files = 0
         scraping_status.processed_files = 0
+        reset_unmatched()
     
     # Start true background thread using ThreadPoolExecutor
     future = executor.submit(run_scraping_process_thread, force_full_scrape)
@@ -342,75 +238,99 @@ def _run_scraping_process(db: Session, force_full_scrape: bool = False):
         
         # Get latest date if not forcing full scrape
         latest_date = None if force_full_scrape else get_latest_tcb_date(db)
+        cache = get_download_cache()
+        cursor = cache.load_cursor() if cache is not None and not force_full_scrape else None
         
         with status_lock:
             scraping_status.current_step = "Scraping Excel links using API calls..."
         
-        links = scrape_excel_links()
+        # Only pages newer than the latest stored date and the cursor are requested
+        filtered_links = discover_links(latest_date, cursor=cursor, full=force_full_scrape)
         
         with status_lock:
-            if not links:
-                scraping_status.errors.append("No Excel links found")
-                scraping_status.current_step = "Failed - No Excel links found"
+            if not filtered_links:
+                if force_full_scrape:
+                    scraping_status.errors.append("No Excel links found")
+                    scraping_status.current_step = "Failed - No Excel links found"
+                else:
+                    scraping_status.current_step = "Complete - No new data found"
                 return
             
-            # Filter links based on latest date
             if force_full_scrape:
-                filtered_links = links
-                scraping_status.current_step = f"Processing all {len(links)} Excel files..."
+                scraping_status.current_step = f"Processing all {len(filtered_links)} Excel files..."
             else:
-                filtered_links = filter_links_by_date(links, latest_date)
-                if not filtered_links:
-                    scraping_status.current_step = "Complete - No new data found"
-                    return
                 scraping_status.current_step = f"Processing {len(filtered_links)} new Excel files..."
                 
             scraping_status.total_files = len(filtered_links)
+            errors_before = len(scraping_status.errors)
         
-        # Process each Excel file
-        for i, link in enumerate(filtered_links):
+        # Download, parse and insert the Excel files concurrently; this thread is the single writer
+        def write_file(link: Dict[str, str], scraped_data: List[Dict]) -> None:
             try:
-                with status_lock:
-                    scraping_status.processed_files = i + 1
-                    scraping_status.progress = int(((i + 1) / len(filtered_links)) * 100)
-                    scraping_status.current_step = f"Processing file {i+1}/{len(filtered_links)}: {link['date']}"
+                if not scraped_data:
+                    return
                 
-                # Download and parse Excel
-                excel_data = download_excel_in_memory(link['url'])
-                if excel_data:
-                    # Parse Excel to get scraped data
-                    df = parse_excel(excel_data, link['date'], link['url'])
-                    
-                    if not df.empty:
-                        # Convert DataFrame to list of dicts
-                        scraped_data = df.to_dict('records')
-                        
-                        # Convert to database records
-                        records = convert_scraped_data_to_records(scraped_data, db)
-                        
-                        # Insert records into database
-                        for record in records:
-                            try:
-                                crud.price_record.create_with_location(db=db, obj_in=record)
-                                with status_lock:
-                                    scraping_status.records_created += 1
-                            except Exception as e:
-                                db.rollback()
-                                with status_lock:
-                                    scraping_status.errors.append(f"Error inserting record: {str(e)}")
-                                continue
-                            db.commit()
+                # Convert to database records
+                records = convert_scraped_data_to_records(scraped_data, db)
                 
-                time.sleep(1)  # Be respectful to the server
+                # Upsert the whole file as one batch in a single transaction, so files
+                # scraped again only update the records that changed
+                try:
+                    result = crud.price_record.upsert_many_with_location(
+                        db=db, objs_in=records
+                    )
+                    created, updated, errors = result.created, result.updated, result.errors
+                except Exception as e:
+                    db.rollback()
+                    created, updated, errors = 0, 0, [{"detail": f"Batch failed: {str(e)}"}]
                 
+                with status_lock:
+                    scraping_status.records_created += created
+                    scraping_status.records_updated += updated
+                    scraping_status.errors.extend(
+                        f"Error inserting record from {link['date']}: {error['detail']}"
+                        for error in errors
+                    )
             except Exception as e:
                 with status_lock:
                     scraping_status.errors.append(f"Error processing {link['url']}: {str(e)}")
-                continue
+            finally:
+                with status_lock:
+                    scraping_status.processed_files += 1
+                    done = scraping_status.processed_files
+                    scraping_status.progress = int((done / len(filtered_links)) * 100)
+                    scraping_status.current_step = f"Processed file {done}/{len(filtered_links)}: {link['date']}"
+        
+        def report_error(message: str) -> None:
+            with status_lock:
+                scraping_status.errors.append(message)
+        
+        run_pipeline(
+            filtered_links,
+            write_file,
+            on_error=report_error,
+            should_stop=lambda: not scraping_status.is_running,
+            cache=cache,
+            revalidate=settings.SCRAPER_CACHE_REVALIDATE,
+        )
+        
+        with status_lock:
+            # Advance the cursor only past files that were all processed cleanly
+            completed = scraping_status.is_running and len(scraping_status.errors) == errors_before
+        if completed and cache is not None:
+            try:
+                cache.store_cursor(max(filtered_links, key=lambda link: link["date"]))
+            except OSError as e:
+                print(f"Error saving the listing cursor: {e}")
         
         with status_lock:
-            scraping_status.current_step = f"Complete - Processed {scraping_status.processed_files} files, created {scraping_status.records_created} records"
-            print(f"Complete - Processed {scraping_status.processed_files} files, created {scraping_status.records_created} records")
+            for kind, names in unmatched_report().items():
+                if names["unmatched"]:
+                    scraping_status.errors.append(
+                        f"Unmatched {kind} names: {', '.join(names['unmatched'])}"
+                    )
+            scraping_status.current_step = f"Complete - Processed {scraping_status.processed_files} files, created {scraping_status.records_created} and updated {scraping_status.records_updated} records"
+            print(f"Complete - Processed {scraping_status.processed_files} files, created {scraping_status.records_created} and updated {scraping_status.records_updated} records")
             scraping_status.progress = 100
         
     except Exception as e:
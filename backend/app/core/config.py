@@ -26,6 +26,24 @@ class Settings(BaseSettings):
         return [origin.strip() for origin in self.BACKEND_CORS_ORIGINS.split(",") if origin.strip()]
 
     PROJECT_NAME: str = "BdTracks Commodity API"
+
+    # PRICE_CUBE_ENDPOINTS is a comma-separated list of endpoints answered from
+    # the in-memory price cube, e.g: "regional_prices,price_analysis"
+    PRICE_CUBE_ENDPOINTS: str = ""
+    # Seconds between data version checks while the cube is in use
+    PRICE_CUBE_REFRESH_SECONDS: int = 60
+
+    @property
+    def PRICE_CUBE_ENABLED_FOR(self) -> List[str]:
+        return [name.strip() for name in self.PRICE_CUBE_ENDPOINTS.split(",") if name.strip()]
+
+    # Seconds clients may reuse price-derived responses before revalidating their ETag
+    HTTP_CACHE_MAX_AGE: int = 60
+
+    # Directory of the TCB download cache (empty to always download)
+    SCRAPER_CACHE_DIR: str = ".cache/tcb"
+    # Send conditional requests for cached files instead of trusting the cache
+    SCRAPER_CACHE_REVALIDATE: bool = False
     
     # Database settings with defaults for development
     MYSQL_SERVER: str
@@ -8,6 +8,8 @@ from app.schemas.commodity import CommodityCreate, CommodityUpdate
 
 
 class CRUDCommodity(CRUDBase[Commodity, CommodityCreate, CommodityUpdate]):
+    versioned = True
+
     def get_multi(
         self, db: Session, *, skip: int = 0, limit: int = 100, category: Optional[str] = None
     ) -> List[Commodity]:
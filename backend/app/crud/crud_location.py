@@ -1,12 +1,151 @@
-from typing import Optional
-from sqlalchemy.orm import Session
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple, Union
+from sqlalchemy import and_, event, inspect, or_
+from sqlalchemy.orm import Session, make_transient_to_detached
 
 from app.crud.base import CRUDBase
 from app.models.location import Location
 from app.schemas.location import LocationCreate, LocationUpdate
+from app.services.location_index import location_index
+
+# Matching distance for coordinates, in degrees (about 10 meters)
+COORDINATE_TOLERANCE = 0.0001
+# Maximum number of keys kept by the resolution cache
+LOCATION_CACHE_SIZE = 4096
+# Session.info key of the locations cached once their transaction commits
+PENDING_CACHE_KEY = "pending_location_cache"
+
+
+class LocationCache:
+    """
+    Process-local LRU cache of resolved locations
+    
+    Locations are keyed by place_id, poi_id and a grid cell one tolerance wide,
+    and stored as column values so they can be attached to any session without
+    a query. Entries are evicted when their location is updated or deleted.
+    """
+    
+    def __init__(self, max_size: int = LOCATION_CACHE_SIZE, tolerance: float = COORDINATE_TOLERANCE):
+        self.max_size = max_size
+        self.tolerance = tolerance
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._keys: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._values: Dict[int, Dict[str, Any]] = {}
+        self._keys_by_id: Dict[int, Set[Hashable]] = {}
+    
+    def cell(self, latitude: float, longitude: float) -> Tuple[str, int, int]:
+        return "cell", int(latitude // self.tolerance), int(longitude // self.tolerance)
+    
+    def get_by_place_id(self, place_id: str) -> Optional[Dict[str, Any]]:
+        return self._get(("place_id", place_id))
+    
+    def get_by_poi_id(self, poi_id: str) -> Optional[Dict[str, Any]]:
+        return self._get(("poi_id", poi_id))
+    
+    def get_by_coordinates(self, latitude: float, longitude: float) -> Optional[Dict[str, Any]]:
+        """Get a cached location within the tolerance box, checking the neighbouring cells"""
+        _, row, column = self.cell(latitude, longitude)
+        with self._lock:
+            for d_row in (-1, 0, 1):
+                for d_column in (-1, 0, 1):
+                    key = ("cell", row + d_row, column + d_column)
+                    location_id = self._keys.get(key)
+                    if location_id is None:
+                        continue
+                    values = self._values[location_id]
+                    if (
+                        abs(values["latitude"] - latitude) <= self.tolerance
+                        and abs(values["longitude"] - longitude) <= self.tolerance
+                    ):
+                        self._keys.move_to_end(key)
+                        self.hits += 1
+                        return values
+            self.misses += 1
+            return None
+    
+    @staticmethod
+    def values_of(location: Location) -> Dict[str, Any]:
+        """Column values of a flushed location, as stored by the cache"""
+        return {attr.key: getattr(location, attr.key) for attr in inspect(Location).column_attrs}
+    
+    def store(self, location: Location) -> None:
+        """Cache a committed location under all of its keys"""
+        if location.id is None:
+            return
+        self.store_values(self.values_of(location))
+    
+    def store_values(self, values: Dict[str, Any]) -> None:
+        """Cache the column values of a committed location under all of its keys"""
+        location_id = values["id"]
+        keys: List[Hashable] = []
+        if values["place_id"]:
+            keys.append(("place_id", values["place_id"]))
+        if values["poi_id"]:
+            keys.append(("poi_id", values["poi_id"]))
+        if values["latitude"] and values["longitude"]:
+            keys.append(self.cell(values["latitude"], values["longitude"]))
+        
+        with self._lock:
+            self._values[location_id] = values
+            for key in keys:
+                self._keys[key] = location_id
+                self._keys.move_to_end(key)
+                self._keys_by_id.setdefault(location_id, set()).add(key)
+            while len(self._keys) > self.max_size:
+                key, location_id = self._keys.popitem(last=False)
+                self._forget_key(key, location_id)
+    
+    def evict(self, location_id: int) -> None:
+        with self._lock:
+            for key in self._keys_by_id.pop(location_id, set()):
+                if self._keys.get(key) == location_id:
+                    del self._keys[key]
+            self._values.pop(location_id, None)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
+            self._values.clear()
+            self._keys_by_id.clear()
+    
+    def stats(self) -> Dict[str, Union[int, float]]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._keys),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+    
+    def _get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            location_id = self._keys.get(key)
+            if location_id is None:
+                self.misses += 1
+                return None
+            self._keys.move_to_end(key)
+            self.hits += 1
+            return self._values[location_id]
+    
+    def _forget_key(self, key: Hashable, location_id: int) -> None:
+        keys = self._keys_by_id.get(location_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_id[location_id]
+                self._values.pop(location_id, None)
 
 
 class CRUDLocation(CRUDBase[Location, LocationCreate, LocationUpdate]):
+    versioned = True
+    
+    def __init__(self, model):
+        super().__init__(model)
+        self.cache = LocationCache()
+
     def get_by_place_id(self, db: Session, *, place_id: str) -> Optional[Location]:
         """Get a location by its Google Maps place_id"""
         return db.query(self.model).filter(self.model.place_id == place_id).first()
@@ -16,7 +155,7 @@ class CRUDLocation(CRUDBase[Location, LocationCreate, LocationUpdate]):
         return db.query(self.model).filter(self.model.poi_id == poi_id).first()
     
     def get_by_coordinates(
-        self, db: Session, *, latitude: float, longitude: float, tolerance: float = 0.0001
+        self, db: Session, *, latitude: float, longitude: float, tolerance: float = COORDINATE_TOLERANCE
     ) -> Optional[Location]:
         """
         Get a location by its coordinates with a small tolerance
@@ -41,32 +180,188 @@ class CRUDLocation(CRUDBase[Location, LocationCreate, LocationUpdate]):
         """
         Get an existing location or create a new one if it doesn't exist
         
-        First tries to find by place_id if provided, then by coordinates
+        First tries to find by place_id if provided, then by poi_id, then by
+        coordinates. Each step checks the resolution cache before the database.
         """
         location = None
         
         # Try to find by place_id first
         if obj_in.place_id:
-            location = self.get_by_place_id(db, place_id=obj_in.place_id)
+            location = self._from_cache(db, self.cache.get_by_place_id(obj_in.place_id))
+            location = location or self.get_by_place_id(db, place_id=obj_in.place_id)
             if location:
-                return location
+                return self._remember(db, location)
         
         # Try to find by poi_id next
         if obj_in.poi_id:
-            location = self.get_by_poi_id(db, poi_id=obj_in.poi_id)
+            location = self._from_cache(db, self.cache.get_by_poi_id(obj_in.poi_id))
+            location = location or self.get_by_poi_id(db, poi_id=obj_in.poi_id)
             if location:
-                return location
+                return self._remember(db, location)
         
         # Try to find by coordinates with a small tolerance
         if obj_in.latitude and obj_in.longitude:
-            location = self.get_by_coordinates(
+            location = self._from_cache(
+                db, self.cache.get_by_coordinates(obj_in.latitude, obj_in.longitude)
+            )
+            location = location or self.get_by_coordinates(
                 db, latitude=obj_in.latitude, longitude=obj_in.longitude
             )
             if location:
-                return location
+                return self._remember(db, location)
         
         # No existing location found, create a new one
-        return self.create(db, obj_in=obj_in)
+        return self._remember(db, self.create(db, obj_in=obj_in))
+    
+    def update(
+        self,
+        db: Session,
+        *,
+        db_obj: Location,
+        obj_in: Union[LocationUpdate, Dict[str, Any]]
+    ) -> Location:
+        self.cache.evict(db_obj.id)
+        db.info.get(PENDING_CACHE_KEY, {}).pop(db_obj.id, None)
+        location_index.invalidate()
+        return super().update(db, db_obj=db_obj, obj_in=obj_in)
+    
+    def remove(self, db: Session, *, id: int) -> Location:
+        self.cache.evict(id)
+        db.info.get(PENDING_CACHE_KEY, {}).pop(id, None)
+        location_index.invalidate()
+        return super().remove(db, id=id)
+    
+    def get_or_create_many(
+        self, db: Session, *, objs_in: List[LocationCreate], tolerance: float = COORDINATE_TOLERANCE
+    ) -> List[Location]:
+        """
+        Resolve many locations at once, with the same matching rules as get_or_create
+        
+        Existing locations come from the resolution cache or are looked up with one
+        query by place_id / poi_id and one by coordinates; items that match each
+        other share a single new row.
+        New rows are flushed but not committed, and the resolved locations only
+        enter the cache once the session commits, so a rollback never leaves ids
+        of rows that do not exist in it. Returns one location per item.
+        """
+        by_place_id: Dict[str, Location] = {}
+        by_poi_id: Dict[str, Location] = {}
+        # Only ids the resolution cache cannot answer go to the database
+        for place_id in {obj.place_id for obj in objs_in if obj.place_id}:
+            location = self._from_cache(db, self.cache.get_by_place_id(place_id))
+            if location is not None:
+                by_place_id[place_id] = location
+        for poi_id in {obj.poi_id for obj in objs_in if obj.poi_id}:
+            location = self._from_cache(db, self.cache.get_by_poi_id(poi_id))
+            if location is not None:
+                by_poi_id[poi_id] = location
+        place_ids = {obj.place_id for obj in objs_in if obj.place_id and obj.place_id not in by_place_id}
+        poi_ids = {obj.poi_id for obj in objs_in if obj.poi_id and obj.poi_id not in by_poi_id}
+        if place_ids or poi_ids:
+            conditions = []
+            if place_ids:
+                conditions.append(self.model.place_id.in_(place_ids))
+            if poi_ids:
+                conditions.append(self.model.poi_id.in_(poi_ids))
+            for location in db.query(self.model).filter(or_(*conditions)).order_by(self.model.id):
+                if location.place_id:
+                    by_place_id.setdefault(location.place_id, location)
+                if location.poi_id:
+                    by_poi_id.setdefault(location.poi_id, location)
+        
+        def find_by_ids(obj: LocationCreate) -> Optional[Location]:
+            if obj.place_id and obj.place_id in by_place_id:
+                return by_place_id[obj.place_id]
+            if obj.poi_id and obj.poi_id in by_poi_id:
+                return by_poi_id[obj.poi_id]
+            return None
+        
+        # Grid of cells one tolerance wide; a match is always in a neighbouring cell
+        grid: Dict[Tuple[int, int], List[Location]] = {}
+        
+        def cell(latitude: float, longitude: float) -> Tuple[int, int]:
+            return int(latitude // tolerance), int(longitude // tolerance)
+        
+        def add_to_grid(location: Location) -> None:
+            grid.setdefault(cell(location.latitude, location.longitude), []).append(location)
+        
+        def find_by_coordinates(obj: LocationCreate) -> Optional[Location]:
+            if not (obj.latitude and obj.longitude):
+                return None
+            row, column = cell(obj.latitude, obj.longitude)
+            matches = [
+                location
+                for d_row in (-1, 0, 1)
+                for d_column in (-1, 0, 1)
+                for location in grid.get((row + d_row, column + d_column), [])
+                if abs(location.latitude - obj.latitude) <= tolerance
+                and abs(location.longitude - obj.longitude) <= tolerance
+            ]
+            # Prefer the oldest existing row over rows created in this batch
+            return min(matches, key=lambda location: (location.id is None, location.id or 0)) if matches else None
+        
+        by_coordinates = [
+            obj for obj in objs_in if not find_by_ids(obj) and obj.latitude and obj.longitude
+        ]
+        # Deduplicate the boxes so repeated coordinates only appear once in the query
+        boxes = {(round(obj.latitude, 6), round(obj.longitude, 6)) for obj in by_coordinates}
+        boxes = list(boxes)
+        for i in range(0, len(boxes), 200):
+            chunk = boxes[i:i + 200]
+            query = db.query(self.model).filter(or_(*[
+                and_(
+                    self.model.latitude.between(latitude - tolerance, latitude + tolerance),
+                    self.model.longitude.between(longitude - tolerance, longitude + tolerance),
+                )
+                for latitude, longitude in chunk
+            ]))
+            for location in query:
+                add_to_grid(location)
+        
+        resolved = []
+        new_locations = []
+        for obj in objs_in:
+            location = find_by_ids(obj) or find_by_coordinates(obj)
+            if location is None:
+                location = self.model(**obj.model_dump())
+                new_locations.append(location)
+                if location.place_id:
+                    by_place_id[location.place_id] = location
+                if location.poi_id:
+                    by_poi_id[location.poi_id] = location
+                add_to_grid(location)
+            resolved.append(location)
+        
+        if new_locations:
+            db.add_all(new_locations)
+            db.flush()
+        for location in set(resolved):
+            self._remember(db, location)
+        return resolved
+    
+    def _from_cache(self, db: Session, values: Optional[Dict[str, Any]]) -> Optional[Location]:
+        """Attach a cached location to the session without querying it"""
+        if values is None:
+            return None
+        location = Location(**values)
+        make_transient_to_detached(location)
+        return db.merge(location, load=False)
+    
+    def _remember(self, db: Session, location: Location) -> Location:
+        """Cache a resolved location when the session's transaction commits"""
+        db.info.setdefault(PENDING_CACHE_KEY, {})[location.id] = self.cache.values_of(location)
+        return location
+
+
+location = CRUDLocation(Location)
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_locations(session: Session) -> None:
+    for values in session.info.pop(PENDING_CACHE_KEY, {}).values():
+        location.cache.store_values(values)
 
 
-location = CRUDLocation(Location) 
\ No newline at end of file
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_locations(session: Session) -> None:
+    session.info.pop(PENDING_CACHE_KEY, None) 
\ No newline at end of file
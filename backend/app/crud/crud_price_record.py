@@ -1,12 +1,39 @@
-from typing import List, Optional
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 from datetime import date
 
+from sqlalchemy import and_, insert, or_, tuple_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.orm import Session
 
 from app.crud.base import CRUDBase
-from app.models.price_record import PriceRecord
+from app.models.commodity import Commodity
+from app.models.price_record import NATURAL_KEY, PriceRecord
+from app.models.region import Region
 from app.schemas.price_record import PriceRecordCreate, PriceRecordUpdate
 from app.crud.crud_location import location as crud_location
+from app.services.data_version import PRICE_REWRITES, data_version
+from app.services.prices.cursor import CursorKey, decode_cursor, encode_cursor
+from app.services.prices.derived import refresh_derived
+
+# Columns a re-ingested record overwrites on its existing row; region_id is
+# left alone so the rollup buckets of the existing row stay correct
+UPSERT_COLUMNS = ("price", "notes", "source_url", "recorded_by")
+
+# Keep IN lists of natural key lookups well below driver and planner limits
+LOOKUP_CHUNK_SIZE = 500
+
+
+class BulkWriteResult(NamedTuple):
+    created: int
+    updated: int
+    unchanged: int
+    errors: List[Dict[str, Any]]
+
+
+def natural_key(row: Dict[str, Any]) -> Optional[Tuple]:
+    """Natural key of a record mapping, or None if a part is missing (never a conflict)"""
+    key = tuple(row.get(column) for column in NATURAL_KEY)
+    return None if any(part is None for part in key) else key
 
 
 class CRUDPriceRecord(CRUDBase[PriceRecord, PriceRecordCreate, PriceRecordUpdate]):
@@ -14,8 +41,14 @@ class CRUDPriceRecord(CRUDBase[PriceRecord, PriceRecordCreate, PriceRecordUpdate
         self, db: Session, *, skip: int = 0, limit: int = 100, 
         commodity_id: Optional[int] = None, region_id: Optional[int] = None,
         start_date: Optional[date] = None, end_date: Optional[date] = None,
-        location_id: Optional[int] = None
+        location_id: Optional[int] = None, after: Optional[CursorKey] = None
     ) -> List[PriceRecord]:
+        """
+        Get price records, newest first
+
+        Pass the (recorded_at, id) of the last record seen as `after` to page by
+        keyset instead of offset.
+        """
         query = db.query(self.model)
         if commodity_id:
             query = query.filter(self.model.commodity_id == commodity_id)
@@ -27,39 +60,58 @@ class CRUDPriceRecord(CRUDBase[PriceRecord, PriceRecordCreate, PriceRecordUpdate
             query = query.filter(self.model.recorded_at <= end_date)
         if location_id:
             query = query.filter(self.model.location_id == location_id)
-        return query.order_by(self.model.recorded_at.desc()).offset(skip).limit(limit).all()
+        if after is not None:
+            # Expanded row comparison so MySQL can use it as an index range
+            after_date, after_id = after
+            query = query.filter(
+                or_(
+                    self.model.recorded_at < after_date,
+                    and_(self.model.recorded_at == after_date, self.model.id < after_id),
+                )
+            )
+        query = query.order_by(self.model.recorded_at.desc(), self.model.id.desc())
+        if skip:
+            query = query.offset(skip)
+        return query.limit(limit).all()
+    
+    def get_page(
+        self, db: Session, *, cursor: Optional[str] = None, limit: int = 100, **filters: Any
+    ) -> Tuple[List[PriceRecord], Optional[str]]:
+        """
+        Get one keyset page of price records and the cursor of the next page
+
+        Filters are those of get_multi. Raises ValueError for an invalid cursor.
+        """
+        records = self.get_multi(db, limit=limit + 1, after=decode_cursor(cursor), **filters)
+        if len(records) <= limit:
+            return records, None
+        records = records[:limit]
+        last = records[-1]
+        return records, encode_cursor(last.recorded_at, last.id)
     
     def get_by_commodity(
-        self, db: Session, *, commodity_id: int, skip: int = 0, limit: int = 100
+        self, db: Session, *, commodity_id: int, skip: int = 0, limit: int = 100,
+        after: Optional[CursorKey] = None
     ) -> List[PriceRecord]:
-        return (
-            db.query(self.model)
-            .filter(self.model.commodity_id == commodity_id)
-            .order_by(self.model.recorded_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        return self.get_multi(db, skip=skip, limit=limit, commodity_id=commodity_id, after=after)
     
     def get_by_region(
-        self, db: Session, *, region_id: int, skip: int = 0, limit: int = 100
+        self, db: Session, *, region_id: int, skip: int = 0, limit: int = 100,
+        after: Optional[CursorKey] = None
     ) -> List[PriceRecord]:
-        return (
-            db.query(self.model)
-            .filter(self.model.region_id == region_id)
-            .order_by(self.model.recorded_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        return self.get_multi(db, skip=skip, limit=limit, region_id=region_id, after=after)
     
     def create_with_location(
-        self, db: Session, *, obj_in: PriceRecordCreate
+        self, db: Session, *, obj_in: PriceRecordCreate, refresh_rollups: bool = True
     ) -> PriceRecord:
         """
         Create a price record with an associated location
         
-        The frontend always sends complete location data.
+        The frontend always sends complete location data. A record matching an
+        existing natural key updates that row like upsert_many_with_location
+        does, and the stored row is returned. Bulk callers can pass
+        refresh_rollups=False and refresh the derived tables once per batch; the
+        data version is bumped in the record's transaction either way.
         """
         # Location data must be provided (should be validated at schema level)
         if not obj_in.location:
@@ -72,11 +124,169 @@ class CRUDPriceRecord(CRUDBase[PriceRecord, PriceRecordCreate, PriceRecordUpdate
         price_data = obj_in.dict(exclude={"location"})
         price_data["location_id"] = location.id
         
-        db_obj = self.model(**price_data)
-        db.add(db_obj)
-        db.commit()
+        key = natural_key(price_data)
+        existed = False
+        try:
+            if key is None:
+                db_obj = self.model(**price_data)
+                db.add(db_obj)
+                db.flush()
+            else:
+                existed = key in self._get_by_natural_keys(db, [key])
+                db.execute(self._upsert_statement(db), [price_data])
+                # The stored row keeps its region, so derived data is refreshed under it
+                db_obj = db.query(self.model).filter(
+                    *(getattr(self.model, column) == part for column, part in zip(NATURAL_KEY, key))
+                ).one()
+            if refresh_rollups:
+                refresh_derived(db, [db_obj], commit=False, rewrites=existed)
+            else:
+                data_version.bump(db)
+                if existed:
+                    data_version.bump(db, scope=PRICE_REWRITES)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
         db.refresh(db_obj)
         return db_obj
+    
+    def upsert_many_with_location(
+        self, db: Session, *, objs_in: List[PriceRecordCreate]
+    ) -> BulkWriteResult:
+        """
+        Write a batch of price records in one transaction, keyed by their natural key
+        
+        Locations are resolved for the whole batch at once. A record matching an
+        existing (commodity, location, day, source, price kind) updates that row
+        instead of adding one, and records identical to the stored row are not
+        written at all, so re-ingesting a file costs one lookup per batch. The rows
+        are written with a single INSERT ... ON DUPLICATE KEY UPDATE executemany
+        and the derived tables are refreshed for the changed rows before the one
+        commit. Items referring to unknown commodities or regions are skipped and
+        reported as {"index", "detail"} errors.
+        """
+        errors: List[Dict[str, Any]] = []
+        commodity_ids = {
+            row.id for row in db.query(Commodity.id).filter(Commodity.id.in_({obj.commodity_id for obj in objs_in}))
+        }
+        region_ids = {
+            row.id for row in db.query(Region.id).filter(Region.id.in_({obj.region_id for obj in objs_in}))
+        }
+        
+        valid = []
+        for index, obj_in in enumerate(objs_in):
+            if obj_in.commodity_id not in commodity_ids:
+                errors.append({"index": index, "detail": f"Commodity {obj_in.commodity_id} not found"})
+            elif obj_in.region_id not in region_ids:
+                errors.append({"index": index, "detail": f"Region {obj_in.region_id} not found"})
+            else:
+                valid.append(obj_in)
+        if not valid:
+            return BulkWriteResult(0, 0, 0, errors)
+        
+        try:
+            locations = crud_location.get_or_create_many(db, objs_in=[obj_in.location for obj_in in valid])
+            keyed: Dict[Tuple, Dict[str, Any]] = {}
+            unkeyed = []
+            for obj_in, location in zip(valid, locations):
+                row = obj_in.model_dump(exclude={"location"})
+                row["location_id"] = location.id
+                key = natural_key(row)
+                if key is None:
+                    unkeyed.append(row)
+                else:
+                    # The last occurrence in the batch wins, like consecutive upserts
+                    keyed[key] = row
+            
+            existing = self._get_by_natural_keys(db, list(keyed))
+            created, updated = [], []
+            # Updated rows keep their stored region, so their derived data is keyed by it
+            updated_keys: List[Dict[str, Any]] = []
+            unchanged = 0
+            for key, row in keyed.items():
+                current = existing.get(key)
+                if current is None:
+                    created.append(row)
+                elif any(getattr(current, column) != row[column] for column in UPSERT_COLUMNS):
+                    updated.append(row)
+                    updated_keys.append({
+                        "commodity_id": current.commodity_id,
+                        "region_id": current.region_id,
+                        "recorded_at": current.recorded_at,
+                        "location_id": current.location_id,
+                    })
+                else:
+                    unchanged += 1
+            created.extend(unkeyed)
+            
+            changed = created + updated
+            if changed:
+                db.execute(self._upsert_statement(db), changed)
+                refresh_derived(db, created + updated_keys, commit=False, rewrites=bool(updated))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        return BulkWriteResult(len(created), len(updated), unchanged, errors)
+    
+    def _get_by_natural_keys(self, db: Session, keys: List[Tuple]) -> Dict[Tuple, Any]:
+        """Get the stored rows of some natural keys, by key"""
+        found: Dict[Tuple, Any] = {}
+        if not keys:
+            return found
+        columns = [getattr(self.model, column) for column in NATURAL_KEY]
+        prefixes = sorted({key[:3] for key in keys})
+        for start in range(0, len(prefixes), LOOKUP_CHUNK_SIZE):
+            chunk = prefixes[start:start + LOOKUP_CHUNK_SIZE]
+            rows = db.query(
+                *columns, self.model.region_id, *[getattr(self.model, column) for column in UPSERT_COLUMNS]
+            ).filter(
+                # The leading columns of the unique index; source and kind are matched below
+                tuple_(self.model.commodity_id, self.model.location_id, self.model.recorded_at).in_(chunk)
+            )
+            for row in rows:
+                found[tuple(getattr(row, column) for column in NATURAL_KEY)] = row
+        return found
+    
+    def _upsert_statement(self, db: Session) -> Any:
+        """INSERT that updates the row with the same natural key instead of failing"""
+        dialect = db.get_bind().dialect.name
+        if dialect == "mysql":
+            stmt = mysql.insert(self.model)
+            return stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in UPSERT_COLUMNS})
+        if dialect in ("postgresql", "sqlite"):
+            stmt = (postgresql if dialect == "postgresql" else sqlite).insert(self.model)
+            return stmt.on_conflict_do_update(
+                index_elements=list(NATURAL_KEY),
+                set_={column: stmt.excluded[column] for column in UPSERT_COLUMNS},
+            )
+        return insert(self.model)
+    
+    def update(
+        self,
+        db: Session,
+        *,
+        db_obj: PriceRecord,
+        obj_in: Union[PriceRecordUpdate, Dict[str, Any]]
+    ) -> PriceRecord:
+        """Update a price record and refresh the derived data it moved out of and into"""
+        old_values = {
+            "commodity_id": db_obj.commodity_id,
+            "region_id": db_obj.region_id,
+            "recorded_at": db_obj.recorded_at,
+            "location_id": db_obj.location_id,
+        }
+        db_obj = super().update(db, db_obj=db_obj, obj_in=obj_in)
+        refresh_derived(db, [old_values, db_obj], rewrites=True)
+        return db_obj
+    
+    def remove(self, db: Session, *, id: int) -> PriceRecord:
+        """Delete a price record and refresh the derived data it belonged to"""
+        obj = super().remove(db, id=id)
+        refresh_derived(db, [obj], rewrites=True)
+        return obj
 
 
 price_record = CRUDPriceRecord(PriceRecord) 
\ No newline at end of file
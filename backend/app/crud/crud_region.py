@@ -8,6 +8,8 @@ from app.schemas.region import RegionCreate, RegionUpdate
 
 
 class CRUDRegion(CRUDBase[Region, RegionCreate, RegionUpdate]):
+    versioned = True
+
     def get_multi(
         self, db: Session, *, skip: int = 0, limit: int = 100, is_division: Optional[bool] = None
     ) -> List[Region]:
@@ -3,8 +3,12 @@
 from app.db.base_class import Base  # noqa
 from app.models.accident_data import AccidentData  # noqa
 from app.models.commodity import Commodity  # noqa
+from app.models.commodity_stats import CommodityStats  # noqa
+from app.models.data_version import DataVersion  # noqa
 from app.models.location import Location  # noqa
+from app.models.location_latest_price import LocationLatestPrice  # noqa
 from app.models.price_record import PriceRecord  # noqa
+from app.models.price_history import PriceHistoryAggregated  # noqa
 from app.models.region import Region  # noqa
 from app.models.user import User  # noqa
 from app.models.all_accidents_data import AllAccidentsData  # noqa
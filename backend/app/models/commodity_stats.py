@@ -0,0 +1,35 @@
+from sqlalchemy import Integer, Float, ForeignKey, Date, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from typing import Optional
+from datetime import date, datetime
+from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy.sql import func
+
+from app.db.base_class import Base
+
+
+class CommodityStats(Base):
+    """Materialized rolling price statistics per commodity for the commodity list"""
+    
+    @declared_attr.directive
+    @classmethod
+    def __tablename__(cls) -> str:
+        return "commodity_stats"
+    
+    commodity_id: Mapped[int] = mapped_column(Integer, ForeignKey("commodity.id"), nullable=False, unique=True, index=True)
+    # Statistics over the last 30 days (None when there are no recent prices)
+    current_price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    min_price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    max_price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Percent changes of the rolling averages
+    weekly_change: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    monthly_change: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    yearly_change: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    # The day the rolling windows were computed for
+    computed_for: Mapped[date] = mapped_column(Date, nullable=False, index=True)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime,
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=True
+    )
@@ -0,0 +1,26 @@
+from sqlalchemy import String, Integer, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from typing import Optional
+from datetime import datetime
+from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy.sql import func
+
+from app.db.base_class import Base
+
+
+class DataVersion(Base):
+    """Counter bumped on every write to a group of tables, used for HTTP caching"""
+    
+    @declared_attr.directive
+    @classmethod
+    def __tablename__(cls) -> str:
+        return "data_version"
+    
+    scope: Mapped[str] = mapped_column(String(50), nullable=False, unique=True, index=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    updated_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime,
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=True
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import String, Text, Float, DateTime
+from sqlalchemy import String, Text, Float, DateTime, Integer, event
 from sqlalchemy.orm import Mapped, mapped_column
 from typing import Optional
 from sqlalchemy.ext.declarative import declared_attr
@@ -6,6 +6,7 @@ from sqlalchemy.sql import func
 from datetime import datetime
 
 from app.db.base_class import Base
+from app.utils.geo import grid_cell
 
 
 class Location(Base):
@@ -20,6 +21,8 @@ class Location(Base):
     address: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     latitude: Mapped[float] = mapped_column(Float, nullable=False)
     longitude: Mapped[float] = mapped_column(Float, nullable=False)
+    # Spatial search cell, kept in sync with the coordinates (see app.utils.geo)
+    grid_cell: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, index=True)
     place_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True, index=True)
     poi_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     updated_at: Mapped[Optional[datetime]] = mapped_column(
@@ -29,4 +32,11 @@ class Location(Base):
         nullable=True
     )
     
-    # Relationships will be set up in app.db.setup_relationships 
\ No newline at end of file
+    # Relationships will be set up in app.db.setup_relationships
+
+
+@event.listens_for(Location, "before_insert")
+@event.listens_for(Location, "before_update")
+def _set_grid_cell(mapper, connection, target: Location) -> None:
+    if target.latitude is not None and target.longitude is not None:
+        target.grid_cell = grid_cell(target.latitude, target.longitude)
@@ -0,0 +1,40 @@
+from sqlalchemy import Integer, ForeignKey, Date, DateTime, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from typing import Optional
+from datetime import date, datetime
+from sqlalchemy.ext.declarative import declared_attr
+from sqlalchemy.sql import func
+
+from app.db.base_class import Base
+
+
+class LocationLatestPrice(Base):
+    """Materialized latest price of each commodity at each location for the price map"""
+
+    @declared_attr.directive
+    @classmethod
+    def __tablename__(cls) -> str:
+        return "location_latest_price"
+
+    location_id: Mapped[int] = mapped_column(Integer, ForeignKey("location.id"), nullable=False)
+    commodity_id: Mapped[int] = mapped_column(Integer, ForeignKey("commodity.id"), nullable=False, index=True)
+    # The latest record: last day with a price, highest id on that day
+    price_record_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    region_id: Mapped[int] = mapped_column(Integer, ForeignKey("region.id"), nullable=False)
+    price: Mapped[int] = mapped_column(Integer, nullable=False)
+    recorded_at: Mapped[date] = mapped_column(Date, nullable=False)
+    # The latest price of the day before, None for a single day of prices
+    previous_price: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    previous_recorded_at: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime,
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=True
+    )
+
+    __table_args__ = (
+        UniqueConstraint('location_id', 'commodity_id', name='uq_location_latest_price'),
+        # Map requests read a page of locations limited to recent prices
+        Index('idx_location_latest_recorded_at', 'location_id', 'recorded_at'),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, ForeignKey, Date, Enum, DateTime
+from sqlalchemy import Integer, BigInteger, ForeignKey, Date, Enum, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import date
 from sqlalchemy.ext.declarative import declared_attr
@@ -27,9 +27,17 @@ class PriceHistoryAggregated(Base):
     )
     period_start: Mapped[date] = mapped_column(Date, nullable=False)
     period_end: Mapped[date] = mapped_column(Date, nullable=False)
+    # Running totals so buckets can be combined across regions without rounding drift
+    price_sum: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+    record_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     created_at: Mapped[DateTime] = mapped_column(
         DateTime, 
         nullable=False, 
         server_default=func.current_timestamp()
-    ) 
\ No newline at end of file
+    )
+    
+    __table_args__ = (
+        UniqueConstraint('commodity_id', 'region_id', 'period', 'period_start', name='uq_pricehistory_bucket'),
+        Index('idx_pricehistory_commodity_period_start', 'commodity_id', 'period', 'period_start'),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import String, Integer, ForeignKey, Date, Text, DateTime, Index
+from sqlalchemy import String, Integer, ForeignKey, Date, Text, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 from typing import Optional
 from datetime import date
@@ -7,6 +7,13 @@ from sqlalchemy.sql import func
 
 from app.db.base_class import Base
 
+# Kinds of price published for a market and day; records without a kind
+# (single user submissions) are not deduplicated
+PRICE_KINDS = ("lowest", "highest")
+
+# Columns identifying one observation, enforced by uq_pricerecord_natural_key
+NATURAL_KEY = ("commodity_id", "location_id", "recorded_at", "source", "price_kind")
+
 
 class PriceRecord(Base):
     """Price record model for storing commodity prices by region"""
@@ -27,6 +34,7 @@ class PriceRecord(Base):
     notes: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     location_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("location.id"), nullable=True)
     recorded_at: Mapped[date] = mapped_column(Date, nullable=False, index=True)
+    price_kind: Mapped[Optional[str]] = mapped_column(String(10), nullable=True)
     created_at: Mapped[DateTime] = mapped_column(
         DateTime, 
         nullable=False, 
@@ -34,8 +42,12 @@ class PriceRecord(Base):
     )
     
     __table_args__ = (
-        Index('idx_commodity_recorded_at', 'commodity_id', 'recorded_at'),
-        Index('idx_region_recorded_at', 'region_id', 'recorded_at'),
+        # Include id so keyset pages on (recorded_at, id) are a single index range
+        Index('idx_commodity_recorded_at_id', 'commodity_id', 'recorded_at', 'id'),
+        Index('idx_region_recorded_at_id', 'region_id', 'recorded_at', 'id'),
+        Index('idx_recorded_at_id', 'recorded_at', 'id'),
+        # Re-ingesting the same observation updates it instead of adding a row
+        UniqueConstraint(*NATURAL_KEY, name='uq_pricerecord_natural_key'),
     )
     
     # Relationships will be set up in app.db.setup_relationships 
\ No newline at end of file
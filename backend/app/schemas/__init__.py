@@ -1,7 +1,7 @@
 from .accident_data import AccidentData, AccidentDataCreate, AccidentDataUpdate
 from .all_accidents_data import AllAccidentsData, AllAccidentsDataCreate, AllAccidentsDataUpdate
 from .commodity import Commodity, CommodityCreate, CommodityUpdate, CommodityDetail, CommodityInDropdown
-from .price_record import PriceRecord, PriceRecordCreate, PriceRecordUpdate
+from .price_record import PriceRecord, PriceRecordCreate, PriceRecordUpdate, PriceRecordPage, PriceRecordBulkCreate, PriceRecordBulkError, PriceRecordBulkResult
 from .region import Region, RegionCreate, RegionUpdate
 from .user import User, UserCreate, UserUpdate
 from .location import Location, LocationCreate, LocationUpdate 
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional
+from typing import Any, Dict, List, Literal, Optional
 from datetime import date, datetime
 from app.schemas.location import LocationCreate, Location
 
@@ -15,6 +15,9 @@ class PriceRecordBase(BaseModel):
     notes: Optional[str] = None
     location_id: Optional[int] = Field(None, description="ID of the associated location")
     recorded_at: date
+    price_kind: Optional[Literal["lowest", "highest"]] = Field(
+        None, description="Which published price this is; records with a kind are unique per source, location and day"
+    )
 
 
 # Properties to receive on item creation
@@ -52,4 +55,27 @@ class PriceRecordInDBBase(PriceRecordBase):
 
 # Properties to return to client
 class PriceRecord(PriceRecordInDBBase):
-    location: Optional[Location] = None 
\ No newline at end of file
+    location: Optional[Location] = None
+
+
+# Keyset page of price records
+class PriceRecordPage(BaseModel):
+    items: List[PriceRecord]
+    next_cursor: Optional[str] = Field(None, description="Cursor of the next page, None on the last page")
+
+
+# Bulk ingestion request; items are validated one by one so a bad item
+# does not reject the whole upload
+class PriceRecordBulkCreate(BaseModel):
+    items: List[Dict[str, Any]] = Field(..., max_length=10000, description="PriceRecordCreate items")
+
+
+class PriceRecordBulkError(BaseModel):
+    index: int
+    detail: str
+
+
+class PriceRecordBulkResult(BaseModel):
+    created: int
+    updated: int = 0
+    errors: List[PriceRecordBulkError] = []
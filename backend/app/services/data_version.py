@@ -0,0 +1,67 @@
+"""
+Data-version token for conditional GETs on price-derived read endpoints.
+
+Every write to price records, commodities, regions or locations bumps a
+counter in the data_version table. Read endpoints derive their ETag from it
+(and today's date, since rolling windows move daily) and answer a matching
+If-None-Match with 304 before running any aggregation.
+"""
+from datetime import datetime
+from typing import Optional
+
+from fastapi import Request, Response, status
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.data_version import DataVersion
+
+PRICE_DATA = "price_data"
+# Bumped (with PRICE_DATA) only when existing price records are changed or
+# deleted, so in-memory copies can tell a pure append from a rewrite
+PRICE_REWRITES = "price_rewrites"
+
+
+class DataVersionService:
+    """Service for reading and bumping data-version counters"""
+
+    def bump(self, db: Session, *, scope: str = PRICE_DATA, commit: bool = False) -> None:
+        """Increment a counter in the current transaction"""
+        updated = (
+            db.query(DataVersion)
+            .filter(DataVersion.scope == scope)
+            .update({DataVersion.version: DataVersion.version + 1}, synchronize_session=False)
+        )
+        if not updated:
+            db.add(DataVersion(scope=scope, version=1))
+        if commit:
+            db.commit()
+
+    def current(self, db: Session, *, scope: str = PRICE_DATA) -> int:
+        version = db.query(DataVersion.version).filter(DataVersion.scope == scope).scalar()
+        return version or 0
+
+    def etag(self, db: Session, *, scope: str = PRICE_DATA) -> str:
+        return f'W/"{self.current(db, scope=scope)}-{datetime.now().date().isoformat()}"'
+
+
+data_version = DataVersionService()
+
+
+def conditional_get(
+    db: Session, request: Request, response: Response, *, scope: str = PRICE_DATA
+) -> Optional[Response]:
+    """
+    Set ETag and Cache-Control on a read endpoint's response
+
+    Returns a 304 response to send instead when the client's copy is current.
+    """
+    etag = data_version.etag(db, scope=scope)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.HTTP_CACHE_MAX_AGE}, must-revalidate",
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,174 @@
+"""
+Zoom-level pyramid of grid clusters of priced locations for the map.
+
+Every level groups the locations of the LocationIndex into square
+latitude/longitude cells a quarter of a map tile wide at that zoom, and
+keeps per cell the number of locations, their centroid and the min, max and
+average of their latest prices. A request reads one level and the cells in
+its bounding box, so the payload grows with the area on screen instead of
+the number of markets.
+
+All levels are computed together per (commodity, window start) on first use
+and kept until the data version moves, which every price and location write
+bumps.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.location_latest_price import LocationLatestPrice
+from app.services.location_index import Points, location_index
+
+# Zoom levels of the pyramid; deeper requests read the last one
+MIN_ZOOM = 0
+MAX_ZOOM = 14
+# Cells per map tile edge (256 px tiles, so about 64 px per cell)
+CELLS_PER_TILE = 4
+# Pyramids kept for different commodities and windows
+MAX_PYRAMIDS = 64
+
+
+class ClusterLevel(NamedTuple):
+    """Clusters of one zoom level, ordered by (row, column)"""
+    cell_size: float
+    row: np.ndarray
+    column: np.ndarray
+    count: np.ndarray
+    latitude: np.ndarray  # centroid
+    longitude: np.ndarray
+    location_id: np.ndarray  # smallest location id, the location itself for single clusters
+    min_price: np.ndarray  # NaN without prices
+    max_price: np.ndarray
+    avg_price: np.ndarray
+
+
+def cell_size(zoom: int) -> float:
+    """Cluster cell edge in degrees at a zoom level"""
+    return 360.0 / (2 ** zoom) / CELLS_PER_TILE
+
+
+def _level(zoom: int, points: Points, selected: np.ndarray, prices: Optional[np.ndarray]) -> ClusterLevel:
+    size = cell_size(zoom)
+    latitudes = points.latitudes[selected]
+    longitudes = points.longitudes[selected]
+    rows = np.floor((latitudes + 90.0) / size).astype(np.int64)
+    columns = np.floor((longitudes + 180.0) / size).astype(np.int64)
+    keys, inverse = np.unique(rows * (2 ** zoom * CELLS_PER_TILE) + columns, return_inverse=True)
+    count = np.bincount(inverse, minlength=len(keys))
+
+    location_id = np.full(len(keys), np.iinfo(np.int64).max)
+    np.minimum.at(location_id, inverse, points.ids[selected])
+    if prices is not None:
+        values = prices[selected].astype(np.float64)
+        min_price = np.full(len(keys), np.inf)
+        max_price = np.full(len(keys), -np.inf)
+        np.minimum.at(min_price, inverse, values)
+        np.maximum.at(max_price, inverse, values)
+        avg_price = np.bincount(inverse, weights=values, minlength=len(keys)) / count
+    else:
+        min_price = max_price = avg_price = np.full(len(keys), np.nan)
+
+    return ClusterLevel(
+        size,
+        keys // (2 ** zoom * CELLS_PER_TILE),
+        keys % (2 ** zoom * CELLS_PER_TILE),
+        count,
+        np.bincount(inverse, weights=latitudes, minlength=len(keys)) / count,
+        np.bincount(inverse, weights=longitudes, minlength=len(keys)) / count,
+        location_id,
+        min_price,
+        max_price,
+        avg_price,
+    )
+
+
+class ClusterPyramid:
+    """Per-commodity cluster pyramids over the location index"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # {(commodity_id, since ordinal): levels}, cleared when the version moves
+        self._pyramids: "OrderedDict[Tuple[Optional[int], int], List[ClusterLevel]]" = OrderedDict()
+        self._version: Optional[int] = None
+
+    def ensure_fresh(self, db: Session) -> "ClusterPyramid":
+        """Refresh the location index and drop pyramids built before the data version moved"""
+        version = location_index.ensure_fresh(db).version
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._pyramids = OrderedDict()
+                    self._version = version
+        return self
+
+    def level(self, db: Session, zoom: int, *, commodity_id: Optional[int], since: date) -> ClusterLevel:
+        """Clusters of locations with a positive latest price since a day (of one commodity if given)"""
+        key = (commodity_id, since.toordinal())
+        pyramids = self._pyramids
+        levels = pyramids.get(key)
+        if levels is None:
+            levels = self._build(db, commodity_id=commodity_id, since=since)
+            with self._lock:
+                if self._pyramids is pyramids:
+                    self._pyramids[key] = levels
+                    while len(self._pyramids) > MAX_PYRAMIDS:
+                        self._pyramids.popitem(last=False)
+        return levels[min(max(zoom, MIN_ZOOM), MAX_ZOOM) - MIN_ZOOM]
+
+    def clusters(
+        self,
+        db: Session,
+        zoom: int,
+        bbox: Tuple[float, float, float, float],
+        *,
+        commodity_id: Optional[int],
+        since: date,
+    ) -> Tuple[ClusterLevel, np.ndarray]:
+        """A zoom level and the indexes of its clusters in a (west, south, east, north) box"""
+        level = self.level(db, zoom, commodity_id=commodity_id, since=since)
+        west, south, east, north = bbox
+        first_row, last_row = np.floor((np.array([south, north]) + 90.0) / level.cell_size)
+        first_column, last_column = np.floor((np.array([west, east]) + 180.0) / level.cell_size)
+        inside = (
+            (level.row >= first_row)
+            & (level.row <= last_row)
+            & (level.column >= first_column)
+            & (level.column <= last_column)
+        )
+        return level, np.flatnonzero(inside)
+
+    def footprint(self) -> Dict[str, int]:
+        """Report the number of cached pyramids and clusters"""
+        pyramids = self._pyramids
+        return {
+            "pyramids": len(pyramids),
+            "clusters": int(sum(len(level.count) for levels in pyramids.values() for level in levels)),
+        }
+
+    def _build(self, db: Session, *, commodity_id: Optional[int], since: date) -> List[ClusterLevel]:
+        points = location_index.points
+        if commodity_id is not None:
+            commodity = location_index.commodity_prices(db, commodity_id, points)
+            selected = (commodity.price > 0) & (commodity.day >= since.toordinal())
+            prices = commodity.price
+        else:
+            # Any commodity counts; prices of different commodities are not aggregated
+            location_ids = np.fromiter(
+                (
+                    row.location_id
+                    for row in db.query(LocationLatestPrice.location_id)
+                    .filter(LocationLatestPrice.price > 0, LocationLatestPrice.recorded_at >= since)
+                    .distinct()
+                ),
+                np.int64,
+            )
+            selected = np.isin(points.ids, location_ids)
+            prices = None
+        return [_level(zoom, points, selected, prices) for zoom in range(MIN_ZOOM, MAX_ZOOM + 1)]
+
+
+cluster_pyramid = ClusterPyramid()
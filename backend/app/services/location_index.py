@@ -0,0 +1,304 @@
+"""
+In-process KD-tree of location coordinates for nearest market searches.
+
+Locations are stored as points on the unit sphere, so the straight-line
+(chord) distance the tree measures orders points exactly like the
+great-circle distance and a radius in km maps to one chord radius. Locations
+added since the tree was built are kept in a small pending block that is
+searched by brute force, and the tree is rebuilt once that block outgrows
+REBUILD_FRACTION of it. Updated or deleted locations force a full reload.
+
+Each commodity's latest prices (from location_latest_price) are held in
+arrays aligned with the points, loaded on first use and dropped whenever the
+data version moves, so a search is one tree query plus array indexing.
+"""
+import logging
+import math
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+from sqlalchemy.orm import Session
+
+from app.models.location import Location
+from app.models.location_latest_price import LocationLatestPrice
+from app.services.data_version import data_version
+from app.utils.geo import EARTH_RADIUS_KM
+
+logger = logging.getLogger(__name__)
+
+# Rebuild the tree once the pending block holds this share of its points
+REBUILD_FRACTION = 0.05
+# ...but never for fewer pending points than this
+MIN_PENDING = 256
+
+
+class Points(NamedTuple):
+    """Location columns ordered by id; the first tree_size rows are in the tree"""
+    ids: np.ndarray
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+    vectors: np.ndarray
+    names: List[str]
+    addresses: List[str]
+    tree: Optional[cKDTree]
+    tree_size: int
+
+
+class CommodityPrices(NamedTuple):
+    """Latest prices of one commodity aligned with Points, price 0 where there is none"""
+    price: np.ndarray
+    previous_price: np.ndarray  # NaN where there is no earlier day
+    day: np.ndarray  # date.toordinal()
+
+
+class NearestPrice(NamedTuple):
+    location_id: int
+    name: str
+    address: str
+    latitude: float
+    longitude: float
+    distance_km: float
+    price: int
+    previous_price: Optional[int]
+    recorded_at: date
+    score: float
+
+
+def _unit_vectors(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    lat = np.radians(latitudes)
+    lng = np.radians(longitudes)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)))
+
+
+def _chord(distance_km: float) -> float:
+    return 2.0 * math.sin(min(distance_km / (2.0 * EARTH_RADIUS_KM), math.pi / 2))
+
+
+def _distance_km(chords: np.ndarray) -> np.ndarray:
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(chords / 2.0, 0.0, 1.0))
+
+
+class LocationIndex:
+    """KD-tree of all locations joined with per-commodity latest prices"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._points = self._build([], reuse=None)
+        # {commodity_id: CommodityPrices}, replaced as a whole when the version moves
+        self._prices: Dict[int, CommodityPrices] = {}
+        self._watermark = 0
+        self._version: Optional[int] = None
+        self._needs_reload = True
+
+    def invalidate(self) -> None:
+        """Reload every location on the next search (after updates or deletes)"""
+        self._needs_reload = True
+
+    def ensure_fresh(self, db: Session) -> "LocationIndex":
+        """Pick up new locations and drop cached prices when the data version has moved"""
+        version = data_version.current(db)
+        if version == self._version and not self._needs_reload:
+            return self
+        with self._lock:
+            if self._needs_reload:
+                self._needs_reload = False
+                self._load(db, reload=True)
+            elif version != self._version:
+                self._load(db, reload=False)
+            self._prices = {}
+            self._version = version
+        return self
+
+    @property
+    def points(self) -> Points:
+        return self._points
+
+    @property
+    def version(self) -> Optional[int]:
+        """Data version the cached prices were read at"""
+        return self._version
+
+    def commodity_prices(self, db: Session, commodity_id: int, points: Points) -> CommodityPrices:
+        """Latest prices of a commodity aligned with some points, loaded on first use"""
+        cache = self._prices
+        prices = cache.get(commodity_id)
+        if prices is not None and len(prices.price) == len(points.ids):
+            return prices
+
+        rows = (
+            db.query(
+                LocationLatestPrice.location_id,
+                LocationLatestPrice.price,
+                LocationLatestPrice.previous_price,
+                LocationLatestPrice.recorded_at,
+            )
+            .filter(LocationLatestPrice.commodity_id == commodity_id)
+            .all()
+        )
+        size = len(points.ids)
+        price = np.zeros(size, dtype=np.int64)
+        previous_price = np.full(size, np.nan)
+        day = np.zeros(size, dtype=np.int32)
+        if rows and size:
+            location_ids = np.fromiter((row.location_id for row in rows), np.int64, len(rows))
+            positions = np.minimum(np.searchsorted(points.ids, location_ids), size - 1)
+            # Locations created after the points were loaded are left out
+            known = points.ids[positions] == location_ids
+            positions = positions[known]
+            rows = [row for row, keep in zip(rows, known.tolist()) if keep]
+            price[positions] = [row.price for row in rows]
+            previous_price[positions] = [
+                row.previous_price if row.previous_price is not None else np.nan for row in rows
+            ]
+            day[positions] = [row.recorded_at.toordinal() for row in rows]
+
+        prices = CommodityPrices(price, previous_price, day)
+        # Prices read before the version moved are not kept
+        if self._prices is cache:
+            self._prices = {**cache, commodity_id: prices}
+        return prices
+
+    def nearest(
+        self,
+        db: Session,
+        commodity_id: int,
+        latitude: float,
+        longitude: float,
+        *,
+        radius_km: float,
+        since: date,
+        limit: int,
+        sort: str = "price",
+        distance_weight: float = 1.0,
+    ) -> Tuple[List[NearestPrice], int]:
+        """
+        Locations within radius_km with a positive price of the commodity recorded since a day
+
+        sort is "price", "distance" or "score", where the score is the price
+        raised by distance_weight times the share of the radius travelled.
+        Returns the first limit matches and the number of matches.
+        """
+        points = self._points
+        prices = self.commodity_prices(db, commodity_id, points)
+        if not len(points.ids):
+            return [], 0
+
+        center = _unit_vectors(np.array([latitude]), np.array([longitude]))[0]
+        chord = _chord(radius_km)
+        positions = [np.asarray(points.tree.query_ball_point(center, chord), dtype=np.int64)] if points.tree is not None else []
+        pending = points.vectors[points.tree_size:]
+        if len(pending):
+            near = np.einsum("ij,ij->i", pending - center, pending - center) <= chord * chord
+            positions.append(np.flatnonzero(near) + points.tree_size)
+        positions = np.concatenate(positions) if positions else np.empty(0, dtype=np.int64)
+
+        positions = positions[(prices.price[positions] > 0) & (prices.day[positions] >= since.toordinal())]
+        if not len(positions):
+            return [], 0
+
+        distances = _distance_km(np.linalg.norm(points.vectors[positions] - center, axis=1))
+        price = prices.price[positions]
+        score = price * (1.0 + distance_weight * distances / radius_km)
+        # lexsort orders by the last key first; position breaks the remaining ties
+        if sort == "distance":
+            keys = (positions, price, distances)
+        elif sort == "score":
+            keys = (positions, distances, score)
+        else:
+            keys = (positions, distances, price)
+        order = np.lexsort(keys)[:limit]
+
+        matches = [
+            NearestPrice(
+                int(points.ids[position]),
+                points.names[position],
+                points.addresses[position],
+                float(points.latitudes[position]),
+                float(points.longitudes[position]),
+                distance,
+                int(prices.price[position]),
+                None if math.isnan(prices.previous_price[position]) else int(prices.previous_price[position]),
+                date.fromordinal(int(prices.day[position])),
+                float(row_score),
+            )
+            for position, distance, row_score in zip(
+                positions[order].tolist(), distances[order].tolist(), score[order].tolist()
+            )
+        ]
+        return matches, len(positions)
+
+    def footprint(self) -> Dict[str, Any]:
+        """Report the size of the index"""
+        points = self._points
+        return {
+            "locations": int(len(points.ids)),
+            "in_tree": points.tree_size,
+            "pending": int(len(points.ids)) - points.tree_size,
+            "commodities_loaded": len(self._prices),
+            "version": self._version,
+        }
+
+    def _load(self, db: Session, *, reload: bool) -> None:
+        started = time.monotonic()
+        watermark = 0 if reload else self._watermark
+        rows = (
+            db.query(Location.id, Location.name, Location.address, Location.latitude, Location.longitude)
+            .filter(Location.id > watermark)
+            .order_by(Location.id)
+            .all()
+        )
+        if not rows and not reload:
+            return
+
+        self._points = self._build(rows, reuse=None if reload else self._points)
+        if rows:
+            self._watermark = rows[-1].id
+        elif reload:
+            self._watermark = 0
+        logger.info(
+            "Location index %s: %d new locations, %d in tree, %d pending in %.2fs",
+            "reloaded" if reload else "extended",
+            len(rows),
+            self._points.tree_size,
+            len(self._points.ids) - self._points.tree_size,
+            time.monotonic() - started,
+        )
+
+    @staticmethod
+    def _build(rows: List[Any], *, reuse: Optional[Points]) -> Points:
+        """Points of the previous state (if any) followed by the new rows"""
+        latitudes = np.array([row.latitude for row in rows], dtype=np.float64)
+        longitudes = np.array([row.longitude for row in rows], dtype=np.float64)
+        new = (
+            np.array([row.id for row in rows], dtype=np.int64),
+            latitudes,
+            longitudes,
+            _unit_vectors(latitudes, longitudes) if rows else np.empty((0, 3)),
+            [row.name for row in rows],
+            [row.address or "" for row in rows],
+        )
+        if reuse is None:
+            ids, latitudes, longitudes, vectors, names, addresses = new
+            tree, tree_size = None, 0
+        else:
+            ids = np.concatenate((reuse.ids, new[0]))
+            latitudes = np.concatenate((reuse.latitudes, new[1]))
+            longitudes = np.concatenate((reuse.longitudes, new[2]))
+            vectors = np.concatenate((reuse.vectors, new[3]))
+            names = reuse.names + new[4]
+            addresses = reuse.addresses + new[5]
+            tree, tree_size = reuse.tree, reuse.tree_size
+
+        # Keep new locations pending until rebuilding is worth it
+        pending = len(ids) - tree_size
+        if pending and (tree is None or pending > max(MIN_PENDING, REBUILD_FRACTION * tree_size)):
+            tree, tree_size = cKDTree(vectors), len(ids)
+        return Points(ids, latitudes, longitudes, vectors, names, addresses, tree, tree_size)
+
+
+location_index = LocationIndex()
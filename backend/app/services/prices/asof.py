@@ -0,0 +1,65 @@
+"""
+As-of lookups over a sorted price series.
+
+Answers "what was the latest price on or before this date" with a binary
+search instead of one query per lookup.
+"""
+from bisect import bisect_right
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.price_record import PriceRecord
+
+
+class AsOfIndex:
+    """Sorted (date, price) series supporting as-of lookups"""
+
+    def __init__(self, points: Iterable[Tuple[date, int]]):
+        # A stable sort keeps the last record of a day as the one returned for that day
+        ordered = sorted(points, key=lambda point: point[0])
+        self.dates: List[date] = [point[0] for point in ordered]
+        self.prices: List[int] = [point[1] for point in ordered]
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def lookup(self, day: date) -> Optional[int]:
+        """Get the latest price recorded on or before a day, or None if there is none"""
+        position = bisect_right(self.dates, day)
+        if position == 0:
+            return None
+        return self.prices[position - 1]
+
+
+def load_lookback(
+    db: Session, *, commodity_id: int, start_date: date, lookback_days: int
+) -> List[Tuple[date, int]]:
+    """
+    Get the (date, price) points before start_date that as-of lookups reaching
+    lookback_days back from the timeframe can hit, in a single query
+
+    That is every point in the lookback window plus the latest point before it.
+    """
+    window_start = start_date - timedelta(days=lookback_days)
+    anchor = (
+        db.query(func.max(PriceRecord.recorded_at))
+        .filter(
+            PriceRecord.commodity_id == commodity_id,
+            PriceRecord.recorded_at <= window_start,
+        )
+        .scalar_subquery()
+    )
+    rows = (
+        db.query(PriceRecord.recorded_at, PriceRecord.price)
+        .filter(
+            PriceRecord.commodity_id == commodity_id,
+            PriceRecord.recorded_at < start_date,
+            PriceRecord.recorded_at >= func.coalesce(anchor, window_start),
+        )
+        .order_by(PriceRecord.recorded_at, PriceRecord.id)
+        .all()
+    )
+    return [(row.recorded_at, row.price) for row in rows]
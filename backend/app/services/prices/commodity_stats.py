@@ -0,0 +1,158 @@
+"""
+Materialized per-commodity statistics behind the commodity list.
+
+Rows are refreshed for the affected commodities on every price write, and all
+of them are recomputed the first time they are read on a new day, when the
+rolling windows have moved. The day of that refresh is kept in a data_version
+marker row, which the refreshing request locks so concurrent first requests
+of the day wait for it instead of recomputing too.
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from app.models.commodity_stats import CommodityStats
+from app.models.data_version import DataVersion
+from app.models.price_record import PriceRecord
+
+# data_version row holding the day ordinal all rows were last recomputed for
+REFRESHED_DAY_SCOPE = "commodity_stats_day"
+
+
+def percent_change(current: Optional[float], previous: Optional[float]) -> float:
+    """Percent change between two averages, falling back to 0 when there is no baseline"""
+    current = current or 0
+    previous = previous or current
+    if previous > 0:
+        return round(((current - previous) / previous) * 100, 1)
+    return 0
+
+
+class CommodityStatsService:
+    """Service for maintaining the commodity_stats materialization"""
+
+    def refresh(
+        self,
+        db: Session,
+        commodity_ids: Optional[Iterable[int]] = None,
+        *,
+        today: Optional[date] = None,
+        commit: bool = True,
+    ) -> int:
+        """
+        Recompute the statistics of some commodities (all commodities with prices if None)
+
+        Returns the number of rows written.
+        """
+        today = today or datetime.now().date()
+        ids = None if commodity_ids is None else sorted(set(commodity_ids))
+        if ids is not None and not ids:
+            return 0
+
+        rows = self._compute(db, ids, today)
+
+        delete_query = db.query(CommodityStats)
+        if ids is not None:
+            delete_query = delete_query.filter(CommodityStats.commodity_id.in_(ids))
+        delete_query.delete(synchronize_session=False)
+        if rows:
+            db.bulk_insert_mappings(CommodityStats, rows)
+
+        if commit:
+            db.commit()
+        return len(rows)
+
+    def ensure_fresh(self, db: Session, *, today: Optional[date] = None) -> bool:
+        """
+        Recompute every row if the rolling windows have moved since the last refresh
+
+        Returns True if a refresh was needed.
+        """
+        today = today or datetime.now().date()
+        marker = DataVersion.version
+        in_scope = DataVersion.scope == REFRESHED_DAY_SCOPE
+        if (db.query(marker).filter(in_scope).scalar() or 0) >= today.toordinal():
+            return False
+
+        # Wait for a concurrent refresh of the day, then skip it if that one finished it
+        refreshed_day = db.query(marker).filter(in_scope).with_for_update().scalar()
+        if (refreshed_day or 0) >= today.toordinal():
+            db.commit()
+            return False
+        try:
+            self.refresh(db, today=today, commit=False)
+            if refreshed_day is None:
+                db.add(DataVersion(scope=REFRESHED_DAY_SCOPE, version=today.toordinal()))
+            else:
+                db.query(DataVersion).filter(in_scope).update(
+                    {DataVersion.version: today.toordinal()}, synchronize_session=False
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return True
+
+    def _compute(self, db: Session, commodity_ids: Optional[List[int]], today: date) -> List[Dict[str, Any]]:
+        """Compute all rolling windows for the given commodities in one grouped scan"""
+        one_week_ago = today - timedelta(days=7)
+        two_weeks_ago = today - timedelta(days=14)
+        thirty_days_ago = today - timedelta(days=30)
+        sixty_days_ago = today - timedelta(days=60)
+        one_year_ago = today - timedelta(days=365)
+        previous_year = one_year_ago - timedelta(days=30)
+
+        recorded_at = PriceRecord.recorded_at
+
+        def windowed(condition):
+            return case((condition, PriceRecord.price), else_=None)
+
+        last_30_days = recorded_at >= thirty_days_ago
+        query = db.query(
+            PriceRecord.commodity_id,
+            func.min(windowed(last_30_days)).label("min_price"),
+            func.max(windowed(last_30_days)).label("max_price"),
+            func.avg(windowed(last_30_days)).label("month_avg"),
+            func.avg(windowed(recorded_at >= one_week_ago)).label("week_avg"),
+            func.avg(windowed(and_(recorded_at >= two_weeks_ago, recorded_at < one_week_ago))).label("previous_week_avg"),
+            func.avg(windowed(and_(recorded_at >= sixty_days_ago, recorded_at < thirty_days_ago))).label("previous_month_avg"),
+            func.avg(windowed(and_(recorded_at >= previous_year, recorded_at < one_year_ago))).label("previous_year_avg"),
+        ).filter(
+            PriceRecord.recorded_at >= previous_year,
+            PriceRecord.price > 0  # Exclude records with price of 0
+        )
+        if commodity_ids is not None:
+            query = query.filter(PriceRecord.commodity_id.in_(commodity_ids))
+
+        results = {row.commodity_id: row for row in query.group_by(PriceRecord.commodity_id).all()}
+
+        rows = []
+        for commodity_id in commodity_ids if commodity_ids is not None else sorted(results):
+            row = results.get(commodity_id)
+            stats = {
+                "commodity_id": commodity_id,
+                "current_price": None,
+                "min_price": None,
+                "max_price": None,
+                "weekly_change": None,
+                "monthly_change": None,
+                "yearly_change": None,
+                "computed_for": today,
+            }
+            if row is not None and row.min_price is not None:
+                month_avg = row.month_avg
+                stats.update(
+                    current_price=round(month_avg),
+                    min_price=row.min_price,
+                    max_price=row.max_price,
+                    weekly_change=percent_change(row.week_avg, row.previous_week_avg),
+                    monthly_change=percent_change(month_avg, row.previous_month_avg),
+                    yearly_change=percent_change(month_avg, row.previous_year_avg),
+                )
+            rows.append(stats)
+        return rows
+
+
+commodity_stats = CommodityStatsService()
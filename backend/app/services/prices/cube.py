@@ -0,0 +1,260 @@
+"""
+Optional in-process columnar cube of all price records.
+
+Holds commodity, region, location, day ordinal and price in NumPy arrays
+sorted by (commodity, day, id), so windowed aggregates, latest prices and
+as-of lookups for a commodity are slices and binary searches instead of
+queries. Refreshes follow the data version, so writes from any process are
+picked up: when only new rows were committed they are read by id watermark
+and merged in, and a moved rewrite version (updates and deletes) or rows
+committed out of id order force a full reload.
+
+Endpoints opt in through the PRICE_CUBE_ENDPOINTS setting.
+"""
+import logging
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.price_record import PriceRecord
+from app.services.data_version import PRICE_REWRITES, data_version
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip while loading
+LOAD_BATCH_SIZE = 50000
+
+COLUMNS = ("id", "commodity_id", "region_id", "location_id", "day", "price")
+DTYPES = {
+    "id": np.int64,
+    "commodity_id": np.int32,
+    "region_id": np.int32,
+    "location_id": np.int32,  # -1 for records without a location
+    "day": np.int32,  # date.toordinal()
+    "price": np.int64,
+}
+
+
+class CommoditySlice(NamedTuple):
+    """Views of the cube columns for one commodity, ordered by (day, id)"""
+    id: np.ndarray
+    region_id: np.ndarray
+    location_id: np.ndarray
+    day: np.ndarray
+    price: np.ndarray
+
+
+class PricePoint(NamedTuple):
+    recorded_at: date
+    price: int
+
+
+class PriceCube:
+    """Columnar in-memory copy of the pricerecord table"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # (columns, {commodity_id: (start, stop)}), replaced as a whole on refresh
+        self._state = (self._empty(), {})
+        self._watermark = 0
+        self._checked_at = float("-inf")
+        # Data and rewrite versions the cube was read at, None before the first load
+        self._version: Optional[int] = None
+        self._rewrites: Optional[int] = None
+
+    def enabled_for(self, endpoint: str) -> bool:
+        """Whether an endpoint is configured to read from the cube"""
+        return endpoint in settings.PRICE_CUBE_ENABLED_FOR
+
+    def mark_stale(self) -> None:
+        """Check the data version on the next read instead of waiting for the refresh interval"""
+        self._checked_at = float("-inf")
+
+    def ensure_fresh(self, db: Session) -> "PriceCube":
+        """Load the cube or catch up with the data version, checked at most once per refresh interval"""
+        if time.monotonic() - self._checked_at < settings.PRICE_CUBE_REFRESH_SECONDS:
+            return self
+        with self._lock:
+            if time.monotonic() - self._checked_at >= settings.PRICE_CUBE_REFRESH_SECONDS:
+                # Read the versions first: rows committed meanwhile move them again
+                version = data_version.current(db)
+                rewrites = data_version.current(db, scope=PRICE_REWRITES)
+                if self._version is None or rewrites != self._rewrites:
+                    self._load(db, reload=True)
+                elif version != self._version:
+                    self._load(db, reload=False)
+                self._version, self._rewrites = version, rewrites
+                self._checked_at = time.monotonic()
+        return self
+
+    def get_slice(self, commodity_id: int, start: Optional[date] = None, end: Optional[date] = None) -> CommoditySlice:
+        """Get the records of a commodity between two dates (inclusive, open if None)"""
+        columns, offsets = self._state
+        first, last = offsets.get(commodity_id, (0, 0))
+        days = columns["day"][first:last]
+        lo = first + int(np.searchsorted(days, start.toordinal(), side="left")) if start is not None else first
+        hi = first + int(np.searchsorted(days, end.toordinal(), side="right")) if end is not None else last
+        return CommoditySlice(
+            columns["id"][lo:hi],
+            columns["region_id"][lo:hi],
+            columns["location_id"][lo:hi],
+            columns["day"][lo:hi],
+            columns["price"][lo:hi],
+        )
+
+    def points(self, commodity_id: int, start: Optional[date] = None) -> List[PricePoint]:
+        """Get the (recorded_at, price) series of a commodity from a date on"""
+        series = self.get_slice(commodity_id, start)
+        return [
+            PricePoint(date.fromordinal(day), price)
+            for day, price in zip(series.day.tolist(), series.price.tolist())
+        ]
+
+    def window_stats(self, commodity_id: int, start: date, end: Optional[date] = None) -> Dict[str, Any]:
+        """Get min, max, average and count of a commodity's prices in a date window"""
+        prices = self.get_slice(commodity_id, start, end).price
+        if len(prices) == 0:
+            return {"min": None, "max": None, "avg": None, "count": 0}
+        return {
+            "min": int(prices.min()),
+            "max": int(prices.max()),
+            "avg": float(prices.mean()),
+            "count": len(prices),
+        }
+
+    def asof(self, commodity_id: int, days: np.ndarray) -> np.ndarray:
+        """
+        Get the latest price on or before each day ordinal (NaN where there is none)
+
+        The last record of a day wins, matching AsOfIndex.
+        """
+        series = self.get_slice(commodity_id)
+        positions = np.searchsorted(series.day, days, side="right") - 1
+        result = np.full(len(days), np.nan)
+        found = positions >= 0
+        result[found] = series.price[positions[found]]
+        return result
+
+    def asof_dates(self, commodity_id: int, days: List[date]) -> List[Optional[int]]:
+        """asof for a list of dates, with None where there is no earlier price"""
+        ordinals = np.fromiter((day.toordinal() for day in days), np.int64, len(days))
+        return [None if np.isnan(price) else int(price) for price in self.asof(commodity_id, ordinals)]
+
+    def footprint(self) -> Dict[str, Any]:
+        """Report the size of the cube"""
+        columns, offsets = self._state
+        return {
+            "rows": int(len(columns["id"])),
+            "commodities": len(offsets),
+            "watermark": self._watermark,
+            "version": self._version,
+            "bytes": int(sum(column.nbytes for column in columns.values())),
+            "enabled_endpoints": settings.PRICE_CUBE_ENABLED_FOR,
+        }
+
+    def _load(self, db: Session, *, reload: bool) -> None:
+        started = time.monotonic()
+        columns = self._state[0]
+        if not reload:
+            # Rows committed by transactions that took their ids before the
+            # watermark are not above it; only a full reload finds them
+            known = db.query(func.count(PriceRecord.id)).filter(PriceRecord.id <= self._watermark).scalar()
+            if known != len(columns["id"]):
+                reload = True
+        watermark = 0 if reload else self._watermark
+        query = (
+            db.query(
+                PriceRecord.id,
+                PriceRecord.commodity_id,
+                PriceRecord.region_id,
+                PriceRecord.location_id,
+                PriceRecord.recorded_at,
+                PriceRecord.price,
+            )
+            .filter(PriceRecord.id > watermark)
+            .order_by(PriceRecord.id)
+            .execution_options(stream_results=True, yield_per=LOAD_BATCH_SIZE)
+        )
+
+        chunks: List[Dict[str, np.ndarray]] = []
+        batch: List[Any] = []
+        for row in query:
+            batch.append(row)
+            if len(batch) == LOAD_BATCH_SIZE:
+                chunks.append(self._to_columns(batch))
+                batch = []
+        if batch:
+            chunks.append(self._to_columns(batch))
+
+        if not chunks and not reload:
+            return
+
+        new = {
+            name: np.concatenate([chunk[name] for chunk in chunks]) if chunks else self._empty()[name]
+            for name in COLUMNS
+        }
+        order = np.lexsort((new["id"], new["day"], new["commodity_id"]))
+        new = {name: column[order] for name, column in new.items()}
+        if reload:
+            merged = new
+        else:
+            # New ids are above every cached one, so each new row goes after the
+            # cached rows of its (commodity, day); one linear insert keeps the order
+            positions = np.searchsorted(self._day_keys(columns), self._day_keys(new), side="right")
+            merged = {name: np.insert(columns[name], positions, new[name]) for name in COLUMNS}
+
+        commodity_ids = merged["commodity_id"]
+        starts = np.flatnonzero(np.diff(commodity_ids, prepend=np.int32(-1)))
+        stops = np.append(starts[1:], len(commodity_ids))
+        offsets = {
+            int(commodity_ids[start]): (int(start), int(stop))
+            for start, stop in zip(starts, stops)
+        }
+
+        # Swap in the new arrays at once so readers never see a partial cube
+        self._state = (merged, offsets)
+        if len(merged["id"]):
+            self._watermark = int(merged["id"].max())
+        else:
+            self._watermark = 0
+        logger.info(
+            "Price cube %s: %d rows (%d new), %.1f MiB in %.2fs",
+            "loaded" if reload else "refreshed",
+            len(merged["id"]),
+            len(new["id"]),
+            sum(column.nbytes for column in merged.values()) / 2 ** 20,
+            time.monotonic() - started,
+        )
+
+    @staticmethod
+    def _day_keys(columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """(commodity, day) packed into one sortable integer"""
+        return (columns["commodity_id"].astype(np.int64) << 32) | columns["day"]
+
+    @staticmethod
+    def _to_columns(rows: List[Any]) -> Dict[str, np.ndarray]:
+        return {
+            "id": np.fromiter((row.id for row in rows), DTYPES["id"], len(rows)),
+            "commodity_id": np.fromiter((row.commodity_id for row in rows), DTYPES["commodity_id"], len(rows)),
+            "region_id": np.fromiter((row.region_id for row in rows), DTYPES["region_id"], len(rows)),
+            "location_id": np.fromiter(
+                (row.location_id if row.location_id is not None else -1 for row in rows),
+                DTYPES["location_id"],
+                len(rows),
+            ),
+            "day": np.fromiter((row.recorded_at.toordinal() for row in rows), DTYPES["day"], len(rows)),
+            "price": np.fromiter((row.price for row in rows), DTYPES["price"], len(rows)),
+        }
+
+    @staticmethod
+    def _empty() -> Dict[str, np.ndarray]:
+        return {name: np.array([], dtype=DTYPES[name]) for name in COLUMNS}
+
+
+price_cube = PriceCube()
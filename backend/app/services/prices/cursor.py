@@ -0,0 +1,30 @@
+"""
+Opaque keyset cursors for paging price records by (recorded_at, id).
+
+A cursor encodes the sort key of the last record of a page; the next page
+starts strictly after it, so every page costs one index range scan no matter
+how deep it is.
+"""
+import base64
+from datetime import date
+from typing import Optional, Tuple
+
+# (recorded_at, id) of the last record of a page
+CursorKey = Tuple[date, int]
+
+
+def encode_cursor(recorded_at: date, id: int) -> str:
+    raw = f"{recorded_at.isoformat()}:{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[CursorKey]:
+    """Decode a cursor, raising ValueError if it was not produced by encode_cursor"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        recorded_at, id = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+        return date.fromisoformat(recorded_at), int(id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
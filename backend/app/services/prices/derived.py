@@ -0,0 +1,41 @@
+"""
+Single entry point for refreshing tables derived from price records.
+
+Every price write path calls refresh_derived with the records it created,
+changed or deleted, so new materializations only need to be hooked in here.
+"""
+from typing import Any, Iterable
+
+from sqlalchemy.orm import Session
+
+from app.services.data_version import PRICE_REWRITES, data_version
+from app.services.prices.commodity_stats import commodity_stats
+from app.services.prices.cube import price_cube
+from app.services.prices.location_latest import location_latest_price, pair_key
+from app.services.prices.rollups import price_rollup, record_key
+
+
+def refresh_derived(db: Session, records: Iterable[Any], *, commit: bool = True, rewrites: bool = False) -> None:
+    """
+    Refresh aggregated history, commodity statistics and latest location prices for written price records and bump the data version
+
+    Pass rewrites=True when existing records were changed or deleted, which
+    makes in-memory copies of the table reload instead of appending new rows.
+    """
+    records = list(records)
+    keys = {record_key(record) for record in records}
+    if not keys:
+        return
+
+    price_rollup.refresh(db, keys, commit=False)
+    commodity_stats.refresh(db, {commodity_id for commodity_id, _, _ in keys}, commit=False)
+    location_latest_price.refresh(
+        db, {pair for pair in map(pair_key, records) if pair is not None}, commit=False
+    )
+    data_version.bump(db)
+    if rewrites:
+        data_version.bump(db, scope=PRICE_REWRITES)
+
+    if commit:
+        db.commit()
+    price_cube.mark_stale()
@@ -0,0 +1,145 @@
+"""
+Streaming export of price records as CSV or NDJSON.
+
+Rows are read through a server-side cursor in batches and encoded as they
+arrive, so memory stays flat regardless of how many records match and the
+first bytes go out before the query has finished.
+"""
+import csv
+import io
+import json
+from datetime import date
+from typing import Any, Dict, Iterator, Optional
+
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models.commodity import Commodity
+from app.models.price_record import PriceRecord
+from app.models.region import Region
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+COLUMNS = (
+    "id",
+    "commodity_id",
+    "commodity_name",
+    "region_id",
+    "region_name",
+    "location_id",
+    "price",
+    "recorded_at",
+    "source",
+    "price_kind",
+)
+
+# Rows fetched per round trip and encoded per chunk sent
+BATCH_SIZE = 1000
+
+
+class PriceExportService:
+    """Service for streaming filtered price records"""
+
+    def stream(self, format: str, **filters: Any) -> Iterator[bytes]:
+        """
+        Yield an encoded export in chunks
+
+        The generator owns its session because a streaming response is sent
+        after request-scoped dependencies have been closed.
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unknown export format: {format}")
+
+        db = SessionLocal()
+        try:
+            rows = self.iter_rows(db, **filters)
+            if format == "csv":
+                yield from self._encode_csv(rows)
+            else:
+                yield from self._encode_ndjson(rows)
+        finally:
+            db.close()
+
+    def iter_rows(
+        self,
+        db: Session,
+        *,
+        commodity_id: Optional[int] = None,
+        region_id: Optional[int] = None,
+        location_id: Optional[int] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> Iterator[Any]:
+        """Iterate over matching rows, oldest first, without materializing them"""
+        query = (
+            db.query(
+                PriceRecord.id,
+                PriceRecord.commodity_id,
+                Commodity.name.label("commodity_name"),
+                PriceRecord.region_id,
+                Region.name.label("region_name"),
+                PriceRecord.location_id,
+                PriceRecord.price,
+                PriceRecord.recorded_at,
+                PriceRecord.source,
+                PriceRecord.price_kind,
+            )
+            .join(Commodity, Commodity.id == PriceRecord.commodity_id)
+            .join(Region, Region.id == PriceRecord.region_id)
+        )
+        if commodity_id:
+            query = query.filter(PriceRecord.commodity_id == commodity_id)
+        if region_id:
+            query = query.filter(PriceRecord.region_id == region_id)
+        if location_id:
+            query = query.filter(PriceRecord.location_id == location_id)
+        if start_date:
+            query = query.filter(PriceRecord.recorded_at >= start_date)
+        if end_date:
+            query = query.filter(PriceRecord.recorded_at <= end_date)
+
+        return (
+            query.order_by(PriceRecord.recorded_at, PriceRecord.id)
+            .execution_options(stream_results=True, yield_per=BATCH_SIZE)
+        )
+
+    def _encode_csv(self, rows: Iterator[Any]) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        # Send the header straight away so clients see the download start
+        yield self._drain(buffer)
+
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+            if count % BATCH_SIZE == 0:
+                yield self._drain(buffer)
+        if buffer.tell():
+            yield self._drain(buffer)
+
+    def _encode_ndjson(self, rows: Iterator[Any]) -> Iterator[bytes]:
+        lines = []
+        for row in rows:
+            record: Dict[str, Any] = dict(zip(COLUMNS, row))
+            record["recorded_at"] = record["recorded_at"].isoformat()
+            lines.append(json.dumps(record, ensure_ascii=False))
+            if len(lines) == BATCH_SIZE:
+                yield ("\n".join(lines) + "\n").encode()
+                lines = []
+        if lines:
+            yield ("\n".join(lines) + "\n").encode()
+
+    @staticmethod
+    def _drain(buffer: io.StringIO) -> bytes:
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+
+price_export = PriceExportService()
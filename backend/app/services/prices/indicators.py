@@ -0,0 +1,80 @@
+"""
+Vectorized price indicators for price analysis.
+
+All functions take a 1-D sequence of prices ordered by date and return NumPy
+arrays or scalars, so they stay fast on multi-year series with several
+records per day.
+"""
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def to_array(prices: Sequence[float]) -> np.ndarray:
+    return np.asarray(prices, dtype=np.float64)
+
+
+def moving_average(prices: np.ndarray, window: int) -> np.ndarray:
+    """
+    Simple moving average using cumulative sums
+
+    The window shrinks to the series length for short series, and positions
+    without a full window are NaN.
+    """
+    n = len(prices)
+    result = np.full(n, np.nan)
+    window = min(window, n)
+    if window < 1:
+        return result
+
+    cumulative = np.cumsum(np.insert(prices, 0, 0.0))
+    result[window - 1:] = (cumulative[window:] - cumulative[:-window]) / window
+    return result
+
+
+def exponential_moving_average(prices: np.ndarray, span: int) -> np.ndarray:
+    """Exponential moving average with smoothing factor 2 / (span + 1)"""
+    if len(prices) == 0:
+        return np.array([])
+    return pd.Series(prices).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def volatility(prices: np.ndarray) -> float:
+    """Coefficient of variation in percent (sample standard deviation / mean)"""
+    if len(prices) < 2:
+        return 0
+    mean = prices.mean()
+    if mean == 0:
+        return 0
+    return round(float(prices.std(ddof=1) / mean * 100), 2)
+
+
+def trend_slope(prices: np.ndarray) -> Optional[float]:
+    """Slope of the least-squares line through the prices, or None for fewer than two points"""
+    if len(prices) < 2:
+        return None
+    return float(np.polyfit(np.arange(len(prices), dtype=np.float64), prices, 1)[0])
+
+
+def classify_trend(
+    slope: Optional[float], *, threshold: float = 1, strong_threshold: float = 5
+) -> str:
+    """Interpret a trend slope as a label"""
+    if slope is None:
+        return "insufficient data"
+    if slope > strong_threshold:
+        return "strongly rising"
+    if slope > threshold:
+        return "rising"
+    if slope < -strong_threshold:
+        return "strongly falling"
+    if slope < -threshold:
+        return "falling"
+    return "stable"
+
+
+def to_rounded_list(values: np.ndarray) -> List[Optional[int]]:
+    """Round to integers for JSON output, mapping NaN to None"""
+    rounded = np.round(values)
+    return [None if np.isnan(value) else int(value) for value in rounded]
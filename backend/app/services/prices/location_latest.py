@@ -0,0 +1,198 @@
+"""
+Materialized latest price per (location, commodity) behind the price map.
+
+Every write path reports the records it touched; only the (location,
+commodity) pairs of those records are recomputed, with index lookups on the
+natural key instead of ranking the pair's whole history. The latest record of
+a pair is the highest id on its last day, and the previous price is the latest
+record of the day before that. Records dated in the future count as the
+latest, so readers bounded by today fall back to latest_through for pairs
+whose stored day is later.
+"""
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from app.models.location_latest_price import LocationLatestPrice
+from app.models.price_record import PriceRecord
+
+# (location_id, commodity_id)
+PairKey = Tuple[int, int]
+
+# Keep IN / OR lists well below driver and planner limits
+CHUNK_SIZE = 500
+
+RECORD_COLUMNS = (
+    PriceRecord.id,
+    PriceRecord.location_id,
+    PriceRecord.commodity_id,
+    PriceRecord.region_id,
+    PriceRecord.price,
+    PriceRecord.recorded_at,
+)
+
+
+def pair_key(record: Any) -> Optional[PairKey]:
+    """Get the (location_id, commodity_id) of a price record object or mapping, None without a location"""
+    if isinstance(record, tuple):
+        # Bare rollup keys carry no location
+        return None
+    if isinstance(record, dict):
+        location_id, commodity_id = record.get("location_id"), record.get("commodity_id")
+    else:
+        location_id, commodity_id = record.location_id, record.commodity_id
+    if location_id is None or commodity_id is None:
+        return None
+    return location_id, commodity_id
+
+
+def _chunks(items: List[Any], size: int = CHUNK_SIZE) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _matching(columns: Tuple[Any, ...], keys: Iterable[Tuple[Any, ...]], *extra: Any) -> Any:
+    """OR of per-key equality conditions, which every backend plans as index lookups"""
+    return or_(*[and_(*[column == value for column, value in zip(columns, key)], *extra) for key in keys])
+
+
+class LocationLatestPriceService:
+    """Service for maintaining the location_latest_price materialization"""
+
+    def refresh(self, db: Session, keys: Iterable[PairKey], *, commit: bool = True) -> int:
+        """
+        Recompute the rows of some (location_id, commodity_id) pairs
+
+        Pairs without any price record left lose their row. Returns the number
+        of rows written.
+        """
+        pairs = sorted(set(keys))
+        written = 0
+        for chunk in _chunks(pairs):
+            rows = self._compute(db, chunk)
+            db.query(LocationLatestPrice).filter(
+                _matching((LocationLatestPrice.location_id, LocationLatestPrice.commodity_id), chunk)
+            ).delete(synchronize_session=False)
+            if rows:
+                db.bulk_insert_mappings(LocationLatestPrice, rows)
+            written += len(rows)
+
+        if commit:
+            db.commit()
+        return written
+
+    def rebuild(self, db: Session, *, commodity_id: Optional[int] = None) -> int:
+        """
+        Rebuild all rows from the raw price records (only one commodity's if given)
+
+        Each commodity's records are read once, in natural key index order, and
+        committed together. Returns the number of rows written.
+        """
+        if commodity_id is not None:
+            commodity_ids = [commodity_id]
+        else:
+            commodity_ids = [
+                row.commodity_id
+                for row in db.query(PriceRecord.commodity_id).distinct().order_by(PriceRecord.commodity_id)
+            ]
+
+        delete_query = db.query(LocationLatestPrice)
+        if commodity_id is not None:
+            delete_query = delete_query.filter(LocationLatestPrice.commodity_id == commodity_id)
+        delete_query.delete(synchronize_session=False)
+        db.commit()
+
+        total = 0
+        for current_id in commodity_ids:
+            records = (
+                db.query(*RECORD_COLUMNS)
+                .filter(PriceRecord.commodity_id == current_id, PriceRecord.location_id.isnot(None))
+                .order_by(PriceRecord.location_id, PriceRecord.recorded_at.desc(), PriceRecord.id.desc())
+            )
+            rows = []
+            latest = previous = None
+            for record in records:
+                if latest is None or (record.location_id, record.commodity_id) != (latest.location_id, latest.commodity_id):
+                    if latest is not None:
+                        rows.append(self._row(latest, previous))
+                    latest, previous = record, None
+                elif previous is None and record.recorded_at < latest.recorded_at:
+                    previous = record
+            if latest is not None:
+                rows.append(self._row(latest, previous))
+            if rows:
+                db.bulk_insert_mappings(LocationLatestPrice, rows)
+            db.commit()
+            total += len(rows)
+        return total
+
+    def latest_through(self, db: Session, pairs: Iterable[PairKey], day: date) -> Dict[PairKey, Dict[str, Any]]:
+        """Rows of some pairs computed from their records up to a day, by pair, leaving out pairs without any"""
+        found: Dict[PairKey, Dict[str, Any]] = {}
+        for chunk in _chunks(sorted(set(pairs))):
+            for row in self._compute(db, chunk, through=day):
+                found[(row["location_id"], row["commodity_id"])] = row
+        return found
+
+    def _compute(self, db: Session, pairs: List[PairKey], *, through: Optional[date] = None) -> List[Dict[str, Any]]:
+        """Latest and previous price of each pair, from the last two days with prices (up to a day if given)"""
+        pair_columns = (PriceRecord.location_id, PriceRecord.commodity_id)
+        extra = [PriceRecord.recorded_at <= through] if through is not None else []
+        last_days = self._last_day(db, _matching(pair_columns, pairs, *extra))
+        if not last_days:
+            return []
+        previous_days = self._last_day(db, or_(*[
+            _matching(pair_columns, [pair], PriceRecord.recorded_at < day) for pair, day in last_days.items()
+        ]))
+
+        latest = self._records_on(db, last_days)
+        previous = self._records_on(db, previous_days)
+        return [self._row(record, previous.get(pair)) for pair, record in latest.items()]
+
+    @staticmethod
+    def _row(latest: Any, previous: Optional[Any]) -> Dict[str, Any]:
+        return {
+            "location_id": latest.location_id,
+            "commodity_id": latest.commodity_id,
+            "price_record_id": latest.id,
+            "region_id": latest.region_id,
+            "price": latest.price,
+            "recorded_at": latest.recorded_at,
+            "previous_price": previous.price if previous is not None else None,
+            "previous_recorded_at": previous.recorded_at if previous is not None else None,
+        }
+
+    def _last_day(self, db: Session, condition: Any) -> Dict[PairKey, date]:
+        return {
+            (row.location_id, row.commodity_id): row.recorded_at
+            for row in db.query(
+                PriceRecord.location_id,
+                PriceRecord.commodity_id,
+                func.max(PriceRecord.recorded_at).label("recorded_at"),
+            )
+            .filter(condition)
+            .group_by(PriceRecord.location_id, PriceRecord.commodity_id)
+        }
+
+    def _records_on(self, db: Session, days: Dict[PairKey, date]) -> Dict[PairKey, Any]:
+        """The record with the highest id of each pair on the given day"""
+        if not days:
+            return {}
+        found: Dict[PairKey, Any] = {}
+        rows = db.query(*RECORD_COLUMNS).filter(
+            # The leading columns of the natural key index
+            _matching(
+                (PriceRecord.commodity_id, PriceRecord.location_id, PriceRecord.recorded_at),
+                [(commodity_id, location_id, day) for (location_id, commodity_id), day in days.items()],
+            )
+        )
+        for row in rows:
+            pair = (row.location_id, row.commodity_id)
+            if pair not in found or row.id > found[pair].id:
+                found[pair] = row
+        return found
+
+
+location_latest_price = LocationLatestPriceService()
@@ -0,0 +1,188 @@
+"""
+Regional price snapshot for a single commodity.
+
+Computes the latest price, the previous price (latest record on an earlier
+date), the window start price and the window average for every region in a
+single statement, so the number of round trips does not grow with the number
+of regions.
+"""
+from datetime import date, datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.models.price_record import PriceRecord
+from app.models.region import Region
+from app.services.prices.cube import PriceCube
+
+# Give a few days of slack when looking for the price at the start of the window
+WINDOW_START_BUFFER_DAYS = 5
+
+
+class RegionSnapshot(NamedTuple):
+    """Snapshot row computed from the price cube, with the fields of the SQL rows"""
+    region_id: int
+    region_name: str
+    latitude: Optional[float]
+    longitude: Optional[float]
+    latest_price: int
+    latest_recorded_at: date
+    previous_price: Optional[int]
+    window_start_price: Optional[int]
+    window_avg_price: Optional[float]
+
+
+class RegionalSnapshotService:
+    """Service for computing per-region price snapshots of a commodity"""
+
+    def get_for_commodity(
+        self,
+        db: Session,
+        *,
+        commodity_id: int,
+        window_days: int = 30,
+        today: Optional[date] = None,
+    ) -> List[Row]:
+        """
+        Get the price snapshot of every region that has records for a commodity
+
+        Each row exposes region_id, region_name, latitude, longitude,
+        latest_price, latest_recorded_at, previous_price, window_start_price
+        and window_avg_price. Regions without records are not returned.
+        """
+        today = today or datetime.now().date()
+        window_start = today - timedelta(days=window_days)
+        window_anchor = window_start + timedelta(days=WINDOW_START_BUFFER_DAYS)
+
+        # Latest date and window average per region, computed alongside each row
+        base = (
+            db.query(
+                PriceRecord.id,
+                PriceRecord.region_id,
+                PriceRecord.price,
+                PriceRecord.recorded_at,
+                func.max(PriceRecord.recorded_at)
+                .over(partition_by=PriceRecord.region_id)
+                .label("latest_date"),
+                func.avg(
+                    case((PriceRecord.recorded_at >= window_start, PriceRecord.price), else_=None)
+                )
+                .over(partition_by=PriceRecord.region_id)
+                .label("window_avg"),
+            )
+            .filter(PriceRecord.commodity_id == commodity_id)
+            .subquery()
+        )
+
+        is_previous = base.c.recorded_at < base.c.latest_date
+        is_window_start = base.c.recorded_at <= window_anchor
+        newest_first = [base.c.recorded_at.desc(), base.c.id.desc()]
+
+        # Rank rows newest first overall, among earlier dates, and up to the window start
+        ranked = (
+            db.query(
+                base.c.region_id,
+                base.c.price,
+                base.c.recorded_at,
+                base.c.window_avg,
+                is_previous.label("is_previous"),
+                is_window_start.label("is_window_start"),
+                func.row_number()
+                .over(partition_by=base.c.region_id, order_by=newest_first)
+                .label("latest_rank"),
+                func.row_number()
+                .over(partition_by=[base.c.region_id, is_previous], order_by=newest_first)
+                .label("previous_rank"),
+                func.row_number()
+                .over(partition_by=[base.c.region_id, is_window_start], order_by=newest_first)
+                .label("window_start_rank"),
+            )
+            .subquery()
+        )
+
+        latest = ranked.c.latest_rank == 1
+        previous = and_(ranked.c.is_previous, ranked.c.previous_rank == 1)
+        window_start_row = and_(ranked.c.is_window_start, ranked.c.window_start_rank == 1)
+
+        return (
+            db.query(
+                Region.id.label("region_id"),
+                Region.name.label("region_name"),
+                Region.latitude,
+                Region.longitude,
+                func.max(case((latest, ranked.c.price), else_=None)).label("latest_price"),
+                func.max(case((latest, ranked.c.recorded_at), else_=None)).label("latest_recorded_at"),
+                func.max(case((previous, ranked.c.price), else_=None)).label("previous_price"),
+                func.max(case((window_start_row, ranked.c.price), else_=None)).label("window_start_price"),
+                func.max(ranked.c.window_avg).label("window_avg_price"),
+            )
+            .join(ranked, Region.id == ranked.c.region_id)
+            .group_by(Region.id, Region.name, Region.latitude, Region.longitude)
+            .order_by(Region.id)
+            .all()
+        )
+
+    def get_for_commodity_from_cube(
+        self,
+        db: Session,
+        cube: PriceCube,
+        *,
+        commodity_id: int,
+        window_days: int = 30,
+        today: Optional[date] = None,
+    ) -> List[RegionSnapshot]:
+        """get_for_commodity answered from the in-memory price cube"""
+        today = today or datetime.now().date()
+        window_start = (today - timedelta(days=window_days)).toordinal()
+        window_anchor = window_start + WINDOW_START_BUFFER_DAYS
+
+        series = cube.get_slice(commodity_id)
+        if len(series.day) == 0:
+            return []
+
+        # Group rows by region while keeping their (day, id) order
+        order = np.argsort(series.region_id, kind="stable")
+        region_ids = series.region_id[order]
+        days = series.day[order]
+        prices = series.price[order]
+        present, starts = np.unique(region_ids, return_index=True)
+        stops = np.append(starts[1:], len(region_ids))
+
+        regions = {
+            region.id: region
+            for region in db.query(Region).filter(Region.id.in_(present.tolist())).all()
+        }
+
+        snapshots = []
+        for region_id, start, stop in zip(present.tolist(), starts.tolist(), stops.tolist()):
+            region = regions.get(region_id)
+            if region is None:
+                continue
+            region_days = days[start:stop]
+            region_prices = prices[start:stop]
+
+            latest_day = int(region_days[-1])
+            # Last row before the latest date, and last row up to the window anchor
+            previous = int(np.searchsorted(region_days, latest_day, side="left")) - 1
+            window_start_row = int(np.searchsorted(region_days, window_anchor, side="right")) - 1
+            in_window = region_prices[int(np.searchsorted(region_days, window_start, side="left")):]
+
+            snapshots.append(RegionSnapshot(
+                region_id=region_id,
+                region_name=region.name,
+                latitude=region.latitude,
+                longitude=region.longitude,
+                latest_price=int(region_prices[-1]),
+                latest_recorded_at=date.fromordinal(latest_day),
+                previous_price=int(region_prices[previous]) if previous >= 0 else None,
+                window_start_price=int(region_prices[window_start_row]) if window_start_row >= 0 else None,
+                window_avg_price=float(in_window.mean()) if len(in_window) else None,
+            ))
+        return snapshots
+
+
+regional_snapshot = RegionalSnapshotService()
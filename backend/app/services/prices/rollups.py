@@ -0,0 +1,454 @@
+"""
+Incremental rollups of price records into PriceHistoryAggregated.
+
+Every write path reports the (commodity_id, region_id, recorded_at) keys it
+touched; only the daily, weekly, monthly, quarterly and yearly buckets that
+contain those keys are recomputed. Daily buckets are summed from the raw
+records of the touched days and every coarser bucket from the stored buckets
+of the finer period inside it, so a write reads at most a month of rows.
+"""
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Date, and_, case, func, literal, or_, tuple_
+from sqlalchemy.orm import Session
+
+from app.models.price_history import PriceHistoryAggregated
+from app.models.price_record import PriceRecord
+
+PERIODS = ("daily", "weekly", "monthly", "quarterly", "yearly")
+
+# Finer period each coarser bucket is summed from, and the order to refresh them in
+SOURCE_PERIODS = {"weekly": "daily", "monthly": "daily", "quarterly": "monthly", "yearly": "quarterly"}
+ROLLUP_LEVELS = (("weekly", "monthly"), ("quarterly",), ("yearly",))
+
+# (commodity_id, region_id, recorded_at)
+RecordKey = Tuple[int, int, date]
+# (commodity_id, region_id, period, period_start)
+BucketKey = Tuple[int, int, str, date]
+
+# Keep IN / OR lists well below driver and planner limits
+CHUNK_SIZE = 500
+
+
+def period_bounds(period: str, day: date) -> Tuple[date, date]:
+    """Get the first and last day of the bucket of the given period containing a day"""
+    if period == "daily":
+        return day, day
+    if period == "weekly":
+        # Weeks start on Monday, matching MySQL's WEEKDAY()
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if period == "monthly":
+        start = day.replace(day=1)
+    elif period == "quarterly":
+        start = date(day.year, 3 * ((day.month - 1) // 3) + 1, 1)
+    elif period == "yearly":
+        return date(day.year, 1, 1), date(day.year, 12, 31)
+    else:
+        raise ValueError(f"Unknown aggregation period: {period}")
+
+    months = 1 if period == "monthly" else 3
+    next_month = start.month + months
+    next_start = date(start.year + (next_month - 1) // 12, (next_month - 1) % 12 + 1, 1)
+    return start, next_start - timedelta(days=1)
+
+
+def record_key(record: Any) -> RecordKey:
+    """Get the rollup key of a price record object, mapping or existing key"""
+    if isinstance(record, tuple):
+        return record
+    if isinstance(record, dict):
+        return record["commodity_id"], record["region_id"], record["recorded_at"]
+    return record.commodity_id, record.region_id, record.recorded_at
+
+
+def _bucket_key(bucket: Any) -> BucketKey:
+    return bucket["commodity_id"], bucket["region_id"], bucket["period"], bucket["period_start"]
+
+
+def _chunks(items: List[Any], size: int = CHUNK_SIZE) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class PriceRollupService:
+    """Service for maintaining and reading aggregated price history"""
+
+    def refresh(self, db: Session, keys: Iterable[RecordKey], *, commit: bool = True) -> int:
+        """
+        Recompute the buckets affected by the given record keys
+
+        Returns the number of buckets written.
+        """
+        keys = set(keys)
+        if not keys:
+            return 0
+
+        # Recomputed buckets by key, None when the bucket no longer has records
+        computed: Dict[BucketKey, Optional[Dict[str, Any]]] = {
+            (commodity_id, region_id, "daily", recorded_at): None
+            for commodity_id, region_id, recorded_at in keys
+        }
+        for keys_chunk in _chunks(sorted(keys)):
+            daily_totals = self._daily_totals(
+                db,
+                tuple_(PriceRecord.commodity_id, PriceRecord.region_id, PriceRecord.recorded_at).in_(keys_chunk),
+            )
+            for bucket in self._build_buckets(daily_totals, periods=("daily",)):
+                computed[_bucket_key(bucket)] = bucket
+
+        for periods in ROLLUP_LEVELS:
+            affected = {
+                (commodity_id, region_id, period, period_bounds(period, recorded_at)[0])
+                for commodity_id, region_id, recorded_at in keys
+                for period in periods
+            }
+            # Stored buckets being recomputed are stale; their new totals are used instead
+            source_periods = {SOURCE_PERIODS[period] for period in periods}
+            sources = [
+                bucket for bucket in self._stored_buckets(db, affected)
+                if _bucket_key(bucket) not in computed
+            ]
+            sources.extend(
+                bucket for key, bucket in computed.items()
+                if bucket is not None and key[2] in source_periods
+            )
+            computed.update(dict.fromkeys(affected))
+            for bucket in self._combine(sources, periods=periods):
+                computed[_bucket_key(bucket)] = bucket
+
+        for keys_chunk in _chunks(sorted(computed)):
+            db.query(PriceHistoryAggregated).filter(
+                tuple_(
+                    PriceHistoryAggregated.commodity_id,
+                    PriceHistoryAggregated.region_id,
+                    PriceHistoryAggregated.period,
+                    PriceHistoryAggregated.period_start,
+                ).in_(keys_chunk)
+            ).delete(synchronize_session=False)
+        buckets = [bucket for bucket in computed.values() if bucket is not None]
+        if buckets:
+            db.bulk_insert_mappings(PriceHistoryAggregated, buckets)
+
+        if commit:
+            db.commit()
+        return len(buckets)
+
+    def rebuild(self, db: Session, *, commodity_id: Optional[int] = None) -> int:
+        """
+        Rebuild all buckets from the raw price records, one commodity at a time
+
+        Returns the number of buckets written.
+        """
+        if commodity_id is not None:
+            commodity_ids = [commodity_id]
+        else:
+            commodity_ids = [
+                row.commodity_id
+                for row in db.query(PriceRecord.commodity_id).distinct().order_by(PriceRecord.commodity_id)
+            ]
+
+        delete_query = db.query(PriceHistoryAggregated)
+        if commodity_id is not None:
+            delete_query = delete_query.filter(PriceHistoryAggregated.commodity_id == commodity_id)
+        delete_query.delete(synchronize_session=False)
+        db.commit()
+
+        total = 0
+        for current_id in commodity_ids:
+            daily_totals = self._daily_totals(db, PriceRecord.commodity_id == current_id)
+            buckets = self._build_buckets(daily_totals)
+            if buckets:
+                db.bulk_insert_mappings(PriceHistoryAggregated, buckets)
+            db.commit()
+            total += len(buckets)
+        return total
+
+    def get_history(
+        self,
+        db: Session,
+        *,
+        period: str,
+        commodity_id: Optional[int] = None,
+        region_id: Optional[int] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> List[Any]:
+        """
+        Get buckets of a period combined across regions (unless region_id is given)
+
+        Each row exposes commodity_id, period_start, period_end, avg_price,
+        min_price, max_price and record_count, ordered by commodity and date.
+        """
+        query = self._history_query(
+            db,
+            period=period,
+            commodity_id=commodity_id,
+            region_id=region_id,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        model = PriceHistoryAggregated
+        return query.order_by(model.commodity_id, model.period_start).all()
+
+    def get_tiered_history(
+        self,
+        db: Session,
+        *,
+        commodity_id: int,
+        tiers: List[Tuple[str, Optional[date], Optional[date]]],
+    ) -> List[Any]:
+        """
+        Get several (period, start_date, end_date) tiers of history in one UNION query
+
+        Rows have the same fields as get_history and are ordered by period_start.
+        A bucket cut by a tier bound only counts the days inside the tier,
+        summed from the daily buckets, so adjacent tiers never count a day twice.
+        """
+        queries = [
+            query
+            for period, start_date, end_date in tiers
+            for query in self._tier_queries(
+                db, period=period, commodity_id=commodity_id, start_date=start_date, end_date=end_date
+            )
+        ]
+        if not queries:
+            return []
+
+        combined = queries[0].union_all(*queries[1:]).subquery()
+        return db.query(combined).order_by(combined.c.period_start).all()
+
+    def get_window_summary(
+        self,
+        db: Session,
+        *,
+        commodity_id: int,
+        windows: Dict[str, Tuple[date, Optional[date]]],
+    ) -> Any:
+        """
+        Get min, max and average price of a commodity for several date windows in one scan
+
+        Windows map a name to an inclusive (start_date, end_date) range; the result
+        row exposes <name>_min, <name>_max and <name>_avg, which are None when the
+        window has no data. Read from the daily buckets.
+        """
+        model = PriceHistoryAggregated
+        columns = []
+        for name, (start_date, end_date) in windows.items():
+            in_window = model.period_start >= start_date
+            if end_date is not None:
+                in_window = and_(in_window, model.period_start <= end_date)
+            columns.extend([
+                func.min(case((in_window, model.min_price), else_=None)).label(f"{name}_min"),
+                func.max(case((in_window, model.max_price), else_=None)).label(f"{name}_max"),
+                (
+                    func.sum(case((in_window, model.price_sum), else_=None)) * 1.0
+                    / func.sum(case((in_window, model.record_count), else_=None))
+                ).label(f"{name}_avg"),
+            ])
+
+        earliest = min(start_date for start_date, _ in windows.values())
+        return db.query(*columns).filter(
+            model.commodity_id == commodity_id,
+            model.period == "daily",
+            model.period_start >= earliest,
+        ).one()
+
+    def _history_query(
+        self,
+        db: Session,
+        *,
+        period: str,
+        commodity_id: Optional[int] = None,
+        region_id: Optional[int] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+    ) -> Any:
+        if period not in PERIODS:
+            raise ValueError(f"Unknown aggregation period: {period}")
+
+        model = PriceHistoryAggregated
+        query = db.query(
+            model.commodity_id.label("commodity_id"),
+            model.period_start.label("period_start"),
+            *self._total_columns(),
+        ).filter(model.period == period, model.record_count > 0)
+
+        if commodity_id is not None:
+            query = query.filter(model.commodity_id == commodity_id)
+        if region_id is not None:
+            query = query.filter(model.region_id == region_id)
+        if start_date is not None:
+            query = query.filter(model.period_start >= start_date)
+        if end_date is not None:
+            query = query.filter(model.period_start <= end_date)
+
+        return query.group_by(model.commodity_id, model.period_start)
+
+    def _tier_queries(
+        self,
+        db: Session,
+        *,
+        period: str,
+        commodity_id: int,
+        start_date: Optional[date],
+        end_date: Optional[date],
+    ) -> List[Any]:
+        """Queries of the whole buckets of a tier and of the buckets its bounds cut"""
+        if period == "daily":
+            return [self._history_query(
+                db, period=period, commodity_id=commodity_id, start_date=start_date, end_date=end_date
+            )]
+
+        queries = []
+        whole_start, whole_end = start_date, end_date
+        if start_date is not None:
+            bucket_start, bucket_end = period_bounds(period, start_date)
+            if bucket_start < start_date:
+                last_day = bucket_end if end_date is None else min(bucket_end, end_date)
+                queries.append(self._partial_query(db, commodity_id, bucket_start, start_date, last_day))
+                whole_start = bucket_end + timedelta(days=1)
+        if end_date is not None:
+            bucket_start, bucket_end = period_bounds(period, end_date)
+            if bucket_end > end_date and (whole_start is None or bucket_start >= whole_start):
+                queries.append(self._partial_query(db, commodity_id, bucket_start, bucket_start, end_date))
+            if bucket_end > end_date:
+                whole_end = bucket_start - timedelta(days=1)
+        if whole_start is None or whole_end is None or whole_start <= whole_end:
+            # Buckets are aligned, so every bucket starting inside the bounds ends inside them
+            queries.append(self._history_query(
+                db, period=period, commodity_id=commodity_id, start_date=whole_start, end_date=whole_end
+            ))
+        return queries
+
+    def _partial_query(
+        self, db: Session, commodity_id: int, bucket_start: date, first_day: date, last_day: date
+    ) -> Any:
+        """One bucket starting on bucket_start, totalled over the daily buckets of some of its days"""
+        model = PriceHistoryAggregated
+        return db.query(
+            model.commodity_id.label("commodity_id"),
+            literal(bucket_start, Date).label("period_start"),
+            *self._total_columns(),
+        ).filter(
+            model.period == "daily",
+            model.record_count > 0,
+            model.commodity_id == commodity_id,
+            model.period_start.between(first_day, last_day),
+        ).group_by(model.commodity_id)
+
+    @staticmethod
+    def _total_columns() -> List[Any]:
+        model = PriceHistoryAggregated
+        return [
+            func.max(model.period_end).label("period_end"),
+            (func.sum(model.price_sum) * 1.0 / func.sum(model.record_count)).label("avg_price"),
+            func.min(model.min_price).label("min_price"),
+            func.max(model.max_price).label("max_price"),
+            func.sum(model.record_count).label("record_count"),
+        ]
+
+    def _stored_buckets(self, db: Session, affected: Iterable[BucketKey]) -> List[Dict[str, Any]]:
+        """Stored buckets of the finer periods the affected buckets are summed from"""
+        model = PriceHistoryAggregated
+        spans = sorted({
+            (commodity_id, region_id, SOURCE_PERIODS[period], *period_bounds(period, start))
+            for commodity_id, region_id, period, start in affected
+        })
+        buckets = []
+        for spans_chunk in _chunks(spans):
+            rows = db.query(
+                model.commodity_id,
+                model.region_id,
+                model.period,
+                model.period_start,
+                model.period_end,
+                model.price_sum,
+                model.record_count,
+                model.min_price,
+                model.max_price,
+            ).filter(
+                model.record_count > 0,
+                or_(*[
+                    and_(
+                        model.commodity_id == commodity_id,
+                        model.region_id == region_id,
+                        model.period == source,
+                        model.period_start.between(start, end),
+                    )
+                    for commodity_id, region_id, source, start, end in spans_chunk
+                ]),
+            )
+            # Spans of weeks and months overlap, so a row can match twice
+            for row in {_bucket_key(row._mapping): row for row in rows}.values():
+                buckets.append(dict(row._mapping))
+        return buckets
+
+    def _daily_totals(self, db: Session, condition: Any) -> List[Any]:
+        return (
+            db.query(
+                PriceRecord.commodity_id,
+                PriceRecord.region_id,
+                PriceRecord.recorded_at,
+                func.count(PriceRecord.id).label("record_count"),
+                func.sum(PriceRecord.price).label("price_sum"),
+                func.min(PriceRecord.price).label("min_price"),
+                func.max(PriceRecord.price).label("max_price"),
+            )
+            .filter(condition)
+            .group_by(PriceRecord.commodity_id, PriceRecord.region_id, PriceRecord.recorded_at)
+            .all()
+        )
+
+    def _build_buckets(
+        self, daily_totals: List[Any], *, periods: Iterable[str] = PERIODS
+    ) -> List[Dict[str, Any]]:
+        """Roll daily totals up into bucket rows of some periods"""
+        buckets: Dict[BucketKey, Dict[str, Any]] = {}
+        for row in daily_totals:
+            for period in periods:
+                start, end = period_bounds(period, row.recorded_at)
+                self._add_totals(buckets, (row.commodity_id, row.region_id, period, start), end, row._mapping)
+        return self._finish(buckets)
+
+    def _combine(self, sources: List[Dict[str, Any]], *, periods: Iterable[str]) -> List[Dict[str, Any]]:
+        """Sum buckets of finer periods into the buckets of some periods containing them"""
+        buckets: Dict[BucketKey, Dict[str, Any]] = {}
+        for source in sources:
+            for period in periods:
+                if SOURCE_PERIODS[period] != source["period"]:
+                    continue
+                start, end = period_bounds(period, source["period_start"])
+                self._add_totals(buckets, (source["commodity_id"], source["region_id"], period, start), end, source)
+        return self._finish(buckets)
+
+    @staticmethod
+    def _add_totals(buckets: Dict[BucketKey, Dict[str, Any]], key: BucketKey, end: date, totals: Any) -> None:
+        bucket = buckets.get(key)
+        if bucket is None:
+            commodity_id, region_id, period, start = key
+            buckets[key] = {
+                "commodity_id": commodity_id,
+                "region_id": region_id,
+                "period": period,
+                "period_start": start,
+                "period_end": end,
+                "price_sum": int(totals["price_sum"]),
+                "record_count": int(totals["record_count"]),
+                "min_price": totals["min_price"],
+                "max_price": totals["max_price"],
+            }
+        else:
+            bucket["price_sum"] += int(totals["price_sum"])
+            bucket["record_count"] += int(totals["record_count"])
+            bucket["min_price"] = min(bucket["min_price"], totals["min_price"])
+            bucket["max_price"] = max(bucket["max_price"], totals["max_price"])
+
+    @staticmethod
+    def _finish(buckets: Dict[BucketKey, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for bucket in buckets.values():
+            bucket["avg_price"] = round(bucket["price_sum"] / bucket["record_count"])
+        return list(buckets.values())
+
+price_rollup = PriceRollupService()
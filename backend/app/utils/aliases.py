@@ -0,0 +1,247 @@
+"""
+Alias indexes for commodity, unit and market names found in TCB sheets and CSVs.
+
+Every spelling is normalized once at import (Unicode NFC, case folded,
+whitespace and trailing dandas removed) into a dict, so a lookup is a single
+hash probe. Names that are not an alias fall back to the closest alias by
+similarity ratio, cached per name, and names that still do not match are
+counted for the scraper status and import summaries.
+"""
+import threading
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher, get_close_matches
+from typing import Dict, Generic, Iterable, List, NamedTuple, Optional, Tuple, TypeVar
+
+# Minimum similarity ratio for a fuzzy match
+FUZZY_CUTOFF = 0.88
+# A fuzzy match is ambiguous when a different entry scores within this margin
+FUZZY_MARGIN = 0.03
+
+T = TypeVar("T")
+
+
+class CommodityAlias(NamedTuple):
+    name: str
+    commodity_id: int
+
+
+class MarketAlias(NamedTuple):
+    name: str
+    place_id: str
+
+
+# Canonical commodity name -> (commodity id, Bengali and alternative spellings)
+# Duplicated commodities keep the id the lookups have always resolved to
+COMMODITIES: Dict[str, Tuple[int, List[str]]] = {
+    "Fine Rice (Nazir/Miniket)": (1, ["চাল সরু (নাজির/মিনিকেট)"]),
+    "Medium Rice (Paijam/Atash)": (2, ["চাল (মাঝারী)পাইজাম/আটাশ", "চাল (মাঝারী)পাইজাম/লতা"]),
+    "Medium Rice (Paijam/Lota)": (3, ["চাল (পাইজাম/লতা)"]),
+    "Coarse Rice (Swarna/China Iri)": (4, ["চাল (মোটা)/স্বর্ণা/চায়না ইরি"]),
+    "White Flour (Loose)": (5, ["আটা সাদা (খোলা)"]),
+    "Flour (Packet)": (6, ["আটা (প্যাকেট)"]),
+    "Maida (Loose)": (7, ["ময়দা (খোলা)"]),
+    "Maida (Packet)": (8, ["ময়দা (প্যাকেট)"]),
+    "Soybean Oil (Loose)": (9, ["সয়াবিন তেল (লুজ)"]),
+    "Soybean Oil (Bottled)": (10, ["সয়াবিন তেল (বোতল)"]),
+    "Palm Oil (Loose)": (11, ["পাম অয়েল (লুজ)"]),
+    "Super Palm Oil (Loose)": (56, ["পাম অয়েল (সুপার)", "সুপার পাম অয়েল (লুজ)"]),
+    "Rice Bran Oil (Bottled)": (13, ["রাইস ব্রান তেল (বোতল)"]),
+    "Palm Olein (Bottled)": (14, ["পাম অলিন (বোতল)"]),
+    "Masoor Dal (Large Grain)": (15, ["মশুর ডাল (বড় দানা)", "মশূর ডাল (বড় দানা)"]),
+    "Masoor Dal (Medium Grain)": (16, ["মশূর ডাল (মাঝারী দানা)"]),
+    "Masoor Dal (Small Grain)": (17, ["মশুর ডাল (ছোট দানা)"]),
+    "Moong Dal (Varies by Quality)": (18, ["মুগ ডাল (মানভেদে)"]),
+    "Anchor Dal": (19, ["এ্যাংকর ডাল"]),
+    "Chickpea (Varies by Quality)": (20, ["ছোলা (মানভেদে)"]),
+    "Potato (Varies by Quality)": (58, ["আলু (মানভেদে)", "আলু (নতুন, মানভেদে)", "আলু (নতুন/পুরাতন)(মানভেদে)"]),
+    "Onion (Local)": (61, [
+        "পিঁয়াজ (দেশী)", "পিঁয়াজ (নতুন) (দেশী)", "পিঁয়াজ (নতুন/পুরাতন) (দেশী)", "পিঁয়াজ (দেশী)নতুন/পুরতান",
+    ]),
+    "Onion (Imported)": (23, ["পিঁয়াজ (আমদানি)"]),
+    "Garlic (Local)": (65, [
+        "রসুন (দেশী)", "রসুন (দেশী) নতুন/পুরাতন", "Garlic (Local)/পুরাতন", "রসুন(দেশী) নতুন",
+    ]),
+    # Stored as separate commodities and only ever matched by these spellings
+    "রসুন(দেশী) নতুন/পুরাতন)": (63, []),
+    "রসুন(দেশী) পুরাতন": (64, []),
+    "Garlic (Imported)": (25, ["রসুন (আমদানি)"]),
+    "Dry Chili (Local)": (26, ["শুকনা মরিচ (দেশী)"]),
+    "Dry Chili (Imported)": (27, ["শুকনা মরিচ (আমদানি)", "শুকনা মরিচ (আম)"]),
+    "Turmeric (Local)": (28, ["হলুদ (দেশী)"]),
+    "Turmeric (Imported)": (29, ["হলুদ (আমদানি)"]),
+    "Ginger (Local)": (66, ["আদা (দেশী)", "আদা (দেশী)(নতুন)", "আদা (দেশী) নতুন"]),
+    "Ginger (Imported)": (31, ["আদা (আমদানি)"]),
+    "Cumin": (32, ["জিরা"]),
+    "Cinnamon": (33, ["দারুচিনি"]),
+    "Clove": (34, ["লবঙ্গ"]),
+    "Cardamom (Small)": (35, ["এলাচ(ছোট)"]),
+    "Coriander": (36, ["ধনে"]),
+    "Bay Leaf": (37, ["তেজপাতা"]),
+    "Rui Fish": (38, ["রুই"]),
+    "Hilsa Fish": (39, ["ইলিশ"]),
+    "Beef": (40, ["গরু", "গরু (গোস্ত)"]),
+    "Mutton": (41, ["খাসী"]),
+    "Broiler Chicken": (42, ["মুরগী(ব্রয়লার)"]),
+    "Local Chicken": (43, ["মুরগী (দেশী)"]),
+    "Powdered Milk (Packet)": (44, ["গুড়া দুধ(প্যাকেটজাত)"]),
+    "Dano Milk Powder": (45, ["ডানো"]),
+    "Diploma Milk Powder (NZ)": (46, ["ডিপ্লোমা (নিউজিল্যান্ড)"]),
+    "Fresh Milk Powder": (47, ["ফ্রেশ"]),
+    "Marks Milk Powder": (48, ["মার্কস"]),
+    "Sugar": (49, ["চিনি"]),
+    "Dates (Ordinary Quality)": (50, ["খেজুর(সাধারণ মানের)"]),
+    "Iodized Salt (Packet)": (67, ["লবণ(প্যাঃ)আয়োডিনযুক্ত", "লবণ(প্যাঃ)আয়োডিনযুক্ত(মানভেদে)"]),
+    "Egg (Farm)": (52, ["ডিম (ফার্ম)"]),
+    "Writing Paper (White)": (53, ["লেখার কাগজ(সাদা)"]),
+    "MS Rod (60 Grade)": (54, ["এম,এস রড (৬০ গ্রেড)"]),
+    "MS Rod (40 Grade)": (55, ["এম,এস রড( ৪০ গ্রেড)"]),
+}
+
+# Canonical unit -> Bengali spellings
+UNITS: Dict[str, List[str]] = {
+    "kg": ["প্রতি কেজি", "প্রতি কেজি প্যাঃ", "১ কেজি"],
+    "liter": ["প্রতি লিটার"],
+    "5 liter": ["৫ লিটার"],
+    "2 liter": ["২ লিটার"],
+    "1 liter": ["১ লিটার"],
+    "dozen": ["প্রতি হালি"],
+    "ream": ["প্রতি দিস্তা"],
+    "metric ton": ["প্রতি মেঃটন"],
+}
+
+# Canonical market name -> (Google place id, Bengali and alternative spellings)
+MARKETS: Dict[str, Tuple[str, List[str]]] = {
+    "Karwan Bazar": ("ChIJJ_p5P5i4VTcRL7w40HP92u0", ["কাওরান বাজার", "কাওরান বাজার (খুচরা ও পাইকারী)"]),
+    "Mohammadpur Town Hall Bazar": ("ChIJ7-AQnle_VTcRJ2oN-bAlc2s", ["মোহাম্মদপুর টাউন হল বাজার"]),
+    "Kachukhet Bazar": ("ChIJB1GCFTnHVTcRVO-Nw81exv4", ["ঢাকা ক্যান্ট কচুক্ষেত বাজার", "Kochukhet Bazar"]),
+    "New Market": ("ChIJVVltZNu5VTcRDoS-IiSqsas", ["নিউমার্কেট"]),
+    "Malibag": ("ChIJmTj5xGK4VTcRVWaIFCvjgsI", ["মালিবাগ", "মালিবাগ বাজার"]),
+    "Hatirpool": ("ChIJX8y6Jr25VTcR2c7y0gL7Gf0", ["হাতিরপুল"]),
+    "Rampura Bazar": ("ChIJK_f3mui5VTcR-HDJfI6lRoY", ["রামপুরা", "রামপুরা বাজার"]),
+    "Katasur Raw Bazar": ("ChIJk0mBQ2W_VTcRFzqcmEx_7MY", ["কাটাসুর কাঁচা বাজার"]),
+    "মহাখালী বাজার": ("ChIJVVVVVXDHVTcRRcFo68PKts8", []),
+    "মীরপুর-১ নং (খুচরা ও পাইকারী) বাজার": ("ChIJZ_nGUe_AVTcRgqiOa2OVluA", [
+        "মীরপুর-১ নং (পাইকারী) বাজার  ও বাদামতলী বাজার",
+        "মীরপুর-১ নং (খুচরা ও পাইকারী) বাজার  ও বাদামতলী বাজার",
+    ]),
+    "বাদামতলী বাজার": ("ChIJ9RspLIG5VTcREGlWZJ-vIAo", []),
+    "সূত্রাপুর বাজার": ("ChIJj087iaW5VTcRLoK6KoWTkM4", []),
+    "শ্যাম বাজার": ("ChIJ6RSEorS5VTcRsU1V2lmn67I", []),
+    "মৌলভী বাজার পাইকারী বাজার": ("ChIJvQGIBOK4VTcRspPgfCWuOhU", []),
+    "যাত্রাবাড়ী (খুচরা ও পাইকারী) বাজার": ("ChIJ2ex_HCy5VTcRtmL8L8eZ7OU", []),
+}
+
+# Markets in the sheets that are not tracked
+SKIPPED_MARKETS = ["রহমতগঞ্জ", "উত্তরা আজম পুর বাজার", "শাহজাহানপুর"]
+
+
+def normalize_name(text) -> str:
+    """Lookup key of a name: NFC, case folded, without whitespace or trailing dandas"""
+    text = unicodedata.normalize("NFC", str(text)).casefold()
+    return "".join(text.split()).rstrip("।.")
+
+
+class AliasIndex(Generic[T]):
+    """Normalized alias lookup with a cached fuzzy fallback and unmatched name counts"""
+
+    def __init__(self, kind: str, aliases: Iterable[Tuple[str, T]], *, cutoff: float = FUZZY_CUTOFF):
+        self.kind = kind
+        self.cutoff = cutoff
+        self._exact: Dict[str, T] = {}
+        for alias, value in aliases:
+            # The first spelling listed wins if two normalize the same
+            self._exact.setdefault(normalize_name(alias), value)
+        self._keys = list(self._exact)
+        self._lock = threading.Lock()
+        self._fuzzy: Dict[str, Optional[T]] = {}
+        self.fuzzy_matches: Dict[str, T] = {}
+        self.unmatched: Counter = Counter()
+
+    def lookup(self, name) -> Optional[T]:
+        """Get the entry of a name, falling back to the closest alias, or None"""
+        key = normalize_name(name)
+        value = self._exact.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            if key not in self._fuzzy:
+                self._fuzzy[key] = self._closest(key)
+            value = self._fuzzy[key]
+            if value is None:
+                self.unmatched[str(name).strip()] += 1
+            else:
+                self.fuzzy_matches[str(name).strip()] = value
+        return value
+
+    def report(self) -> Dict[str, Dict]:
+        """Unmatched names with their counts, and the names matched only by similarity"""
+        with self._lock:
+            return {
+                "unmatched": dict(self.unmatched.most_common()),
+                "fuzzy": {name: value[0] if isinstance(value, tuple) else value
+                          for name, value in self.fuzzy_matches.items()},
+            }
+
+    def reset(self) -> None:
+        """Forget reported names (the fuzzy cache is kept)"""
+        with self._lock:
+            self.unmatched.clear()
+            self.fuzzy_matches.clear()
+
+    def _closest(self, key: str) -> Optional[T]:
+        if not key:
+            return None
+        candidates = get_close_matches(key, self._keys, n=3, cutoff=self.cutoff)
+        if not candidates:
+            return None
+        best = self._exact[candidates[0]]
+        best_ratio = SequenceMatcher(None, key, candidates[0]).ratio()
+        for candidate in candidates[1:]:
+            if self._exact[candidate] != best and best_ratio - SequenceMatcher(None, key, candidate).ratio() < FUZZY_MARGIN:
+                # Too close to call between two different entries
+                return None
+        return best
+
+
+def _with_canonical(table: Dict[str, Tuple]) -> Iterable[Tuple[str, str, List[str]]]:
+    for name, (value, aliases) in table.items():
+        yield name, value, [name, *aliases]
+
+
+commodity_aliases: AliasIndex[CommodityAlias] = AliasIndex(
+    "commodity",
+    (
+        (alias, CommodityAlias(name, commodity_id))
+        for name, commodity_id, aliases in _with_canonical(COMMODITIES)
+        for alias in aliases
+    ),
+)
+unit_aliases: AliasIndex[str] = AliasIndex(
+    "unit",
+    ((alias, unit) for unit, aliases in UNITS.items() for alias in [unit, *aliases]),
+)
+market_aliases: AliasIndex[MarketAlias] = AliasIndex(
+    "market",
+    (
+        (alias, MarketAlias(name, place_id))
+        for name, place_id, aliases in _with_canonical(MARKETS)
+        for alias in aliases
+    ),
+)
+_skipped_markets = {normalize_name(name) for name in SKIPPED_MARKETS}
+
+
+def is_skipped_market(name: str) -> bool:
+    return normalize_name(name) in _skipped_markets
+
+
+def unmatched_report() -> Dict[str, Dict[str, Dict]]:
+    """Names reported by every index since the last reset"""
+    return {index.kind: index.report() for index in (commodity_aliases, unit_aliases, market_aliases)}
+
+
+def reset_unmatched() -> None:
+    for index in (commodity_aliases, unit_aliases, market_aliases):
+        index.reset()
@@ -0,0 +1,45 @@
+"""
+Commodity category groups shown on the price map.
+
+Database categories are grouped into the map's display groups once at import,
+so filtering by a group and labelling a location are dict lookups instead of
+list scans repeated for every location.
+"""
+from typing import Dict, Optional, Tuple
+
+# Display group -> database categories it includes
+CATEGORY_GROUPS: Dict[str, Tuple[str, ...]] = {
+    "food": (
+        "agriculture",
+        "pulses",
+        "vegetables",
+        "spices",
+        "fish",
+        "meat",
+        "dairy",
+        "grocery",
+        "fruits",
+        "poultry",
+    ),
+    "energy": ("oil",),
+    "household": ("stationery", "construction"),
+}
+
+# Database category -> display group
+DISPLAY_GROUPS: Dict[str, str] = {
+    category: group for group, categories in CATEGORY_GROUPS.items() for category in categories
+}
+
+
+def categories_for(name: str) -> Optional[Tuple[str, ...]]:
+    """Database categories matched by a group or category name, None for an unknown name"""
+    if name in CATEGORY_GROUPS:
+        return CATEGORY_GROUPS[name]
+    if name in DISPLAY_GROUPS:
+        return (name,)
+    return None
+
+
+def display_group(category: Optional[str]) -> Optional[str]:
+    """Display group of a database category, the category itself when it is in no group"""
+    return DISPLAY_GROUPS.get(category, category)
@@ -0,0 +1,74 @@
+"""
+Grid cells and great-circle distances for location search.
+
+Every location stores the id of the fixed-size latitude/longitude cell it
+falls in (Location.grid_cell, indexed). A radius search turns the circle's
+bounding box into one contiguous range of cell ids per grid row, so the
+database only reads index ranges, and the candidates are then filtered by
+their exact haversine distance, computed in the same query.
+
+The grid does not wrap around the antimeridian, which no tracked market is
+near.
+"""
+import math
+from typing import Any, List, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.sql.elements import ColumnElement
+
+EARTH_RADIUS_KM = 6371.0088
+# Cell edge in degrees (about 5.5 km of latitude); a 50 km search spans ~19 rows
+CELL_SIZE = 0.05
+GRID_ROWS = int(round(180 / CELL_SIZE))
+GRID_COLUMNS = int(round(360 / CELL_SIZE))
+# Above this many rows a search reads one range covering all of them instead
+MAX_CELL_RANGES = 32
+
+
+def _row(latitude: float) -> int:
+    return min(max(int(math.floor((latitude + 90.0) / CELL_SIZE)), 0), GRID_ROWS - 1)
+
+
+def _column(longitude: float) -> int:
+    return min(max(int(math.floor((longitude + 180.0) / CELL_SIZE)), 0), GRID_COLUMNS - 1)
+
+
+def grid_cell(latitude: float, longitude: float) -> int:
+    """Id of the grid cell containing a point"""
+    return _row(latitude) * GRID_COLUMNS + _column(longitude)
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lng, max_lng) enclosing the circle"""
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(latitude))
+    if cos_lat < 1e-6 or abs(latitude) + lat_delta >= 90.0:
+        lng_delta = 180.0
+    else:
+        lng_delta = min(math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180.0)
+    return latitude - lat_delta, latitude + lat_delta, longitude - lng_delta, longitude + lng_delta
+
+
+def cell_ranges(latitude: float, longitude: float, radius_km: float) -> List[Tuple[int, int]]:
+    """Inclusive ranges of grid cell ids covering the circle's bounding box"""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    first_row, last_row = _row(min_lat), _row(max_lat)
+    first_column, last_column = _column(min_lng), _column(max_lng)
+    if last_row - first_row + 1 > MAX_CELL_RANGES:
+        return [(first_row * GRID_COLUMNS + first_column, last_row * GRID_COLUMNS + last_column)]
+    return [
+        (row * GRID_COLUMNS + first_column, row * GRID_COLUMNS + last_column)
+        for row in range(first_row, last_row + 1)
+    ]
+
+
+def haversine_km_sql(latitude: float, longitude: float, latitudes: Any, longitudes: Any) -> ColumnElement:
+    """Great-circle distance in km from one point to latitude and longitude columns, as a SQL expression"""
+    to_radians = math.pi / 180.0
+    half_d_lat = (latitudes - latitude) * (to_radians / 2)
+    half_d_lng = (longitudes - longitude) * (to_radians / 2)
+    a = (
+        func.power(func.sin(half_d_lat), 2)
+        + math.cos(math.radians(latitude)) * func.cos(latitudes * to_radians) * func.power(func.sin(half_d_lng), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(a))
@@ -0,0 +1,256 @@
+"""
+Content-addressed on-disk cache of downloaded TCB spreadsheets.
+
+Layout under the cache directory:
+
+    objects/<2 chars>/<sha256>.xlsx   raw downloads, named by content hash
+    index/<sha256 of url>.json        url -> content hash, ETag, Last-Modified
+    parsed/<sha256 of url>.json       sheet rows read from the url's cached content
+    listing_cursor.json               newest listing entry a completed scrape processed
+
+Published files do not change, so a cached URL is replayed from disk without
+any request. With revalidation on, a conditional GET is sent instead and the
+file is only downloaded again when the server reports a change.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Mapping, NamedTuple, Optional
+
+from app.core.config import settings
+
+# Bump when read_excel_sheet output changes, so cached sheets are read again.
+# Sheets keep names as written, so alias table changes need no bump.
+PARSER_VERSION = 2
+CURSOR_FILE = "listing_cursor.json"
+
+
+class CacheEntry(NamedTuple):
+    url: str
+    content_hash: str
+    size: int
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: str
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Write through a temporary file so readers and crashes never see a partial file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _is_current(parsed: Dict[str, Any], digest: str) -> bool:
+    """Whether a parsed sheet was read from this content by this parser"""
+    return parsed.get("parser_version") == PARSER_VERSION and parsed.get("content_hash") == digest
+
+
+def _read_json(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class DownloadCache:
+    """Raw downloads and their parsed sheets, keyed by URL and content hash"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """Get the cache entry of a URL, if its download is on disk"""
+        data = _read_json(self._index_path(url))
+        if data is None:
+            return None
+        try:
+            entry = CacheEntry(**data)
+        except TypeError:
+            return None
+        if not self._object_path(entry.content_hash).exists():
+            return None
+        return entry
+
+    def read(self, entry: CacheEntry) -> Optional[bytes]:
+        """Get the content of an entry, or None if it is missing or corrupt"""
+        try:
+            content = self._object_path(entry.content_hash).read_bytes()
+        except OSError:
+            return None
+        if content_hash(content) != entry.content_hash:
+            return None
+        return content
+
+    def store(self, url: str, content: bytes, headers: Optional[Mapping[str, str]] = None) -> CacheEntry:
+        """Save a download with the validators the server sent for it"""
+        headers = headers or {}
+        digest = content_hash(content)
+        path = self._object_path(digest)
+        if not path.exists():
+            _write_atomic(path, content)
+        entry = CacheEntry(
+            url=url,
+            content_hash=digest,
+            size=len(content),
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+            fetched_at=datetime.now().isoformat(timespec="seconds"),
+        )
+        _write_atomic(self._index_path(url), json.dumps(entry._asdict()).encode("utf-8"))
+        return entry
+
+    def load_sheet(self, url: str, content: bytes, date: str) -> Optional[Dict[str, Any]]:
+        """Get the sheet read from this exact content of a URL, if cached"""
+        data = _read_json(self._parsed_path(url))
+        if data is None or not _is_current(data, content_hash(content)) or data.get("date") != date:
+            return None
+        return data.get("sheet")
+
+    def store_sheet(self, url: str, content: bytes, date: str, sheet: Dict[str, Any]) -> None:
+        payload = {
+            "parser_version": PARSER_VERSION,
+            "content_hash": content_hash(content),
+            "date": date,
+            "sheet": sheet,
+        }
+        _write_atomic(self._parsed_path(url), json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+    def load_cursor(self) -> Optional[Dict[str, str]]:
+        """The newest listing link ("date" and "url") a completed scrape processed"""
+        data = _read_json(self.root / CURSOR_FILE)
+        if data is None or not isinstance(data.get("date"), str) or not isinstance(data.get("url"), str):
+            return None
+        return {"date": data["date"], "url": data["url"]}
+
+    def store_cursor(self, link: Mapping[str, str]) -> None:
+        payload = {"date": link["date"], "url": link["url"], "saved_at": datetime.now().isoformat(timespec="seconds")}
+        _write_atomic(self.root / CURSOR_FILE, json.dumps(payload).encode("utf-8"))
+
+    def verify(self) -> Dict[str, Any]:
+        """
+        Check every index entry against its download and parsed sheet
+
+        Returns counts of valid, missing and corrupt entries, stale parsed
+        sheets and unreferenced downloads, with the URLs of broken entries.
+        """
+        report: Dict[str, Any] = {
+            "entries": 0, "valid": 0, "missing": [], "corrupt": [],
+            "stale_parsed": 0, "orphaned_objects": 0, "bytes": 0,
+        }
+        referenced = set()
+        for index_path in self._files("index"):
+            report["entries"] += 1
+            data = _read_json(index_path)
+            if data is None or "content_hash" not in data:
+                report["corrupt"].append(index_path.name)
+                continue
+            referenced.add(data["content_hash"])
+            object_path = self._object_path(data["content_hash"])
+            if not object_path.exists():
+                report["missing"].append(data.get("url", index_path.name))
+            elif content_hash(object_path.read_bytes()) != data["content_hash"]:
+                report["corrupt"].append(data.get("url", index_path.name))
+            else:
+                report["valid"] += 1
+
+            parsed = _read_json(self._parsed_path_for_key(index_path.stem))
+            if parsed is not None and not _is_current(parsed, data["content_hash"]):
+                report["stale_parsed"] += 1
+
+        for object_path in self._files("objects"):
+            report["bytes"] += object_path.stat().st_size
+            if object_path.stem not in referenced:
+                report["orphaned_objects"] += 1
+        return report
+
+    def prune(self, *, older_than_days: Optional[float] = None) -> Dict[str, int]:
+        """
+        Remove broken entries, stale parsed sheets and unreferenced downloads
+
+        With older_than_days, entries fetched longer ago than that are removed
+        too, so they are downloaded again on the next scrape.
+        """
+        removed = {"entries": 0, "parsed": 0, "objects": 0, "bytes": 0}
+        cutoff = time.time() - older_than_days * 86400 if older_than_days is not None else None
+        referenced = set()
+        for index_path in self._files("index"):
+            data = _read_json(index_path)
+            parsed_path = self._parsed_path_for_key(index_path.stem)
+            broken = (
+                data is None
+                or "content_hash" not in data
+                or not self._object_path(data["content_hash"]).exists()
+                or content_hash(self._object_path(data["content_hash"]).read_bytes()) != data["content_hash"]
+            )
+            expired = cutoff is not None and index_path.stat().st_mtime < cutoff
+            if broken or expired:
+                index_path.unlink()
+                removed["entries"] += 1
+                if parsed_path.exists():
+                    parsed_path.unlink()
+                    removed["parsed"] += 1
+                continue
+            referenced.add(data["content_hash"])
+            parsed = _read_json(parsed_path)
+            if parsed_path.exists() and (parsed is None or not _is_current(parsed, data["content_hash"])):
+                parsed_path.unlink()
+                removed["parsed"] += 1
+
+        for parsed_path in self._files("parsed"):
+            if not (self.root / "index" / parsed_path.name).exists():
+                parsed_path.unlink()
+                removed["parsed"] += 1
+
+        for object_path in self._files("objects"):
+            if object_path.stem not in referenced:
+                removed["bytes"] += object_path.stat().st_size
+                object_path.unlink()
+                removed["objects"] += 1
+        return removed
+
+    def _files(self, kind: str) -> Iterator[Path]:
+        directory = self.root / kind
+        if not directory.exists():
+            return iter(())
+        pattern = "*/*.xlsx" if kind == "objects" else "*.json"
+        return iter(sorted(directory.glob(pattern)))
+
+    def _object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / f"{digest}.xlsx"
+
+    def _index_path(self, url: str) -> Path:
+        return self.root / "index" / f"{self._url_key(url)}.json"
+
+    def _parsed_path(self, url: str) -> Path:
+        return self._parsed_path_for_key(self._url_key(url))
+
+    def _parsed_path_for_key(self, key: str) -> Path:
+        return self.root / "parsed" / f"{key}.json"
+
+    @staticmethod
+    def _url_key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def get_download_cache() -> Optional[DownloadCache]:
+    """The cache configured by SCRAPER_CACHE_DIR, or None when caching is off"""
+    if not settings.SCRAPER_CACHE_DIR:
+        return None
+    return DownloadCache(settings.SCRAPER_CACHE_DIR)
@@ -0,0 +1,204 @@
+"""
+Discovery of TCB Excel links from the daily price listing API.
+
+The listing is requested newest first. An incremental run reads pages only
+until it reaches a file at or before the latest stored date, or the newest
+file a previous completed scrape processed (the cursor), so a daily run needs
+one or two requests. Without a stored date (a new or reset database) the
+cursor is ignored and the whole listing is read. A full listing reads the first page to learn
+iTotalRecords and then fetches the remaining pages concurrently, behind the
+same per-host rate limiter as the downloads.
+"""
+import html
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Dict, List, Mapping, Optional
+from urllib.parse import urljoin
+
+import requests
+
+from app.utils.scraper_pipeline import MIN_REQUEST_INTERVAL, RateLimiter, create_session
+from app.utils.scraper_utils import API_URL, BASE_URL, bengali_to_english_digits
+
+# Listing rows per request
+PAGE_SIZE = 100
+# Concurrent requests when fetching the full listing
+LISTING_WORKERS = 4
+LISTING_RETRIES = 3
+# Datatable column holding the publication date
+DATE_COLUMN = 3
+
+
+class ListingError(Exception):
+    """The first page of the listing could not be fetched"""
+
+
+def _form_data(start: int, length: int) -> Dict[str, str]:
+    """Datatable request for one page, sorted by publication date, newest first"""
+    form_data = {
+        "sEcho": str(start // length + 1),
+        "iColumns": "5",
+        "sColumns": ",,,,",
+        "iDisplayStart": str(start),
+        "iDisplayLength": str(length),
+        "iSortingCols": "1",
+        "iSortCol_0": str(DATE_COLUMN),
+        "sSortDir_0": "desc",
+        "sSearch": "",
+        "bRegex": "false",
+    }
+    for column in range(5):
+        form_data.update({
+            f"mDataProp_{column}": str(column),
+            f"sSearch_{column}": "",
+            f"bRegex_{column}": "false",
+            f"bSearchable_{column}": "true",
+            f"bSortable_{column}": "true",
+        })
+    return form_data
+
+
+def fetch_listing_page(
+    session: requests.Session, limiter: RateLimiter, start: int, length: int = PAGE_SIZE
+) -> Optional[Dict[str, Any]]:
+    """Get one page of the listing, retrying failures, or None if every attempt failed"""
+    headers = {
+        "Accept": "application/json",
+        "Content-Type": "application/x-www-form-urlencoded",
+    }
+    for attempt in range(LISTING_RETRIES):
+        limiter.wait(API_URL)
+        try:
+            response = session.post(API_URL, headers=headers, data=_form_data(start, length), timeout=15)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, json.JSONDecodeError) as e:
+            print(f"Error fetching listing rows {start}-{start + length} (attempt {attempt + 1}/{LISTING_RETRIES}): {e}")
+    return None
+
+
+def listing_link(row: List[str]) -> Optional[Dict[str, str]]:
+    """Convert a listing row to a link dict with "date" ("YYYY-MM-DD HH:MM:SS") and "url" """
+    if len(row) < 5:
+        return None
+    # Time is in the 3rd column, the date in the 4th and the download link in the 5th
+    standard_time = bengali_to_english_digits(row[2])
+    standard_date = bengali_to_english_digits(row[3])
+    href_match = re.search(r'href="([^"]+)"', html.unescape(row[4]))
+    if not href_match:
+        return None
+    relative_url = href_match.group(1)
+    if relative_url.startswith("//"):
+        url = "https:" + relative_url
+    else:
+        url = urljoin(BASE_URL, relative_url)
+    return {"date": f"{standard_date} {standard_time}:00", "url": url}
+
+
+def _link_date(link: Mapping[str, str]) -> Optional[date]:
+    try:
+        return datetime.strptime(link["date"].split()[0], "%Y-%m-%d").date()
+    except (ValueError, IndexError):
+        return None
+
+
+def _page_links(data: Dict[str, Any], seen_urls: set) -> List[Dict[str, str]]:
+    links = []
+    for row in data.get("data", []):
+        link = listing_link(row)
+        if link is None or link["url"] in seen_urls:
+            continue
+        seen_urls.add(link["url"])
+        links.append(link)
+    return links
+
+
+def fetch_full_listing(
+    *,
+    page_size: int = PAGE_SIZE,
+    workers: int = LISTING_WORKERS,
+    min_request_interval: float = MIN_REQUEST_INTERVAL,
+) -> List[Dict[str, str]]:
+    """Every link in the listing, fetching the pages after the first concurrently"""
+    session = create_session(workers)
+    limiter = RateLimiter(min_request_interval)
+    first = fetch_listing_page(session, limiter, 0, page_size)
+    if first is None:
+        raise ListingError(f"Could not fetch the TCB listing from {API_URL}")
+    total_entries = first.get("iTotalRecords", 0)
+    print(f"Total entries found: {total_entries}")
+
+    starts = list(range(page_size, total_entries, page_size))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pages = [first] + list(pool.map(lambda start: fetch_listing_page(session, limiter, start, page_size), starts))
+
+    links: List[Dict[str, str]] = []
+    seen_urls: set = set()
+    for page in pages:
+        # Pages that failed every retry are left out, as before
+        if page is not None:
+            links.extend(_page_links(page, seen_urls))
+    print(f"Completed scraping {len(links)} links from {len(pages)} pages")
+    return links
+
+
+def discover_links(
+    latest_date: Optional[date],
+    *,
+    cursor: Optional[Mapping[str, str]] = None,
+    full: bool = False,
+    page_size: int = PAGE_SIZE,
+    workers: int = LISTING_WORKERS,
+    min_request_interval: float = MIN_REQUEST_INTERVAL,
+) -> List[Dict[str, str]]:
+    """
+    Links newer than latest_date and the cursor, newest first
+
+    With full, or without a latest date, the whole listing is returned; a
+    cursor left over from before the database was emptied would otherwise
+    stop the backfill. If the server does not return the listing newest first, the
+    full listing is fetched and filtered instead of stopping early. Raises
+    ListingError when the listing cannot be fetched at all.
+    """
+    if full or latest_date is None:
+        return fetch_full_listing(page_size=page_size, workers=workers, min_request_interval=min_request_interval)
+
+    def is_known(link: Dict[str, str]) -> bool:
+        if cursor is not None and (link["url"] == cursor["url"] or link["date"] <= cursor["date"]):
+            return True
+        link_date = _link_date(link)
+        return link_date is not None and link_date <= latest_date
+
+    session = create_session(1)
+    limiter = RateLimiter(min_request_interval)
+    links: List[Dict[str, str]] = []
+    seen_urls: set = set()
+    previous: Optional[Dict[str, str]] = None
+    start = 0
+    while True:
+        data = fetch_listing_page(session, limiter, start, page_size)
+        if data is None:
+            if start == 0:
+                raise ListingError(f"Could not fetch the TCB listing from {API_URL}")
+            break
+        page = start // page_size + 1
+        page_links = _page_links(data, seen_urls)
+        # Stopping early is only safe on a listing sorted newest first, so check each page before using it
+        dates = ([previous["date"]] if previous is not None else []) + [link["date"] for link in page_links]
+        if any(newer > older for older, newer in zip(dates, dates[1:])):
+            print("Listing is not sorted newest first; fetching the full listing")
+            links = fetch_full_listing(page_size=page_size, workers=workers, min_request_interval=min_request_interval)
+            return sorted((link for link in links if not is_known(link)), key=lambda link: link["date"], reverse=True)
+        for link in page_links:
+            previous = link
+            if is_known(link):
+                print(f"Found {len(links)} new links in {page} listing pages, stopped at {link['date']}")
+                return links
+            links.append(link)
+        start += page_size
+        if start >= data.get("iTotalRecords", 0) or not data.get("data"):
+            break
+    print(f"Found {len(links)} new links in the whole listing")
+    return links
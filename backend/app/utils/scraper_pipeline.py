@@ -0,0 +1,272 @@
+"""
+Concurrent download / parse / insert pipeline for TCB Excel files.
+
+Three stages connected by bounded queues, so at most a few files are held in
+memory at any time:
+
+1. A small pool of downloader threads sharing one keep-alive HTTP session,
+   behind a per-host rate limiter.
+2. A process pool reading the Excel sheets (CPU bound).
+3. A single writer running in the calling thread, so all database work stays
+   on one session.
+
+Workers return the sheet rows with names as written; the writer resolves them
+through the alias indexes, so unmatched and fuzzy names are counted in this
+process for unmatched_report().
+
+With a DownloadCache, cached files skip the downloaders' requests and cached
+sheets skip the process pool, so a re-scrape replays from disk.
+
+The pipeline only needs link dicts with "url" and "date", so it can be run
+offline against a local fixture server.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+from queue import Empty, Full, Queue
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.utils.scraper_cache import DownloadCache
+from app.utils.scraper_utils import read_excel_sheet, resolve_sheet_records
+
+DOWNLOAD_WORKERS = 4
+PARSE_WORKERS = 2
+# Files waiting between stages
+QUEUE_SIZE = 4
+# Seconds between the start of two requests to the same host
+MIN_REQUEST_INTERVAL = 1.0
+DOWNLOAD_RETRIES = 3
+
+# Marks the end of a stage's output
+_DONE = object()
+
+
+class RateLimiter:
+    """Spaces out requests to each host by a minimum interval, across threads"""
+
+    def __init__(self, min_interval: float = MIN_REQUEST_INTERVAL):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot: Dict[str, float] = {}
+
+    def wait(self, url: str) -> None:
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def create_session(pool_size: int = DOWNLOAD_WORKERS) -> requests.Session:
+    """HTTP session with a keep-alive connection pool sized for the downloaders"""
+    session = requests.Session()
+    session.headers.update({"User-Agent": "Mozilla/5.0"})
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_excel(
+    session: requests.Session,
+    limiter: RateLimiter,
+    url: str,
+    cache: Optional[DownloadCache] = None,
+    revalidate: bool = False,
+) -> Optional[bytes]:
+    """
+    Download a file, retrying failures, or None if every attempt failed
+
+    Cached files are returned without a request, or after a conditional
+    request when revalidating.
+    """
+    entry = cache.lookup(url) if cache is not None else None
+    if entry is not None and not revalidate:
+        content = cache.read(entry)
+        if content is not None:
+            return content
+        entry = None
+
+    headers = {}
+    if entry is not None:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+
+    for attempt in range(DOWNLOAD_RETRIES):
+        limiter.wait(url)
+        try:
+            response = session.get(url, timeout=10, headers=headers)
+            if response.status_code == 304 and entry is not None:
+                content = cache.read(entry)
+                if content is not None:
+                    return content
+                # The cached copy went missing; fetch the whole file
+                headers = {}
+                continue
+            response.raise_for_status()
+            if cache is not None:
+                try:
+                    cache.store(url, response.content, response.headers)
+                except OSError as e:
+                    print(f"Error caching {url}: {e}")
+            return response.content
+        except requests.RequestException as e:
+            print(f"Error downloading {url} (attempt {attempt + 1}/{DOWNLOAD_RETRIES}): {e}")
+    return None
+
+
+def parse_downloaded_file(content: bytes) -> Optional[Dict[str, Any]]:
+    """Read the sheet of a downloaded file (runs in a worker process)"""
+    return read_excel_sheet(BytesIO(content))
+
+
+def _put(queue: Queue, item: Any, stop: threading.Event) -> bool:
+    """Blocking put that gives up once the pipeline is stopping"""
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.5)
+            return True
+        except Full:
+            continue
+    return False
+
+
+def run_pipeline(
+    links: List[Dict[str, str]],
+    write_batch: Callable[[Dict[str, str], List[Dict[str, Any]]], None],
+    *,
+    on_error: Callable[[str], None] = print,
+    should_stop: Callable[[], bool] = lambda: False,
+    download_workers: int = DOWNLOAD_WORKERS,
+    parse_workers: int = PARSE_WORKERS,
+    queue_size: int = QUEUE_SIZE,
+    min_request_interval: float = MIN_REQUEST_INTERVAL,
+    cache: Optional[DownloadCache] = None,
+    revalidate: bool = False,
+) -> int:
+    """
+    Download, parse and write every link, calling write_batch(link, records)
+    once per file in the order files finish parsing (records is empty when the
+    file could not be downloaded or parsed)
+
+    Returns the number of files processed.
+    """
+    stop = threading.Event()
+    pending: Queue = Queue()
+    for link in links:
+        pending.put(link)
+
+    downloaded: Queue = Queue(maxsize=queue_size)
+    parsed: Queue = Queue(maxsize=queue_size)
+    session = create_session(download_workers)
+    limiter = RateLimiter(min_request_interval)
+
+    def download() -> None:
+        while not stop.is_set():
+            try:
+                link = pending.get_nowait()
+            except Empty:
+                return
+            sheet = None
+            try:
+                content = fetch_excel(session, limiter, link["url"], cache, revalidate)
+                if content is not None and cache is not None:
+                    sheet = cache.load_sheet(link["url"], content, link["date"])
+            except Exception as e:
+                content = None
+                on_error(f"Error downloading {link['url']}: {str(e)}")
+            else:
+                if content is None:
+                    on_error(f"Error downloading {link['url']}")
+            # Failed downloads are passed on too, so the dispatcher can count every link
+            if not _put(downloaded, (link, content, sheet), stop):
+                return
+
+    def forward(link: Dict[str, str], content: Optional[bytes], future: Any, sheet: Optional[Dict]) -> bool:
+        if sheet is None and future is not None:
+            try:
+                sheet = future.result()
+            except Exception as e:
+                on_error(f"Error parsing {link['url']}: {str(e)}")
+            else:
+                if sheet is not None and cache is not None:
+                    try:
+                        cache.store_sheet(link["url"], content, link["date"], sheet)
+                    except OSError as e:
+                        on_error(f"Error caching the sheet of {link['url']}: {str(e)}")
+        return _put(parsed, (link, sheet), stop)
+
+    def dispatch(pool: ProcessPoolExecutor) -> None:
+        """Feed downloads to the process pool, keeping at most parse_workers files in it"""
+        in_flight: deque = deque()
+        received = 0
+        while received < len(links) and not stop.is_set():
+            try:
+                link, content, sheet = downloaded.get(timeout=0.5)
+            except Empty:
+                continue
+            received += 1
+            future = None
+            if content and sheet is None:
+                try:
+                    future = pool.submit(parse_downloaded_file, content)
+                except Exception as e:
+                    on_error(f"Error parsing {link['url']}: {str(e)}")
+            in_flight.append((link, content, future, sheet))
+            while len(in_flight) > parse_workers:
+                if not forward(*in_flight.popleft()):
+                    return
+        while in_flight:
+            if not forward(*in_flight.popleft()):
+                return
+        _put(parsed, _DONE, stop)
+
+    processed = 0
+    downloaders = [
+        threading.Thread(target=download, name=f"tcb-download-{i}", daemon=True)
+        for i in range(max(1, min(download_workers, len(links))))
+    ]
+    with ProcessPoolExecutor(max_workers=parse_workers, mp_context=get_context("spawn")) as pool:
+        dispatcher = threading.Thread(target=dispatch, args=(pool,), name="tcb-parse-dispatch", daemon=True)
+        for thread in downloaders:
+            thread.start()
+        dispatcher.start()
+        try:
+            while links:
+                if should_stop():
+                    break
+                try:
+                    item = parsed.get(timeout=0.5)
+                except Empty:
+                    if not dispatcher.is_alive():
+                        break
+                    continue
+                if item is _DONE:
+                    break
+                link, sheet = item
+                records = []
+                if sheet is not None:
+                    try:
+                        records = resolve_sheet_records(sheet, link["date"], link["url"])
+                    except Exception as e:
+                        on_error(f"Error parsing {link['url']}: {str(e)}")
+                write_batch(link, records)
+                processed += 1
+        finally:
+            stop.set()
+            dispatcher.join()
+            for thread in downloaders:
+                thread.join()
+            session.close()
+    return processed
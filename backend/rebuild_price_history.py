@@ -0,0 +1,48 @@
+"""
+Rebuild the aggregated price history table.
+This recomputes every daily, weekly, monthly, quarterly and yearly bucket
+in pricehistoryaggregated from the raw price records, then refreshes the
+commodity_stats and location_latest_price tables.
+"""
+import argparse
+import sys
+import logging
+import time
+import app.db.base  # noqa: register all models before querying
+from app.db.session import SessionLocal
+from app.services.prices.rollups import price_rollup
+from app.services.prices.commodity_stats import commodity_stats
+from app.services.prices.location_latest import location_latest_price
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Backfill the aggregated price history from price records')
+    parser.add_argument('--commodity-id', type=int, default=None,
+                        help='Only rebuild buckets for this commodity (default: all commodities)')
+    args = parser.parse_args()
+    
+    db = SessionLocal()
+    try:
+        start_time = time.time()
+        logger.info("Rebuilding aggregated price history...")
+        buckets = price_rollup.rebuild(db, commodity_id=args.commodity_id)
+        logger.info(f"Wrote {buckets} buckets in {time.time() - start_time:.1f} seconds")
+        
+        commodity_ids = None if args.commodity_id is None else [args.commodity_id]
+        stats = commodity_stats.refresh(db, commodity_ids)
+        logger.info(f"Refreshed statistics for {stats} commodities")
+        
+        latest = location_latest_price.rebuild(db, commodity_id=args.commodity_id)
+        logger.info(f"Wrote {latest} latest location prices")
+    except Exception as e:
+        logger.error(f"Error rebuilding price history: {e}")
+        return 1
+    finally:
+        db.close()
+    
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
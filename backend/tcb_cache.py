@@ -0,0 +1,48 @@
+"""
+Inspect the on-disk cache of downloaded TCB spreadsheets.
+--verify checks every cached download against its content hash and reports
+broken entries; --prune removes them together with stale parsed sheets and
+unreferenced downloads.
+"""
+import argparse
+import json
+import sys
+import logging
+from app.core.config import settings
+from app.utils.scraper_cache import DownloadCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Verify or prune the TCB download cache')
+    parser.add_argument('--dir', default=settings.SCRAPER_CACHE_DIR,
+                        help='Cache directory (default: SCRAPER_CACHE_DIR)')
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--verify', action='store_true',
+                        help='Check every entry and report broken ones')
+    action.add_argument('--prune', action='store_true',
+                        help='Remove broken entries, stale parsed sheets and unreferenced files')
+    parser.add_argument('--older-than', type=float, default=None, metavar='DAYS',
+                        help='With --prune, also remove entries fetched more than DAYS ago')
+    args = parser.parse_args()
+
+    if not args.dir:
+        logger.error("No cache directory configured")
+        return 1
+
+    cache = DownloadCache(args.dir)
+    if args.verify:
+        report = cache.verify()
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 0 if not report["missing"] and not report["corrupt"] else 1
+
+    removed = cache.prune(older_than_days=args.older_than)
+    logger.info(
+        f"Removed {removed['entries']} entries, {removed['parsed']} parsed sheet files "
+        f"and {removed['objects']} downloads ({removed['bytes'] / 2 ** 20:.1f} MiB)"
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
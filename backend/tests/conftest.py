@@ -0,0 +1,31 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.crud.crud_location import location as crud_location
+from app.db.base import Base
+from app.models.commodity import Commodity
+from app.models.region import Region
+
+
+@pytest.fixture
+def db():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+    @event.listens_for(engine, "connect")
+    def enable_foreign_keys(connection, _):
+        connection.execute("PRAGMA foreign_keys=ON")
+
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    session.add(Commodity(id=1, name="Onion", unit="kg"))
+    session.add(Region(id=1, name="Dhaka", latitude=23.8, longitude=90.4))
+    session.add(Region(id=2, name="Chattogram", latitude=22.3, longitude=91.8))
+    session.commit()
+    crud_location.cache.clear()
+    yield session
+    session.close()
+    crud_location.cache.clear()
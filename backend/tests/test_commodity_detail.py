@@ -0,0 +1,37 @@
+from datetime import date, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.db.session import get_db
+from app.main import app
+from app.models.price_record import PriceRecord
+from app.services.prices.rollups import price_rollup
+
+
+def test_read_commodity_scans_the_buckets_twice(db):
+    today = date.today()
+    # Records every 9 days over 400 days reach every history tier and window
+    for offset in range(0, 400, 9):
+        db.add(PriceRecord(commodity_id=1, region_id=1, price=40 + offset % 7,
+                           recorded_at=today - timedelta(days=offset)))
+    db.flush()
+    price_rollup.rebuild(db)
+    db.commit()
+
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        response = TestClient(app).get("/api/v1/commodities/1")
+    finally:
+        app.dependency_overrides.pop(get_db)
+
+    assert response.status_code == 200
+    assert response.json()["currentPrice"] == 43
+    assert response.json()["priceHistory"]
+    # get_window_summary and get_tiered_history; the rest are the data version
+    # check, the commodity and the regional snapshot
+    bucket_scans = [statement for statement in statements if "pricehistoryaggregated" in statement]
+    assert len(bucket_scans) == 2
+    assert len(statements) == 5
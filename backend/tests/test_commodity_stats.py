@@ -0,0 +1,27 @@
+from datetime import date
+
+from sqlalchemy import event
+
+from app.models.commodity_stats import CommodityStats
+from app.models.price_record import PriceRecord
+from app.services.prices.commodity_stats import commodity_stats
+
+
+def test_daily_refresh_runs_once_without_prices(db):
+    assert commodity_stats.ensure_fresh(db, today=date(2026, 3, 1))
+
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert not commodity_stats.ensure_fresh(db, today=date(2026, 3, 1))
+    assert len(statements) == 1
+
+
+def test_daily_refresh_moves_the_windows(db):
+    db.add(PriceRecord(commodity_id=1, region_id=1, price=50, recorded_at=date(2026, 3, 1)))
+    db.commit()
+    assert commodity_stats.ensure_fresh(db, today=date(2026, 3, 1))
+    assert db.query(CommodityStats.current_price).one() == (50,)
+
+    assert commodity_stats.ensure_fresh(db, today=date(2026, 4, 15))
+
+    assert db.query(CommodityStats.current_price).one() == (None,)
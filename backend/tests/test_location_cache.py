@@ -0,0 +1,57 @@
+from datetime import date
+
+import pytest
+
+from app.crud import crud_price_record
+from app.crud.crud_location import location as crud_location
+from app.crud.crud_price_record import price_record as crud_price_record_obj
+from app.models.location import Location
+from app.models.price_record import PriceRecord
+from app.schemas.location import LocationCreate
+from app.schemas.price_record import PriceRecordCreate
+
+
+def record(price: int = 50) -> PriceRecordCreate:
+    return PriceRecordCreate(
+        commodity_id=1,
+        region_id=1,
+        price=price,
+        recorded_at=date(2026, 1, 1),
+        source="TCB",
+        price_kind="lowest",
+        location=LocationCreate(
+            name="Karwan Bazar", latitude=23.751, longitude=90.393, place_id="karwan-bazar"
+        ),
+    )
+
+
+def test_rolled_back_location_is_not_cached(db):
+    crud_location.get_or_create_many(db, objs_in=[record().location])
+    db.rollback()
+
+    assert crud_location.cache.get_by_place_id("karwan-bazar") is None
+
+    result = crud_price_record_obj.upsert_many_with_location(db, objs_in=[record()])
+
+    assert result.created == 1
+    location = db.query(Location).one()
+    assert db.query(PriceRecord).one().location_id == location.id
+    assert crud_location.cache.get_by_place_id("karwan-bazar")["id"] == location.id
+
+
+def test_failed_upsert_does_not_cache_its_location(db, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("refresh failed")
+
+    monkeypatch.setattr(crud_price_record, "refresh_derived", fail)
+    with pytest.raises(RuntimeError):
+        crud_price_record_obj.upsert_many_with_location(db, objs_in=[record()])
+    monkeypatch.undo()
+
+    assert db.query(Location).count() == 0
+    assert crud_location.cache.get_by_place_id("karwan-bazar") is None
+
+    result = crud_price_record_obj.upsert_many_with_location(db, objs_in=[record()])
+
+    assert result.created == 1
+    assert db.query(PriceRecord).one().location_id == db.query(Location).one().id
@@ -0,0 +1,46 @@
+from datetime import date, timedelta
+
+from fastapi.testclient import TestClient
+
+from app.crud.crud_price_record import price_record as crud_price_record
+from app.db.session import get_db
+from app.main import app
+from app.schemas.location import LocationCreate
+from app.schemas.price_record import PriceRecordCreate
+
+
+def record(price: int, recorded_at: date) -> PriceRecordCreate:
+    return PriceRecordCreate(
+        commodity_id=1,
+        region_id=1,
+        price=price,
+        recorded_at=recorded_at,
+        source="TCB",
+        price_kind="lowest",
+        location=LocationCreate(
+            name="Karwan Bazar", latitude=23.751, longitude=90.393, place_id="karwan-bazar"
+        ),
+    )
+
+
+def test_future_dated_latest_falls_back_to_the_window(db):
+    today = date.today()
+    crud_price_record.upsert_many_with_location(
+        db, objs_in=[record(40, today - timedelta(days=5)), record(50, today - timedelta(days=3)),
+                     record(70, today + timedelta(days=5))]
+    )
+
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        response = TestClient(app).get(
+            "/api/v1/locations/with-prices", params={"lat": 23.75, "lng": 90.39, "radius_km": 5}
+        )
+    finally:
+        app.dependency_overrides.pop(get_db)
+
+    assert response.status_code == 200
+    assert response.json()["total"] == 1
+    [location] = response.json()["locations"]
+    [commodity] = location["commodities"]
+    assert (commodity["price"], commodity["previous_price"]) == (50, 40)
+    assert commodity["recorded_at"] == (today - timedelta(days=3)).isoformat()
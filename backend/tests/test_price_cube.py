@@ -0,0 +1,61 @@
+from datetime import date
+
+import pytest
+
+from app.core.config import settings
+from app.crud.crud_price_record import price_record as crud_price_record
+from app.models.price_record import PriceRecord
+from app.schemas.location import LocationCreate
+from app.schemas.price_record import PriceRecordCreate
+from app.services.data_version import data_version
+from app.services.prices.cube import PriceCube
+
+
+@pytest.fixture
+def cube(monkeypatch):
+    monkeypatch.setattr(settings, "PRICE_CUBE_REFRESH_SECONDS", 0)
+    return PriceCube()
+
+
+def record(price: int, day: int) -> PriceRecordCreate:
+    return PriceRecordCreate(
+        commodity_id=1,
+        region_id=1,
+        price=price,
+        recorded_at=date(2026, 1, day),
+        source="TCB",
+        price_kind="lowest",
+        location=LocationCreate(
+            name="Karwan Bazar", latitude=23.751, longitude=90.393, place_id="karwan-bazar"
+        ),
+    )
+
+
+def test_new_rows_are_merged_in_order(db, cube):
+    crud_price_record.upsert_many_with_location(db, objs_in=[record(50, day=1), record(70, day=3)])
+    assert [point.price for point in cube.ensure_fresh(db).points(1)] == [50, 70]
+
+    crud_price_record.upsert_many_with_location(db, objs_in=[record(60, day=2)])
+
+    assert [point.price for point in cube.ensure_fresh(db).points(1)] == [50, 60, 70]
+
+
+def test_rewrites_from_another_session_reload_the_cube(db, cube):
+    crud_price_record.upsert_many_with_location(db, objs_in=[record(50, day=1)])
+    assert cube.ensure_fresh(db).window_stats(1, date(2026, 1, 1))["max"] == 50
+
+    # A re-ingested file updates the row in place; no id moves past the watermark
+    crud_price_record.upsert_many_with_location(db, objs_in=[record(80, day=1)])
+
+    assert cube.ensure_fresh(db).window_stats(1, date(2026, 1, 1))["max"] == 80
+
+
+def test_rows_committed_below_the_watermark_reload_the_cube(db, cube):
+    db.add(PriceRecord(id=10, commodity_id=1, region_id=1, price=50, recorded_at=date(2026, 1, 1)))
+    data_version.bump(db, commit=True)
+    assert cube.ensure_fresh(db).footprint()["rows"] == 1
+
+    db.add(PriceRecord(id=5, commodity_id=1, region_id=1, price=60, recorded_at=date(2026, 1, 2)))
+    data_version.bump(db, commit=True)
+
+    assert [point.price for point in cube.ensure_fresh(db).points(1)] == [50, 60]
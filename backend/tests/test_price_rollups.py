@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+
+from app.models.price_history import PriceHistoryAggregated
+from app.models.price_record import PriceRecord
+from app.services.prices.rollups import price_rollup
+
+
+def stored_buckets(db):
+    return sorted(
+        (row.commodity_id, row.region_id, row.period, row.period_start, row.price_sum, row.record_count,
+         row.min_price, row.max_price)
+        for row in db.query(PriceHistoryAggregated)
+    )
+
+
+def test_refresh_matches_a_rebuild(db):
+    days = [date(2025, 12, 29) + timedelta(days=offset * 11) for offset in range(12)]
+    records = []
+    for index, day in enumerate(days):
+        for region_id in (1, 2):
+            record = PriceRecord(commodity_id=1, region_id=region_id, price=40 + index * 3 + region_id, recorded_at=day)
+            db.add(record)
+            records.append(record)
+            db.flush()
+            # One write at a time, like single creates
+            price_rollup.refresh(db, [(1, region_id, day)])
+    db.delete(records[5])
+    db.flush()
+    price_rollup.refresh(db, [(1, records[5].region_id, records[5].recorded_at)])
+    refreshed = stored_buckets(db)
+
+    price_rollup.rebuild(db)
+
+    assert refreshed == stored_buckets(db)
+
+
+def test_tiers_count_boundary_days_once(db):
+    # 2026-03-18 is a Wednesday; the month and week around it are cut by the tiers
+    for day, price in [(date(2026, 3, 2), 10), (date(2026, 3, 17), 20), (date(2026, 3, 18), 30),
+                       (date(2026, 3, 20), 40), (date(2026, 3, 25), 50), (date(2026, 3, 26), 60)]:
+        db.add(PriceRecord(commodity_id=1, region_id=1, price=price, recorded_at=day))
+    db.flush()
+    price_rollup.rebuild(db)
+
+    history = price_rollup.get_tiered_history(
+        db,
+        commodity_id=1,
+        tiers=[
+            ("monthly", None, date(2026, 3, 17)),
+            ("weekly", date(2026, 3, 18), date(2026, 3, 25)),
+            ("daily", date(2026, 3, 26), None),
+        ],
+    )
+
+    assert [(row.period_start, row.avg_price, row.record_count) for row in history] == [
+        (date(2026, 3, 1), 15, 2),
+        (date(2026, 3, 16), 35, 2),
+        (date(2026, 3, 23), 50, 1),
+        (date(2026, 3, 26), 60, 1),
+    ]
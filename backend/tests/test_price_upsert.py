@@ -0,0 +1,76 @@
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.crud import crud_price_record as crud_price_record_module
+from app.crud.crud_price_record import price_record as crud_price_record
+from app.db.session import get_db
+from app.main import app
+from app.models.price_history import PriceHistoryAggregated
+from app.models.price_record import PriceRecord
+from app.schemas.location import LocationCreate
+from app.schemas.price_record import PriceRecordCreate
+from app.services.data_version import data_version
+
+
+def record(price: int, region_id: int) -> PriceRecordCreate:
+    return PriceRecordCreate(
+        commodity_id=1,
+        region_id=region_id,
+        price=price,
+        recorded_at=date(2026, 1, 1),
+        source="TCB",
+        price_kind="lowest",
+        location=LocationCreate(
+            name="Karwan Bazar", latitude=23.751, longitude=90.393, place_id="karwan-bazar"
+        ),
+    )
+
+
+def test_update_refreshes_the_stored_region(db):
+    crud_price_record.upsert_many_with_location(db, objs_in=[record(50, region_id=1)])
+
+    # Re-ingested with another region: the price changes, the stored region does not
+    result = crud_price_record.upsert_many_with_location(db, objs_in=[record(70, region_id=2)])
+
+    assert result.updated == 1
+    assert db.query(PriceRecord.region_id, PriceRecord.price).one() == (1, 70)
+    buckets = db.query(PriceHistoryAggregated).all()
+    assert buckets
+    assert {bucket.region_id for bucket in buckets} == {1}
+    assert {bucket.avg_price for bucket in buckets} == {70}
+
+
+def test_create_with_location_writes_record_and_version_together(db, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("refresh failed")
+
+    monkeypatch.setattr(crud_price_record_module, "refresh_derived", fail)
+    with pytest.raises(RuntimeError):
+        crud_price_record.create_with_location(db, obj_in=record(50, region_id=1))
+    monkeypatch.undo()
+
+    assert db.query(PriceRecord).count() == 0
+
+    version = data_version.current(db)
+    crud_price_record.create_with_location(db, obj_in=record(50, region_id=1))
+
+    assert db.query(PriceRecord).count() == 1
+    assert data_version.current(db) == version + 1
+
+
+def test_posting_the_same_record_twice_updates_it(db):
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        client = TestClient(app)
+        first = client.post("/api/v1/prices/", json=record(50, region_id=1).model_dump(mode="json"))
+        second = client.post("/api/v1/prices/", json=record(60, region_id=1).model_dump(mode="json"))
+    finally:
+        app.dependency_overrides.pop(get_db)
+
+    assert first.status_code == 201
+    assert second.status_code == 201
+    assert second.json()["id"] == first.json()["id"]
+    assert db.query(PriceRecord.price).one() == (60,)
+    assert {bucket.avg_price for bucket in db.query(PriceHistoryAggregated)} == {60}
@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+from app.models.price_record import PriceRecord
+from app.models.region import Region
+from app.services.prices.regional_snapshot import regional_snapshot
+
+TODAY = date(2026, 3, 31)
+
+
+def add_prices(db, region_ids):
+    for region_id in region_ids:
+        for offset in range(3):
+            db.add(PriceRecord(commodity_id=1, region_id=region_id, price=40 + region_id + offset,
+                               recorded_at=TODAY - timedelta(days=10 * offset)))
+    db.commit()
+
+
+def count_statements(db, run):
+    statements = []
+
+    def record(*args):
+        statements.append(args[2])
+
+    event.listen(db.get_bind(), "before_cursor_execute", record)
+    try:
+        result = run()
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", record)
+    return result, len(statements)
+
+
+def test_statement_count_does_not_grow_with_regions(db):
+    add_prices(db, [1])
+    snapshots, one_region = count_statements(
+        db, lambda: regional_snapshot.get_for_commodity(db, commodity_id=1, today=TODAY)
+    )
+    assert len(snapshots) == 1
+
+    db.add_all(Region(id=region_id, name=f"Region {region_id}", latitude=23.0, longitude=90.0)
+               for region_id in range(3, 9))
+    add_prices(db, range(2, 9))
+    snapshots, many_regions = count_statements(
+        db, lambda: regional_snapshot.get_for_commodity(db, commodity_id=1, today=TODAY)
+    )
+
+    assert len(snapshots) == 8
+    assert (snapshots[0].latest_price, snapshots[0].previous_price) == (41, 42)
+    assert many_regions == one_region == 1
@@ -0,0 +1,49 @@
+from io import BytesIO
+
+import pytest
+from openpyxl import Workbook
+
+from app.utils.aliases import reset_unmatched, unmatched_report
+from app.utils.scraper_cache import DownloadCache
+from app.utils.scraper_pipeline import parse_downloaded_file
+from app.utils.scraper_utils import resolve_sheet_records
+
+URL = "https://tcb.gov.bd/sites/default/files/daily_rmp.xlsx"
+
+
+@pytest.fixture
+def workbook_content():
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Daily Retail Price"
+    sheet.append(["ঢাকা মহানগরীর যেসকল বাজার হতে তথ্য সংগ্রহ করা হয়েছেঃ কাওরান বাজার, মালিবাগ।"])
+    sheet.append(["চাল সরু (নাজির/মিনিকেট)", "প্রতি কেজি", 70, 80])
+    # A misspelt commodity and a unit with no alias
+    sheet.append(["চাল সরু (নাজির/মিনিকেটি)", "প্রতি কেজি", 71, 81])
+    sheet.append(["ডিম (ফার্ম)", "প্রতি ডজনন", 120, 130])
+    sheet.append(["যেসকল বাজার হতে তথ্য সংগ্রহ করা হয়েছে"])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def test_names_are_resolved_and_reported_where_the_sheet_is_written(tmp_path, workbook_content):
+    reset_unmatched()
+    # What a parse worker returns, replayed from the cache
+    cache = DownloadCache(str(tmp_path))
+    cache.store(URL, workbook_content)
+    cache.store_sheet(URL, workbook_content, "2026-03-01", parse_downloaded_file(workbook_content))
+    sheet = cache.load_sheet(URL, workbook_content, "2026-03-01")
+    assert unmatched_report()["unit"]["unmatched"] == {}
+
+    records = resolve_sheet_records(sheet, "2026-03-01", URL)
+
+    assert [(record["commodity_name"], record["unit"]) for record in records] == [
+        ("Fine Rice (Nazir/Miniket)", "kg"),
+        ("Egg (Farm)", "প্রতি ডজনন"),
+    ]
+    assert records[0]["exact_bazar_name"] == "Karwan Bazar, Malibag"
+    report = unmatched_report()
+    assert report["unit"]["unmatched"] == {"প্রতি ডজনন": 1}
+    assert report["commodity"]["fuzzy"] == {"চাল সরু (নাজির/মিনিকেটি)": "Fine Rice (Nazir/Miniket)"}
+    reset_unmatched()
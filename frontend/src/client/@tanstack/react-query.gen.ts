@@ -587,7 +587,8 @@ export const readPriceRecordsApiV1PricesGetQueryKey = (
 
 /**
  * Read Price Records
- * Retrieve price records with filtering options.
+ * Retrieve price records with filtering options, newest first.
+ * Pages are keyed on (recorded_at, id); pass next_cursor back to get the next page.
  */
 export const readPriceRecordsApiV1PricesGetOptions = (
   options?: Options<ReadPriceRecordsApiV1PricesGetData>
@@ -2431,6 +2431,33 @@ export const PriceRecordSchema = {
   title: "PriceRecord",
 } as const;
 
+export const PriceRecordPageSchema = {
+  properties: {
+    items: {
+      items: {
+        $ref: "#/components/schemas/PriceRecord",
+      },
+      type: "array",
+      title: "Items",
+    },
+    next_cursor: {
+      anyOf: [
+        {
+          type: "string",
+        },
+        {
+          type: "null",
+        },
+      ],
+      title: "Next Cursor",
+      description: "Cursor of the next page, None on the last page",
+    },
+  },
+  type: "object",
+  required: ["items"],
+  title: "PriceRecordPage",
+} as const;
+
 export const PriceRecordCreateSchema = {
   properties: {
     commodity_id: {
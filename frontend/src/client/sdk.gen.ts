@@ -438,7 +438,8 @@ export const readRegionPricesApiV1RegionsIdPricesGet = <ThrowOnError extends boo
 
 /**
  * Read Price Records
- * Retrieve price records with filtering options.
+ * Retrieve price records with filtering options, newest first.
+ * Pages are keyed on (recorded_at, id); pass next_cursor back to get the next page.
  */
 export const readPriceRecordsApiV1PricesGet = <ThrowOnError extends boolean = false>(
   options?: Options<ReadPriceRecordsApiV1PricesGetData, ThrowOnError>
@@ -152,12 +152,17 @@ export const readRegionPricesApiV1RegionsIdPricesGetResponseTransformer = async
   return data;
 };
 
+const priceRecordPageSchemaResponseTransformer = (data: any) => {
+  data.items = data.items.map((item: any) => {
+    return priceRecordSchemaResponseTransformer(item);
+  });
+  return data;
+};
+
 export const readPriceRecordsApiV1PricesGetResponseTransformer = async (
   data: any
 ): Promise<ReadPriceRecordsApiV1PricesGetResponse> => {
-  data = data.map((item: any) => {
-    return priceRecordSchemaResponseTransformer(item);
-  });
+  data = priceRecordPageSchemaResponseTransformer(data);
   return data;
 };
 
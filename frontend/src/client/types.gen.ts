@@ -1040,6 +1040,21 @@ export type PriceRecord = {
   location?: Location | null;
 };
 
+/**
+ * PriceRecordPage
+ */
+export type PriceRecordPage = {
+  /**
+   * Items
+   */
+  items: Array<PriceRecord>;
+  /**
+   * Next Cursor
+   * Cursor of the next page, None on the last page
+   */
+  next_cursor?: string | null;
+};
+
 /**
  * PriceRecordCreate
  */
@@ -1714,9 +1729,10 @@ export type ReadPriceRecordsApiV1PricesGetData = {
   path?: never;
   query?: {
     /**
-     * Skip
+     * Cursor
+     * next_cursor of the previous page
      */
-    skip?: number;
+    cursor?: string | null;
     /**
      * Limit
      */
@@ -1753,10 +1769,9 @@ export type ReadPriceRecordsApiV1PricesGetError =
 
 export type ReadPriceRecordsApiV1PricesGetResponses = {
   /**
-   * Response Read Price Records Api V1 Prices  Get
    * Successful Response
    */
-  200: Array<PriceRecord>;
+  200: PriceRecordPage;
 };
 
 export type ReadPriceRecordsApiV1PricesGetResponse =
@@ -2026,6 +2041,11 @@ export type GetLocationsWithPricesApiV1LocationsWithPricesGetData = {
      * Filter by specific commodity ID
      */
     commodity_id?: number | null;
+    /**
+     * Order By Distance
+     * Order locations nearest first instead of by id
+     */
+    order_by_distance?: boolean;
     /**
      * Skip
      * Skip records for pagination
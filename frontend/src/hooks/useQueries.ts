@@ -19,6 +19,7 @@ export const QUERY_KEYS = {
   PRICE_RECORDS: "price-records",
   REGIONAL_PRICES: "regional-prices",
   LOCATIONS_WITH_PRICES: "locations-with-prices",
+  LOCATION_CLUSTERS: "location-clusters",
   ACCIDENT_DATA: "accident-data",
   ACCIDENT_DATA_BY_YEAR: "accident-data-by-year",
   LATEST_ACCIDENT_REPORTS: "latest-accident-reports",
@@ -101,6 +102,21 @@ export const useGetLocationsWithPrices = (params: {
   });
 };
 
+/**
+ * Hook to fetch grid clusters of priced locations for a map view
+ */
+export const useGetLocationClusters = (params: {
+  zoom: number;
+  bbox: [number, number, number, number];
+  commodity_id?: number;
+  days?: number;
+}) => {
+  return useQuery({
+    queryKey: [QUERY_KEYS.LOCATION_CLUSTERS, params],
+    queryFn: () => locationService.getClusters(params),
+  });
+};
+
 // ====== Price Mutations ======
 
 /**
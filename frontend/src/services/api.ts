@@ -5,6 +5,7 @@ import {
   LatestAccidentData,
   Location,
   PriceRecord,
+  PriceRecordPage,
   Region,
 } from "../types";
 
@@ -123,6 +124,7 @@ export const locationService = {
     days?: number;
     category?: string;
     commodity_id?: number;
+    order_by_distance?: boolean;
   }) => {
     const queryParams = new URLSearchParams();
     queryParams.append("lat", params.lat.toString());
@@ -131,9 +133,51 @@ export const locationService = {
     if (params.days) queryParams.append("days", params.days.toString());
     if (params.category) queryParams.append("category", params.category);
     if (params.commodity_id) queryParams.append("commodity_id", params.commodity_id.toString());
+    if (params.order_by_distance) queryParams.append("order_by_distance", "true");
 
     return await apiClient(`/locations/with-prices?${queryParams.toString()}`);
   },
+
+  // Get the cheapest or nearest locations selling a commodity around a point
+  getNearest: async (params: {
+    commodity_id: number;
+    lat: number;
+    lng: number;
+    radius_km?: number;
+    days?: number;
+    sort?: "price" | "distance" | "score";
+    distance_weight?: number;
+    limit?: number;
+  }) => {
+    const queryParams = new URLSearchParams();
+    queryParams.append("commodity_id", params.commodity_id.toString());
+    queryParams.append("lat", params.lat.toString());
+    queryParams.append("lng", params.lng.toString());
+    if (params.radius_km) queryParams.append("radius_km", params.radius_km.toString());
+    if (params.days) queryParams.append("days", params.days.toString());
+    if (params.sort) queryParams.append("sort", params.sort);
+    if (params.distance_weight !== undefined)
+      queryParams.append("distance_weight", params.distance_weight.toString());
+    if (params.limit) queryParams.append("limit", params.limit.toString());
+
+    return await apiClient(`/locations/nearest?${queryParams.toString()}`);
+  },
+
+  // Get grid clusters of priced locations for a map view
+  getClusters: async (params: {
+    zoom: number;
+    bbox: [number, number, number, number]; // west, south, east, north
+    commodity_id?: number;
+    days?: number;
+  }) => {
+    const queryParams = new URLSearchParams();
+    queryParams.append("zoom", Math.round(params.zoom).toString());
+    queryParams.append("bbox", params.bbox.join(","));
+    if (params.commodity_id) queryParams.append("commodity_id", params.commodity_id.toString());
+    if (params.days) queryParams.append("days", params.days.toString());
+
+    return await apiClient(`/locations/clusters?${queryParams.toString()}`);
+  },
 };
 
 /**
@@ -142,7 +186,7 @@ export const locationService = {
 export const priceService = {
   // Get all price records with filtering options
   getAll: async (params?: {
-    skip?: number;
+    cursor?: string;
     limit?: number;
     commodity_id?: number;
     region_id?: number;
@@ -150,7 +194,7 @@ export const priceService = {
     end_date?: string;
   }) => {
     const queryParams = new URLSearchParams();
-    if (params?.skip) queryParams.append("skip", params.skip.toString());
+    if (params?.cursor) queryParams.append("cursor", params.cursor);
     if (params?.limit) queryParams.append("limit", params.limit.toString());
     if (params?.commodity_id) queryParams.append("commodity_id", params.commodity_id.toString());
     if (params?.region_id) queryParams.append("region_id", params.region_id.toString());
@@ -160,7 +204,7 @@ export const priceService = {
     const queryString = queryParams.toString();
     const endpoint = `/prices/${queryString ? `?${queryString}` : ""}`;
 
-    return (await apiClient(endpoint)) as PriceRecord[];
+    return (await apiClient(endpoint)) as PriceRecordPage;
   },
 
   // Get regional prices for a commodity
@@ -59,9 +59,15 @@ export type PriceRecord = {
   source?: string;
   notes?: string;
   location_id?: number;
+  price_kind?: "lowest" | "highest" | null;
   location?: Location;
 };
 
+export type PriceRecordPage = {
+  items: PriceRecord[];
+  next_cursor: string | null;
+};
+
 export type Commodity = {
   id: string;
   name: string;